@@ -0,0 +1,59 @@
+"""Points arriving from an asyncio producer, drawn as they come"""
+from __future__ import print_function, division
+
+import asyncio
+import tkinter as tk
+
+import numpy
+from OpenGL import GL
+import pyopengltk
+from pyopengltk import aio
+
+
+async def receive():
+    """ Stands in for an asyncio socket: a burst of points now and then """
+    walk = numpy.zeros(2)
+    while True:
+        await asyncio.sleep(numpy.random.exponential(0.02))
+        steps = numpy.random.normal(0, 0.01, (200, 2))
+        points = walk + numpy.cumsum(steps, axis=0)
+        walk = points[-1] % 2 - 1
+        yield points
+
+
+class AsyncPoints(pyopengltk.OpenGLFrame):
+
+    def __init__(self, *args, **kw):
+        pyopengltk.OpenGLFrame.__init__(self, *args, **kw)
+        self.data = aio.AsyncFrame(self)
+        self.batch = pyopengltk.Batch()
+        self.history = numpy.zeros((0, 2))
+
+    def initgl(self):
+        GL.glClearColor(1.0, 1.0, 1.0, 0.0)
+        GL.glPointSize(2)
+
+    def redraw(self):
+        points, new = self.data.take()
+        if new:
+            self.history = numpy.concatenate((self.history, points))[-20000:]
+            self.batch.clear()
+            self.batch.points(self.history, color=(0, 0, 0.8))
+        GL.glClear(GL.GL_COLOR_BUFFER_BIT)
+        self.batch.draw()
+
+
+async def ingest(frame):
+    async for points in receive():
+        frame.data.publish(points)
+
+
+def main():
+    root = tk.Tk()
+    app = AsyncPoints(root, width=640, height=480)
+    app.pack(fill=tk.BOTH, expand=tk.YES)
+    asyncio.run(aio.run(root, ingest(app)))
+
+
+if __name__ == '__main__':
+    main()
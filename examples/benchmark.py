@@ -0,0 +1,120 @@
+"""
+Measure the per-frame Python overhead of the render path.
+
+The frame is 1x1 pixels and redraw only clears, so the time is spent
+in pyopengltk and the Tk/GL calls around the user redraw. The second
+line times the same frames plus every call the render path used to make
+each frame: update_idletasks(), winfo_ismapped() in tkMakeCurrent,
+activate() and tkSwapBuffers, winfo_width/height() in Opengl.tkRedraw,
+MakeCurrent for a context that was already current, and the
+glGetDoublev(GL_MATRIX_MODE) read back in RawOpengl.
+
+With no display, run it headless:
+
+    PYOPENGL_PLATFORM=egl python benchmark.py
+
+which draws with OffscreenOpenGL and makes the Tcl calls on a Tcl
+interpreter with no Tk. There winfo is a Tcl proc returning a constant,
+costing a Python to Tcl call like the real one (Tk answers these from
+its own window record) but nothing more.
+"""
+from __future__ import print_function
+
+import sys
+import time
+if sys.version_info[0] < 3:
+    import Tkinter as tk
+else:
+    import tkinter as tk
+from OpenGL import GL
+from pyopengltk import OffscreenOpenGL
+from pyopengltk.offscreen import headless_platform
+if not headless_platform():
+    # Not there with PYOPENGL_PLATFORM=egl
+    from pyopengltk import OpenGLFrame
+else:
+    OpenGLFrame = object
+
+NFRAMES = 2000
+
+
+class BenchFrame(OpenGLFrame):
+
+    def initgl(self):
+        GL.glClearColor(0.0, 0.0, 0.0, 0.0)
+
+    def redraw(self):
+        GL.glClear(GL.GL_COLOR_BUFFER_BIT)
+
+
+class HeadlessBench(OffscreenOpenGL):
+
+    def initgl(self):
+        GL.glClearColor(0.0, 0.0, 0.0, 0.0)
+
+    def redraw(self):
+        GL.glClear(GL.GL_COLOR_BUFFER_BIT)
+
+
+def removed_calls(tcl, make_current):
+    """ What a frame used to do on top of the current render path """
+    tcl.call("update", "idletasks")
+    for i in range(3):
+        # activate() twice, then tkSwapBuffers
+        tcl.call("winfo", "ismapped", ".")
+    tcl.call("winfo", "width", ".")
+    tcl.call("winfo", "height", ".")
+    make_current()
+    make_current()
+    GL.glGetDoublev(GL.GL_MATRIX_MODE)
+
+
+def timed(display, extra=None):
+    # Make sure the driver has settled before timing
+    for i in range(10):
+        display()
+    GL.glFinish()
+    start = time.perf_counter()
+    for i in range(NFRAMES):
+        display()
+        if extra is not None:
+            extra()
+    GL.glFinish()
+    return time.perf_counter() - start
+
+
+def report(display, extra):
+    for label, calls in (("now", None), ("old calls", extra)):
+        dt = timed(display, calls)
+        print("%d frames, %.1f us per frame (%s)" %
+              (NFRAMES, 1e6 * dt / NFRAMES, label))
+
+
+def bench(app):
+    def make_current():
+        app._set_current(False)
+        app.tkMakeCurrent()
+
+    report(app._display, lambda: removed_calls(app.tk, make_current))
+    app.winfo_toplevel().destroy()
+
+
+def bench_headless():
+    tcl = tk.Tcl()
+    tcl.eval("proc winfo {args} {return 1}")
+    ogl = HeadlessBench(1, 1)
+    ogl.create()
+    report(ogl._display, lambda: removed_calls(tcl, ogl.context.make_current))
+    print(GL.glGetString(GL.GL_RENDERER))
+    ogl.destroy()
+
+
+if __name__ == '__main__':
+    if headless_platform():
+        bench_headless()
+    else:
+        root = tk.Tk()
+        app = BenchFrame(root, width=1, height=1)
+        app.pack()
+        app.after(500, bench, app)
+        app.mainloop()
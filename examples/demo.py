@@ -5,13 +5,14 @@ from __future__ import print_function
 Demo entry point for Tkinter Window with OpenGL
 """
 
-import sys, math, time
+import sys, time
 if sys.version_info[0] < 3:
     from Tkinter import Tk, YES, BOTH
 else:
     from tkinter import Tk, YES, BOTH
+import numpy
 from OpenGL import GL, GLU
-from pyopengltk import OpenGLFrame
+from pyopengltk import OpenGLFrame, Batch
 
 
 class AppOgl(OpenGLFrame):
@@ -24,22 +25,25 @@ class AppOgl(OpenGLFrame):
         GL.glMatrixMode(GL.GL_PROJECTION)
         GL.glLoadIdentity()
         GLU.gluOrtho2D(-5, 5, -5, 5)
-        self.start = time.time()
-        self.nframes = 0
+        if not hasattr(self, "batch"):
+            self.batch = Batch()
+            self.batch.color = (0.0, 0.0, 0.0)
+            npt = 100
+            self.x = -5.0 + numpy.arange(npt) * 10.0 / npt
 
     def redraw(self):
         GL.glClear(GL.GL_COLOR_BUFFER_BIT)
-        GL.glBegin(GL.GL_POINTS)
-        npt = 100
-        for i in range(npt):
-            x = -5.0 + i * 10.0 / npt
-            y = math.sin(x + time.time())*5/2
-            GL.glVertex2f(x, y)
-        GL.glEnd()
+        # All the points in one draw call
+        y = numpy.sin(self.x + time.time())*5/2
+        self.batch.clear()
+        self.batch.points(numpy.column_stack((self.x, y)))
+        self.batch.draw()
         GL.glFlush()
-        self.nframes += 1
-        tm = time.time() - self.start
-        print("fps", self.nframes / tm, end="\r")
+
+
+def show_fps(summary):
+    print("fps %.1f redraw %.2f ms" % (summary["fps"],
+                                       summary["redraw"]["mean"]), end="\r")
 
 
 if __name__ == '__main__':
@@ -47,5 +51,6 @@ if __name__ == '__main__':
     app = AppOgl(root, width=320, height=200)
     app.pack(fill=BOTH, expand=YES)
     app.animate = 1
+    app.enable_stats(report_every=1, callback=show_fps)
     app.after(100, app.printContext)
     app.mainloop()
@@ -0,0 +1,46 @@
+"""
+Render frames with no display, e.g. on a CI node:
+
+    PYOPENGL_PLATFORM=egl python headless.py
+"""
+from __future__ import print_function
+
+import os
+import time
+os.environ.setdefault("PYOPENGL_PLATFORM", "egl")
+
+from OpenGL import GL
+from pyopengltk import OffscreenOpenGL
+
+
+class Spinner(OffscreenOpenGL):
+
+    def initgl(self):
+        GL.glClearColor(0.2, 0.2, 0.2, 1.0)
+        GL.glMatrixMode(GL.GL_PROJECTION)
+        GL.glLoadIdentity()
+        GL.glOrtho(-1, 1, -1, 1, -1, 1)
+        GL.glMatrixMode(GL.GL_MODELVIEW)
+
+    def redraw(self):
+        GL.glClear(GL.GL_COLOR_BUFFER_BIT)
+        GL.glRotatef(1, 0, 0, 1)
+        GL.glBegin(GL.GL_TRIANGLES)
+        GL.glColor3f(1, 0, 0)
+        GL.glVertex2f(-0.5, -0.5)
+        GL.glColor3f(0, 1, 0)
+        GL.glVertex2f(0.5, -0.5)
+        GL.glColor3f(0, 0, 1)
+        GL.glVertex2f(0.0, 0.5)
+        GL.glEnd()
+
+
+if __name__ == '__main__':
+    ogl = Spinner(320, 200)
+    ogl.render()
+    start = time.time()
+    ogl.render(1000)
+    GL.glFinish()
+    print("%d frames in %.2f s" % (ogl.nframes, time.time() - start))
+    print(GL.glGetString(GL.GL_RENDERER))
+    ogl.destroy()
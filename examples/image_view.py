@@ -0,0 +1,78 @@
+"""Showing a stream of 4k x 4k uint16 detector frames with a colormap"""
+from __future__ import print_function, division
+
+import sys
+
+import numpy
+from OpenGL import GL
+import pyopengltk
+from pyopengltk.image import ImageView
+if sys.version_info[0] > 2:
+    import tkinter as tk
+else:
+    import Tkinter as tk
+
+SIZE = 4096
+
+
+def hot(n=256):
+    """ Black, red, yellow, white """
+    x = numpy.linspace(0, 1, n)
+    return numpy.stack((numpy.clip(3 * x, 0, 1),
+                        numpy.clip(3 * x - 1, 0, 1),
+                        numpy.clip(3 * x - 2, 0, 1)), axis=-1)
+
+
+class Detector(object):
+    """ Stands in for a camera, some noise over a moving ring """
+
+    def __init__(self, size):
+        y, x = numpy.mgrid[:size, :size].astype(numpy.float32) / size - .5
+        self.r = numpy.sqrt(x * x + y * y)
+        self.noise = numpy.random.randint(0, 500, (size, size)) \
+            .astype(numpy.uint16)
+        self.n = 0
+
+    def next_frame(self):
+        self.n += 1
+        ring = numpy.exp(-((self.r - 0.2 - 0.01 * (self.n % 20)) / .01) ** 2)
+        return (ring * 3000).astype(numpy.uint16) + self.noise
+
+
+class ImageFrame(pyopengltk.OpenGLFrame):
+
+    def __init__(self, *args, **kw):
+        pyopengltk.OpenGLFrame.__init__(self, *args, **kw)
+        # Makes the GL objects at the first draw
+        self.view = ImageView(levels=(0, 3500), colormap=hot())
+
+    def initgl(self):
+        GL.glClearColor(0.0, 0.0, 0.0, 1.0)
+
+    def redraw(self):
+        GL.glClear(GL.GL_COLOR_BUFFER_BIT)
+        self.view.draw(self.view.fit(self.width, self.height))
+
+
+def show_stats(summary):
+    print(pyopengltk.stats.format_summary(summary))
+
+
+def main():
+    root = tk.Tk()
+    app = ImageFrame(root, width=800, height=800)
+    app.pack(fill=tk.BOTH, expand=tk.YES)
+    detector = Detector(SIZE)
+
+    def acquire():
+        app.view.set_image(detector.next_frame())
+        app.invalidate()
+        app.after(33, acquire)
+
+    app.after(100, acquire)
+    app.enable_stats(report_every=2, callback=show_stats)
+    app.mainloop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+"""Drawing a 20 million point cloud with level of detail, drag to rotate"""
+from __future__ import print_function, division
+
+import sys
+
+import numpy
+from OpenGL import GL
+import pyopengltk
+from pyopengltk.pointcloud import PointCloud
+if sys.version_info[0] > 2:
+    import tkinter as tk
+else:
+    import Tkinter as tk
+
+NPTS = 20000000
+
+
+def make_points(n):
+    """ A noisy torus """
+    t, p = numpy.random.random((2, n)).astype(numpy.float32) * 2 * numpy.pi
+    r = 1 + 0.3 * numpy.cos(p) + numpy.random.normal(0, 0.02, n)
+    xyz = numpy.stack((r * numpy.cos(t), r * numpy.sin(t),
+                       0.3 * numpy.sin(p)), axis=-1)
+    rgb = numpy.stack((128 + 127 * numpy.cos(t), 128 + 127 * numpy.sin(p),
+                       numpy.full(n, 200)), axis=-1).astype(numpy.uint8)
+    return xyz, rgb
+
+
+class CloudFrame(pyopengltk.OpenGLFrame):
+
+    def __init__(self, *args, **kw):
+        pyopengltk.OpenGLFrame.__init__(self, *args, **kw)
+        self.camera = pyopengltk.Camera(distance=5.0)
+        self.cloud = PointCloud(*make_points(NPTS), budget=500000)
+        self.bind("<B1-Motion>", self.drag)
+        self.bind("<Button-1>", self.press)
+
+    def press(self, event):
+        self.last = event.x, event.y
+
+    def drag(self, event):
+        self.camera.rotate(event.x - self.last[0], event.y - self.last[1])
+        self.last = event.x, event.y
+        self.invalidate()
+
+    def initgl(self):
+        GL.glClearColor(0.1, 0.1, 0.1, 1.0)
+        GL.glEnable(GL.GL_DEPTH_TEST)
+
+    def redraw(self):
+        GL.glClear(GL.GL_COLOR_BUFFER_BIT | GL.GL_DEPTH_BUFFER_BIT)
+        self.camera.resize(self.width, self.height)
+        self.camera.load()
+        if self.cloud.draw(self.camera.matrix(), self.width, self.height):
+            # Index still building, or refining while the view is still
+            self.after(10, self.invalidate)
+
+
+def main():
+    root = tk.Tk()
+    app = CloudFrame(root, width=800, height=600)
+    app.pack(fill=tk.BOTH, expand=tk.YES)
+    app.mainloop()
+
+
+if __name__ == '__main__':
+    main()
@@ -2,7 +2,6 @@
 from __future__ import print_function, division
 
 from OpenGL import GL, GLUT
-import OpenGL.GL.shaders
 import ctypes
 import types
 import numpy
@@ -20,38 +19,6 @@ def bytestr(s):
     return s.encode("utf-8") + b"\000"
 
 
-# Avoiding glitches in pyopengl-3.0.x and python3.4
-def compileShader(source, shaderType):
-    """
-    Compile shader source of given type
-        source -- GLSL source-code for the shader
-    shaderType -- GLenum GL_VERTEX_SHADER, GL_FRAGMENT_SHADER, etc,
-        returns GLuint compiled shader reference
-    raises RuntimeError when a compilation failure occurs
-    """
-    if isinstance(source, str):
-        source = [source]
-    elif isinstance(source, bytes):
-        source = [source.decode('utf-8')]
-
-    shader = GL.glCreateShader(shaderType)
-    GL.glShaderSource(shader, source)
-    GL.glCompileShader(shader)
-    result = GL.glGetShaderiv(shader, GL.GL_COMPILE_STATUS)
-    if not(result):
-        # TODO: this will be wrong if the user has
-        # disabled traditional unpacking array support.
-        raise RuntimeError(
-            """Shader compile failure (%s): %s""" % (
-                result,
-                GL.glGetShaderInfoLog(shader),
-            ),
-            source,
-            shaderType,
-        )
-    return shader
-
-
 vertex_shader = """#version 130 
 in vec3 position;
 varying vec3 vertex_color;
@@ -77,12 +44,22 @@ vertices = (numpy.random.random(NPTS * 3).astype(numpy.float32)-.5) * 1.5
 vertices.shape = NPTS, 3
 
 
-def create_object(shader):
+def create_buffer():
+    # Generate buffers to hold our vertices
+    vertex_buffer = GL.glGenBuffers(1)
+    GL.glBindBuffer(GL.GL_ARRAY_BUFFER, vertex_buffer)
+    # Send the data over to the buffer (bytes)
+    vs = vertices.tobytes()
+    GL.glBufferData(GL.GL_ARRAY_BUFFER, len(vs), vs, GL.GL_STATIC_DRAW)
+    GL.glBindBuffer(GL.GL_ARRAY_BUFFER, 0)
+    return vertex_buffer
+
+
+def create_object(shader, vertex_buffer):
     # Create a new VAO (Vertex Array Object) and bind it
+    # VAOs are not shared between contexts, the buffer is
     vertex_array_object = GL.glGenVertexArrays(1)
     GL.glBindVertexArray(vertex_array_object)
-    # Generate buffers to hold our vertices
-    vertex_buffer = GL.glGenBuffers(1)
     GL.glBindBuffer(GL.GL_ARRAY_BUFFER, vertex_buffer)
     # Get the position of the 'position' in parameter of our shader
     # and bind it.
@@ -91,9 +68,6 @@ def create_object(shader):
     # Describe the position data layout in the buffer
     GL.glVertexAttribPointer(position, 3, GL.GL_FLOAT, False,
                              0, ctypes.c_void_p(0))
-    # Send the data over to the buffer (bytes)
-    vs = vertices.tostring()
-    GL.glBufferData(GL.GL_ARRAY_BUFFER, len(vs), vs, GL.GL_STATIC_DRAW)
     # Unbind the VAO first (Important)
     GL.glBindVertexArray(0)
     # Unbind other stuff
@@ -123,13 +97,15 @@ class ShaderFrame(pyopengltk.OpenGLFrame):
         GL.glEnable(GL.GL_DEPTH_TEST)
         GL.glEnable(GL.GL_PROGRAM_POINT_SIZE)
         if not hasattr(self, "shader"):
-            self.shader = OpenGL.GL.shaders.compileProgram(
-                compileShader(vertex_shader, GL.GL_VERTEX_SHADER),
-                compileShader(fragment_shader, GL.GL_FRAGMENT_SHADER)
-                )
-            self.vertex_array_object = create_object(self.shader)
+            # Compiled and uploaded once for all the frames in the group,
+            # and loaded from the disk cache on the next run
+            self.shader = self.context_group.program(
+                vertex=vertex_shader, fragment=fragment_shader)
+            vertex_buffer = self.context_group.resource("points",
+                                                        create_buffer)
+            self.vertex_array_object = create_object(self.shader,
+                                                     vertex_buffer)
             self.proj = GL.glGetUniformLocation(self.shader, bytestr('proj'))
-        self.nframes = 0
         self.start = time.time()
 
     def redraw(self):
@@ -140,25 +116,27 @@ class ShaderFrame(pyopengltk.OpenGLFrame):
         p = rot(t*s/5., t*s/6., t*s/7.)
         GL.glUniformMatrix3fv(self.proj, 1, GL.GL_FALSE, p)
         GL.glBindVertexArray(self.vertex_array_object)
-        GL.glDrawArrays(GL.GL_POINTS, 0, NPTS)
+        with self.gpu_section("points"):
+            GL.glDrawArrays(GL.GL_POINTS, 0, NPTS)
         GL.glBindVertexArray(0)
         GL.glUseProgram(0)
-        GL.glRasterPos2f(-0.99, -0.99)
-        if self.nframes > 1:
-            t = time.time()-self.start
-            fps = "fps: %5.2f frames: %d" % (self.nframes / t, self.nframes)
-            # for c in fps:
-            #     GLUT.glutBitmapCharacter(GLUT.GLUT_BITMAP_HELVETICA_18, ord(c));
-        self.nframes += 1
 
 
-def main():
+def show_stats(summary):
+    print(pyopengltk.stats.format_summary(summary))
+
+
+def main(nviews=2):
     root = tk.Tk()
-    app = ShaderFrame(root, width=512, height=512)
-    app.pack(fill=tk.BOTH, expand=tk.YES)
+    group = pyopengltk.ContextGroup()
+    for i in range(nviews):
+        app = ShaderFrame(root, width=512, height=512, share_with=group)
+        app.pack(side=tk.LEFT, fill=tk.BOTH, expand=tk.YES)
+        app.animate = 1000 // 60
+        app.animate = 1
     app.after(100, app.printContext)
-    app.animate = 1000 // 60
-    app.animate = 1
+    app.enable_stats(report_every=2, callback=show_stats)
+    app.enable_gpu_profiling()
     app.mainloop()
 
 
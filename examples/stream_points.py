@@ -0,0 +1,92 @@
+"""Streaming a point cloud that changes every frame through a StreamBuffer"""
+from __future__ import print_function, division
+
+import ctypes
+import sys
+import time
+
+import numpy
+from OpenGL import GL
+import pyopengltk
+if sys.version_info[0] > 2:
+    import tkinter as tk
+else:
+    import Tkinter as tk
+
+
+vertex_shader = """#version 130
+in vec3 position;
+varying vec3 vertex_color;
+void main()
+{
+   gl_Position = vec4(position, 1.0);
+   vertex_color = vec3(position.x + .5, position.y + .5, 1.0);
+}
+"""
+
+fragment_shader = """#version 130
+varying vec3 vertex_color;
+void main()
+{
+   gl_FragColor = vec4(vertex_color, 1.0);
+}
+"""
+
+NPTS = 1000000
+
+
+class Acquisition(object):
+    """Stands in for a detector writing a new frame of points"""
+
+    def __init__(self, npts):
+        self.base = (numpy.random.random((npts, 3)).astype(numpy.float32)
+                     - .5) * 1.5
+
+    def read_into(self, out):
+        t = time.time()
+        numpy.multiply(self.base, 1 + 0.1 * numpy.sin(t), out=out)
+
+
+class StreamFrame(pyopengltk.OpenGLFrame):
+
+    def initgl(self):
+        GL.glClearColor(0.15, 0.15, 0.15, 1.0)
+        if not hasattr(self, "shader"):
+            self.shader = self.context_group.program(
+                vertex=vertex_shader, fragment=fragment_shader)
+            self.position = GL.glGetAttribLocation(self.shader, "position")
+            self.vao = GL.glGenVertexArrays(1)
+            self.stream = pyopengltk.StreamBuffer(NPTS * 12)
+            self.source = Acquisition(NPTS)
+
+    def redraw(self):
+        # Written straight into the mapped buffer, no extra copy
+        points = self.stream.acquire(NPTS * 12).view(numpy.float32)
+        self.source.read_into(points.reshape(NPTS, 3))
+        GL.glClear(GL.GL_COLOR_BUFFER_BIT)
+        GL.glUseProgram(self.shader)
+        GL.glBindVertexArray(self.vao)
+        self.stream.bind()
+        GL.glEnableVertexAttribArray(self.position)
+        GL.glVertexAttribPointer(self.position, 3, GL.GL_FLOAT, False, 12,
+                                 ctypes.c_void_p(self.stream.offset))
+        GL.glDrawArrays(GL.GL_POINTS, 0, NPTS)
+        GL.glBindVertexArray(0)
+        GL.glUseProgram(0)
+
+
+def show_stats(summary):
+    print(pyopengltk.stats.format_summary(summary))
+
+
+def main():
+    root = tk.Tk()
+    app = StreamFrame(root, width=512, height=512)
+    app.pack(fill=tk.BOTH, expand=tk.YES)
+    app.animate = 1
+    app.enable_stats(report_every=2, callback=show_stats)
+    app.mainloop()
+
+
+if __name__ == '__main__':
+    main()
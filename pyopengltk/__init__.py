@@ -23,8 +23,11 @@ __version__ = "0.0.3"
 
 import sys
 
+from pyopengltk.offscreen import headless_platform
+
 # Platform specific frames
-if sys.platform.startswith('linux'):
+# ... not with PYOPENGL_PLATFORM=egl/osmesa which have no GLX
+if sys.platform.startswith('linux') and headless_platform() is None:
     from pyopengltk.linux import OpenGLFrame
 
 if sys.platform.startswith('win32'):
@@ -33,9 +36,53 @@ if sys.platform.startswith('win32'):
 # if sys.platform.startswith('darwin'):
 #     from pyopengltk.darwin import OpenGLFrame
 
+# frame pacing
+from pyopengltk.scheduler import FrameScheduler
+from pyopengltk.scheduler import OnDemandScheduler
+from pyopengltk.scheduler import ContinuousScheduler
+from pyopengltk.scheduler import FixedRateScheduler
+from pyopengltk.scheduler import VsyncScheduler
+
+# camera math
+from pyopengltk.camera import Camera
+
+# drawing
+from pyopengltk.batch import Batch
+from pyopengltk.stream import StreamBuffer
+from pyopengltk.shadercache import ShaderCache
+from pyopengltk.rendertarget import RenderTarget
+from pyopengltk.image import ImageView
+from pyopengltk.pointcloud import PointCloud
+
+# picking
+from pyopengltk.picking import Picker
+from pyopengltk.picking import PickResult
+
+# data from other threads
+from pyopengltk.channel import TripleBuffer
+
+# shared contexts
+from pyopengltk.contextgroup import ContextGroup
+
+# instrumentation
+from pyopengltk.stats import FrameStats
+from pyopengltk.gpuprofile import GPUProfiler
+
+# readback
+from pyopengltk.capture import FrameCapture
+from pyopengltk.capture import read_pixels
+from pyopengltk.recorder import Recorder
+from pyopengltk.recorder import PNGWriter
+from pyopengltk.recorder import RawWriter
+from pyopengltk.recorder import FFmpegWriter
+
+# headless
+from pyopengltk.offscreen import OffscreenOpenGL
+
 # opengl
-from pyopengltk.opengl import RawOpengl
-from pyopengltk.opengl import Opengl
-from pyopengltk.opengl import glTranslateScene
-from pyopengltk.opengl import glRotateScene
-from pyopengltk.opengl import v3distsq
+if headless_platform() is None:
+    from pyopengltk.opengl import RawOpengl
+    from pyopengltk.opengl import Opengl
+    from pyopengltk.opengl import glTranslateScene
+    from pyopengltk.opengl import glRotateScene
+    from pyopengltk.opengl import v3distsq
@@ -0,0 +1,259 @@
+"""
+Running Tk and the frames inside an asyncio event loop
+
+Instead of root.mainloop(), run() pumps the Tk events from a coroutine,
+so asyncio sockets and queues can feed the frames directly:
+
+    frame.data = AsyncFrame(frame)
+
+    async def main():
+        async for points in receive():        # an async data source
+            frame.data.publish(points)        # drawn by the next frame
+
+    asyncio.run(pyopengltk.aio.run(root, main()))
+
+and in the frame
+
+    def redraw(self):
+        points, new = self.data.take()
+
+AsyncFrame.next_frame() waits for a frame to be drawn, redraw_async()
+asks for one and waits for it. publish() hands a value to the next
+frame, replacing any value not taken yet, and send() also waits until a
+frame has taken it or a newer value replaced it. Frames drawn by a render thread complete the
+futures through call_soon_threadsafe.
+
+Python 3 only, not imported by pyopengltk itself.
+"""
+import asyncio
+import ctypes
+import ctypes.util
+import threading
+import time
+import tkinter as tk
+
+import _tkinter
+
+from pyopengltk import channel, scheduler
+from pyopengltk.channel import TripleBuffer
+
+
+def pump(root, budget=0.005):
+    """
+    Handle the Tk events and timers due now, without waiting, for at
+    most about budget seconds so that a busy Tk (say a chain of after
+    callbacks) cannot starve the asyncio loop. Returns True when it
+    stopped with events still to handle.
+    """
+    end = time.perf_counter() + budget
+    while root.tk.dooneevent(_tkinter.DONT_WAIT):
+        if time.perf_counter() >= end:
+            return True
+    return False
+
+
+def display_fd(root):
+    """
+    File descriptor of the X server connection of root, None when Tk
+    is not on X11 or it cannot be found. It is readable when there are
+    X events for Tk to handle.
+    """
+    try:
+        if root.tk.call("tk", "windowingsystem") != "x11":
+            return None
+        # Tk_MainWindow comes with libtk, which _tkinter is linked to
+        tklib = ctypes.CDLL(_tkinter.__file__)
+        tklib.Tk_MainWindow.restype = ctypes.c_void_p
+        tklib.Tk_MainWindow.argtypes = [ctypes.c_void_p]
+        tkwin = tklib.Tk_MainWindow(root.tk.interpaddr())
+        if not tkwin:
+            return None
+        # Tk_Display(): the display is the first member of a Tk_Window
+        display = ctypes.c_void_p.from_address(tkwin).value
+        x11lib = ctypes.CDLL(ctypes.util.find_library("X11"))
+        x11lib.XConnectionNumber.argtypes = [ctypes.c_void_p]
+        return x11lib.XConnectionNumber(display)
+    except (tk.TclError, OSError, AttributeError, TypeError):
+        return None
+
+
+def _resolve(future, value):
+    if not future.done():
+        future.set_result(value)
+
+
+async def run(root, main=None, interval=None):
+    """
+    Process Tk events from the running asyncio loop until root is
+    destroyed. main, a coroutine, is run alongside and cancelled when
+    the window closes.
+
+    Between events the loop sleeps: X events wake it through a reader
+    on the display connection, frames the schedulers have armed
+    through scheduler.next_due() and the due hooks, and publish() from
+    other threads through a wake hook. Other Tcl timers,
+    like the application's own after() callbacks, cannot be seen from
+    here, so interval caps the sleep for them: 0.05 s by default, or
+    0.005 s without a display connection to watch (Windows, macOS).
+    """
+    loop = asyncio.get_running_loop()
+    wake = asyncio.Event()
+    fd = display_fd(root)
+    if fd is not None:
+        try:
+            loop.add_reader(fd, wake.set)
+        except NotImplementedError:
+            fd = None
+    if interval is None:
+        interval = 0.005 if fd is None else 0.05
+    closed = []
+
+    def destroyed(event):
+        if event.widget is root:
+            closed.append(True)
+
+    root.bind("<Destroy>", destroyed, add="+")
+    scheduler.add_due_hook(wake.set)
+
+    def woken():
+        # In the publishing thread
+        loop.call_soon_threadsafe(wake.set)
+
+    channel.add_wake_hook(woken)
+    task = None
+    if main is not None:
+        task = asyncio.ensure_future(main)
+        task.add_done_callback(lambda t: wake.set())
+    try:
+        while not closed:
+            try:
+                busy = pump(root)
+            except tk.TclError:
+                break
+            # Frames armed while pumping are in next_due()
+            wake.clear()
+            if task is not None and task.done():
+                task.result()
+                task = None
+            if busy:
+                # Only let the other tasks run before going on
+                await asyncio.sleep(0)
+                continue
+            timeout = interval
+            due = scheduler.next_due()
+            if due is not None:
+                timeout = min(timeout, max(0.0, due - time.perf_counter()))
+            try:
+                await asyncio.wait_for(wake.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+    finally:
+        scheduler.remove_due_hook(wake.set)
+        channel.remove_wake_hook(woken)
+        if fd is not None:
+            loop.remove_reader(fd)
+        if task is not None and not task.done():
+            task.cancel()
+
+
+class AsyncFrame(object):
+    """
+    Awaitable frames and a frame aligned data handoff for an OpenGLFrame
+
+    Use from coroutines in the thread running Tk (see run). take() is
+    for the frame's redraw, in whichever thread draws.
+    """
+
+    def __init__(self, frame):
+        self.frame = frame
+        self.frames = 0
+        self._lock = threading.Lock()
+        self._waiters = []
+        self._channel = TripleBuffer()
+        self._senders = []
+        frame.add_frame_hook(self._frame_drawn)
+
+    def close(self):
+        """ Stop following the frame, pending waits are cancelled """
+        self.frame.remove_frame_hook(self._frame_drawn)
+        with self._lock:
+            waiters = self._waiters + self._senders
+            self._waiters, self._senders = [], []
+        for future in waiters:
+            future.get_loop().call_soon_threadsafe(future.cancel)
+
+    def _frame_drawn(self, frame):
+        # A frame hook: called where GL runs, just before the swap
+        now = time.perf_counter()
+        with self._lock:
+            self.frames += 1
+            result = (self.frames, now)
+            waiters, self._waiters = self._waiters, []
+        for future in waiters:
+            future.get_loop().call_soon_threadsafe(_resolve, future, result)
+
+    def _pump_soon(self, loop):
+        # Draw right after the current coroutine yields, not at the
+        # next poll of run()
+        root = self.frame.winfo_toplevel()
+        loop.call_soon(pump, root)
+
+    def next_frame(self):
+        """
+        Future for the next frame drawn, giving (frame number, time)
+        with the time from time.perf_counter()
+        """
+        future = asyncio.get_running_loop().create_future()
+        with self._lock:
+            self._waiters.append(future)
+        return future
+
+    async def redraw_async(self):
+        """ Ask for a frame and wait until it has been drawn """
+        future = self.next_frame()
+        self.frame.invalidate()
+        self._pump_soon(future.get_loop())
+        return await future
+
+    def _store(self, value, sender=None):
+        with self._lock:
+            # Senders of a value no frame took are told it was dropped
+            dropped = []
+            if self._channel.pending:
+                dropped, self._senders = self._senders, []
+            self._channel.publish(value)
+            if sender is not None:
+                self._senders.append(sender)
+        for future in dropped:
+            future.get_loop().call_soon_threadsafe(_resolve, future, False)
+        self.frame.invalidate()
+        if self.frame.render_thread is None:
+            self._pump_soon(asyncio.get_running_loop())
+
+    def publish(self, value):
+        """
+        Give value to the next frame. A value not yet taken is replaced,
+        frames always draw the latest.
+        """
+        self._store(value)
+
+    async def send(self, value):
+        """
+        publish(value) then wait until a frame has taken it, giving
+        True, or a newer value has replaced it first, giving False
+        """
+        future = asyncio.get_running_loop().create_future()
+        self._store(value, future)
+        return await future
+
+    def take(self):
+        """
+        From redraw: (latest value, True if it is new since the last
+        take). The value stays available for later frames.
+        """
+        with self._lock:
+            value, fresh = self._channel.acquire()
+            senders, self._senders = self._senders, []
+        for future in senders:
+            future.get_loop().call_soon_threadsafe(_resolve, future, True)
+        return value, fresh
@@ -1,6 +1,21 @@
 from __future__ import print_function
+import logging
 import sys
+import threading
+import time
+from concurrent.futures import Future
+from contextlib import contextmanager
 from OpenGL import GL
+from pyopengltk.scheduler import OnDemandScheduler, FixedRateScheduler, \
+    VsyncScheduler
+from pyopengltk.stats import FrameStats
+from pyopengltk.gpuprofile import GPUProfiler
+from pyopengltk.capture import FrameCapture, read_pixels
+from pyopengltk.renderthread import RenderThread
+from pyopengltk.contextgroup import ContextGroup
+from pyopengltk.rendertarget import RenderTarget
+from pyopengltk.picking import Picker
+from pyopengltk.channel import TripleBuffer, Waker, call_wake_hooks
 
 if sys.version_info[0] < 3:
     import Tkinter as tk
@@ -9,28 +24,462 @@ else:
     import tkinter as tk
     from tkinter import dialog as dialog
 
+_log = logging.getLogger(__name__)
+
+# Framebuffer keyword arguments and their defaults, None leaves the
+# choice to the driver. depth_size=0 asks for no depth buffer at all.
+FRAMEBUFFER_OPTIONS = {
+    "double_buffer": True,
+    "depth_size": None,
+    "stencil_size": None,
+    "alpha_size": None,
+    "samples": None,
+    "srgb": False,
+}
+
 
 class BaseOpenGLFrame(tk.Frame):
     """ Common code for windows/x11 """
+    # Per thread, the frame whose context was last made current
+    _current = threading.local()
+    # Where Tk has no file handlers (Windows) publish() from other
+    # threads is polled for: milliseconds between checks, growing up to
+    # wake_interval_max while no data comes
+    wake_interval = 5
+    wake_interval_max = 100
+    # Call initgl again before the first frame after a resize, for code
+    # that sets its projection up there
+    initgl_on_resize = False
+
     def __init__(self, *args, **kw):
+        # Draw on a RenderThread instead of in Tk callbacks
+        self._use_render_thread = kw.pop('render_thread', False)
+        # Share GL objects with a ContextGroup or another frame
+        share = kw.pop('share_with', None)
+        if share is None:
+            share = ContextGroup()
+        elif not isinstance(share, ContextGroup):
+            share = share.context_group
+        self.context_group = share
+        # Context to ask for, the defaults give a legacy context
+        self.gl_version = kw.pop('gl_version', None)
+        self.profile = kw.pop('profile', None)
+        self.debug = kw.pop('debug', False)
+        self.no_error = kw.pop('no_error', False)
+        self.robust = kw.pop('robust', False)
+        if self.profile not in (None, "core", "compat"):
+            raise ValueError("profile must be None, 'core' or 'compat'")
+        self.context_options = None
+        # Framebuffer to ask for, what we got goes in self.framebuffer
+        self.framebuffer_options = dict(
+            (k, kw.pop(k, v)) for k, v in FRAMEBUFFER_OPTIONS.items())
+        self.framebuffer = None
+        # Draw into a RenderTarget at this fraction of the window size
+        self.render_target = None
+        render_scale = kw.pop('render_scale', None)
+        master = args[0] if args else kw.get('master')
+        if master is None:
+            # Where tk.Frame.__init__ will put us
+            master = getattr(tk, '_default_root', None)
+        self.tkChooseVisual(master, kw)
         # Set background to empty string to avoid
         # flickering overdraw by Tk
         kw['bg'] = ""
         tk.Frame.__init__(self, *args, **kw)
         self.bind('<Map>', self.tkMap)
+        self.bind('<Unmap>', self.tkUnmap)
         self.bind('<Configure>', self.tkResize)
         self.bind('<Expose>', self.tkExpose)
-        self.animate = 0
-        self.cb = None
+        self.bind('<Destroy>', self.tkDestroy)
+        # Cached from the events so the render path needs no Tcl calls
+        self._mapped = False
+        self.width, self.height = 1, 1
+        self._resized = False
         self.context_created = False
+        self.render_thread = None
+        self.dirty = False
+        self.stats = None
+        self.gpu_profiler = None
+        self.picker = None
+        self._channels = {}
+        self._channels_lock = threading.Lock()
+        self._tk_thread = threading.current_thread()
+        self._wake_pending = False
+        self._waker = None
+        self._polling_wakes = False
+        self._wake_delay = self.wake_interval
+        self._frame_hooks = []
+        self._drawing = False
+        self._polling_picks = False
+        self._scheduler = None
+        # True while the scheduler is the one animate made
+        self._auto_scheduler = False
+        self._swap_interval = None
+        self.animate = 0
+        self.render_scale = render_scale
+
+    @property
+    def animate(self):
+        """ Milliseconds per frame for continuous redraws, 0 for none """
+        return self._animate
+
+    @animate.setter
+    def animate(self, value):
+        self._animate = value
+        if value > 0 and self._swap_interval:
+            # The swap waits for the display, a timer would fight it
+            self.scheduler = VsyncScheduler()
+        elif value > 0:
+            self.scheduler = FixedRateScheduler(1000.0 / value)
+        else:
+            self.scheduler = OnDemandScheduler()
+        self._auto_scheduler = True
+
+    @property
+    def swap_interval(self):
+        """
+        Display refreshes per buffer swap: 0 for no vsync, 1 to sync to
+        every refresh, -1 for adaptive vsync (tears rather than waits
+        when a frame is late). None leaves the driver default.
+        """
+        return self._swap_interval
+
+    @swap_interval.setter
+    def swap_interval(self, value):
+        self._swap_interval = value
+        # Vsync or a timer, unless the scheduler was set by the user
+        if self._auto_scheduler and self._animate > 0:
+            self.animate = self._animate
+        if self.context_created and value is not None:
+            self.call_in_gl_thread(self._apply_swap_interval)
+
+    def _apply_swap_interval(self):
+        self.tkMakeCurrent()
+        interval = self.tkSwapInterval(self._swap_interval)
+        if interval != self._swap_interval:
+            _log.warning("Swap interval %s is not supported, got %s",
+                         self._swap_interval, interval)
+
+    @property
+    def render_scale(self):
+        """
+        Fraction of the window size redraw draws at, through an offscreen
+        render_target blitted to the window. None draws to the window.
+        """
+        if self.render_target is None:
+            return None
+        return self.render_target.scale
+
+    @render_scale.setter
+    def render_scale(self, value):
+        if value is None:
+            target, self.render_target = self.render_target, None
+            if target is not None and self.context_created:
+                self.call_in_gl_thread(self._release_render_target, target)
+        elif self.render_target is None:
+            if self.framebuffer_options["srgb"]:
+                color_format = GL.GL_SRGB8_ALPHA8
+            else:
+                color_format = GL.GL_RGBA8
+            self.render_target = RenderTarget(
+                value, depth=self.framebuffer_options["depth_size"] != 0,
+                color_format=color_format)
+        else:
+            self.render_target.scale = value
+        if self.context_created:
+            self.invalidate()
+
+    @property
+    def render_size(self):
+        """ Width and height of what redraw draws into """
+        if self.render_target is None:
+            return self.width, self.height
+        return self.render_target.width, self.render_target.height
+
+    def _release_render_target(self, target):
+        self.tkMakeCurrent()
+        target.release()
+
+    @property
+    def scheduler(self):
+        """ The FrameScheduler deciding when the next frame is drawn """
+        return self._scheduler
+
+    @scheduler.setter
+    def scheduler(self, value):
+        if self._scheduler is not None:
+            self._scheduler.detach()
+        self._scheduler = value
+        self._auto_scheduler = False
+        value.attach(self)
+        if self.context_created:
+            self.invalidate()
+
+    def enable_stats(self, size=300, report_every=0, callback=None,
+                     logger=None):
+        """
+        Start recording frame timings into self.stats (a FrameStats).
+        See pyopengltk.stats for the arguments.
+        """
+        self.stats = FrameStats(size, report_every, callback, logger)
+        self.stats.gpu = self.gpu_profiler
+        return self.stats
+
+    def disable_stats(self):
+        self.stats = None
+
+    def enable_gpu_profiling(self, size=300, max_pending=8):
+        """
+        Time redraw and any gpu_section on the GPU with timer queries.
+        The results appear under "gpu" in stats.summary()
+        """
+        self.gpu_profiler = GPUProfiler(size, max_pending)
+        if self.stats is not None:
+            self.stats.gpu = self.gpu_profiler
+        return self.gpu_profiler
+
+    def disable_gpu_profiling(self):
+        if self.gpu_profiler is not None and self.context_created:
+            self.call_in_gl_thread(self._release_gpu_profiler,
+                                   self.gpu_profiler).result()
+        self.gpu_profiler = None
+        if self.stats is not None:
+            self.stats.gpu = None
+
+    @contextmanager
+    def gpu_section(self, name):
+        """ Named section for the GPU profiler, does nothing when off """
+        if self.gpu_profiler is None:
+            yield
+        else:
+            with self.gpu_profiler.section(name):
+                yield
+
+    def _release_gpu_profiler(self, profiler):
+        self.tkMakeCurrent()
+        profiler.release()
+
+    def enable_picking(self, draw_ids, radius=2):
+        """
+        Pick with an id buffer, see pyopengltk.picking. draw_ids(frame,
+        picker) draws the scene with picker.set_object(id) per object.
+        """
+        if self.picker is not None:
+            self.disable_picking()
+        self.picker = Picker(draw_ids, radius)
+        self.add_frame_hook(self.picker)
+        return self.picker
+
+    def disable_picking(self):
+        if self.picker is None:
+            return
+        self.remove_frame_hook(self.picker)
+        if self.context_created:
+            self.call_in_gl_thread(self._release_picker, self.picker)
+        self.picker = None
+
+    def _release_picker(self, picker):
+        self.tkMakeCurrent()
+        picker.release()
+
+    def pick_at(self, x, y, callback):
+        """
+        Find what is drawn at window position x, y (y down, as in Tk
+        events). callback(result) gets a PickResult, or None when there
+        is nothing, a frame or two later where GL runs (the render
+        thread if there is one). Call from the Tk thread.
+        """
+        if self.picker is None:
+            raise RuntimeError("Call enable_picking first")
+        self.picker.request(x, y, callback)
+        self.invalidate()
+        if not self._polling_picks:
+            self._polling_picks = True
+            self.after(1, self._poll_picks)
+
+    def _poll_picks(self):
+        # Results arrive without drawing more frames
+        picker = self.picker
+        if picker is None or not picker.pending or not self.context_created:
+            self._polling_picks = False
+            return
+        self.call_in_gl_thread(self._poll_picker, picker)
+        self.after(2, self._poll_picks)
+
+    def _poll_picker(self, picker):
+        self.tkMakeCurrent()
+        picker.poll()
+
+    def channel(self, name, factory=None):
+        """
+        The TripleBuffer called name, for handing data from other
+        threads to redraw. factory is used when it is first made.
+        """
+        with self._channels_lock:
+            if name not in self._channels:
+                self._channels[name] = TripleBuffer(factory)
+            channel = self._channels[name]
+        if self._waker is None and not self._polling_wakes and \
+                self.render_thread is None and \
+                threading.current_thread() is self._tk_thread:
+            self._start_wakes()
+        return channel
+
+    def publish(self, name, *value):
+        """
+        From any thread: make value the newest for acquire(name) and ask
+        for a frame. Without a value, the channel's back() slot filled
+        in place is published.
+        """
+        self.channel(name).publish(*value)
+        self._invalidate_from_any_thread()
+
+    def acquire(self, name):
+        """ In redraw: (newest value of channel name, changed) """
+        return self.channel(name).acquire()
+
+    def _invalidate_from_any_thread(self):
+        if self.render_thread is not None or \
+                threading.current_thread() is self._tk_thread:
+            self.invalidate()
+            return
+        # Calling Tk from here would wait for the Tk thread (or fail
+        # outside mainloop), so wake it through the pipe it watches
+        self.dirty = True
+        self._wake_pending = True
+        waker = self._waker
+        if waker is not None:
+            waker.wake()
+        call_wake_hooks()
+
+    def _start_wakes(self):
+        # On the first channel use in the Tk thread, e.g. the acquire in
+        # redraw
+        try:
+            self._waker = Waker(self.tk, self._woken)
+        except (NotImplementedError, OSError, ImportError):
+            self._polling_wakes = True
+            self._wake_delay = self.wake_interval
+            self.after(self._wake_delay, self._poll_wakes)
+            return
+        if self._wake_pending:
+            # Published before there was a pipe
+            self._waker.wake()
+
+    def _woken(self):
+        self._wake_pending = False
+        if self.context_created:
+            self.invalidate()
+
+    def _poll_wakes(self):
+        if self.render_thread is not None or not self.winfo_exists():
+            self._polling_wakes = False
+            return
+        if self._wake_pending:
+            self._wake_delay = self.wake_interval
+            self._woken()
+        else:
+            self._wake_delay = min(2 * self._wake_delay,
+                                   self.wake_interval_max)
+        self.after(self._wake_delay, self._poll_wakes)
+
+    def add_frame_hook(self, func):
+        """ Call func(frame) after each redraw, before the swap """
+        self._frame_hooks.append(func)
+
+    def remove_frame_hook(self, func):
+        self._frame_hooks.remove(func)
+
+    def read_pixels(self, format="rgb"):
+        """
+        The frame contents as a numpy array, top row first. From redraw
+        or a frame hook this reads the back buffer being drawn, otherwise
+        the front buffer that is on the screen.
+        """
+        self.tkMakeCurrent()
+        if self._drawing and self.double_buffered:
+            buffer = GL.GL_BACK
+        else:
+            buffer = GL.GL_FRONT
+        return read_pixels(0, 0, self.width, self.height, format, buffer)
+
+    def start_capture(self, callback, nbuffers=3, format="rgb"):
+        """
+        Stream every frame to callback(array, frame_number) through a
+        FrameCapture. The arrays are only valid during the callback.
+        """
+        capture = FrameCapture(nbuffers, format, callback)
+        self.add_frame_hook(capture)
+        return capture
+
+    def stop_capture(self, capture):
+        """ Deliver the frames still in flight and free the buffers """
+        self.remove_frame_hook(capture)
+        if self.context_created:
+            self.call_in_gl_thread(self._finish_capture, capture).result()
+
+    def _finish_capture(self, capture):
+        self.tkMakeCurrent()
+        capture.finish()
+        capture.release()
+
+    def call_in_gl_thread(self, func, *args):
+        """
+        Run func(*args) where the GL context lives: on the render thread
+        before its next frame if there is one, otherwise right now.
+        Returns a concurrent.futures.Future.
+        """
+        if self.render_thread is not None:
+            return self.render_thread.call(func, *args)
+        future = Future()
+        future.set_result(func(*args))
+        return future
+
+    def _is_current(self):
+        return getattr(BaseOpenGLFrame._current, "frame", None) is self
+
+    def _set_current(self, current=True):
+        BaseOpenGLFrame._current.frame = self if current else None
 
     def tkMap(self, evt):
         """" Called when frame goes onto the screen """
         self._wid = self.winfo_id()
+        self._mapped = True
         if not self.context_created:
             self.tkCreateContext()
-            self.initgl()
+            self._set_current()
+            if self._swap_interval is not None:
+                self._apply_swap_interval()
+            _log.debug("Framebuffer %s", self.framebuffer)
+            if self.framebuffer_options["srgb"]:
+                GL.glEnable(GL.GL_FRAMEBUFFER_SRGB)
+            if self._use_render_thread:
+                # Hand the context over, the thread calls initgl
+                self.tkDoneCurrent()
+                self.render_thread = RenderThread(self)
+                self.render_thread.start()
+            else:
+                self.initgl()
             self.context_created = True
+            self.invalidate()
+
+    def tkUnmap(self, evt):
+        """ Called when frame goes off the screen """
+        self._mapped = False
+
+    def tkDestroy(self, evt):
+        """ Called when the frame is destroyed """
+        if evt.widget is not self:
+            return
+        if self.render_thread is not None:
+            self.render_thread.stop()
+            self.render_thread = None
+        self.context_group.remove(self)
+        if self._waker is not None:
+            self._waker.close()
+        if self.context_created:
+            self.context_created = False
+            self.tkDestroyContext()
 
     def printContext(self, extns=False):
         """ For debugging """
@@ -59,6 +508,62 @@ class BaseOpenGLFrame(tk.Frame):
             print("Old context errors arose")
             # raise
 
+    def invalidate(self):
+        """
+        Mark the frame as needing a redraw. Any number of calls before
+        the next idle give a single redraw.
+        """
+        self.dirty = True
+        if self.render_thread is not None:
+            self.render_thread.wake()
+        else:
+            self.scheduler.request()
+
+    request_redraw = invalidate
+
+    def _wants_framebuffer(self):
+        return self.framebuffer_options != FRAMEBUFFER_OPTIONS
+
+    @property
+    def double_buffered(self):
+        if self.framebuffer is not None:
+            return self.framebuffer["double_buffer"]
+        return self.framebuffer_options["double_buffer"]
+
+    def tkChooseVisual(self, master, kw):
+        # Platform dependent part: may set kw['visual'] before the
+        # Tk window exists, to get the framebuffer_options
+        pass
+
+    def _wants_context_attribs(self):
+        return bool(self.gl_version or self.profile or self.debug or
+                    self.no_error or self.robust)
+
+    def _context_attempts(self):
+        """
+        Options for the platform's CreateContextAttribsARB, to be tried
+        in turn. A legacy context is the last resort.
+        """
+        wanted = dict(version=self.gl_version, profile=self.profile,
+                      debug=self.debug, no_error=self.no_error,
+                      robust=self.robust)
+        if self.no_error and (self.debug or self.robust):
+            _log.warning("no_error cannot be combined with debug or robust")
+            wanted["no_error"] = False
+        yield wanted
+        if wanted["no_error"] or wanted["robust"]:
+            yield dict(wanted, no_error=False, robust=False)
+
+    def _context_created(self, options):
+        # options is None for a legacy context
+        self.context_options = options
+        if options is None:
+            if self._wants_context_attribs():
+                _log.warning("Could not create the requested context, "
+                             "using a legacy one")
+        else:
+            _log.debug("Created context %s", options)
+
     def tkCreateContext(self):
         # Platform dependent part
         raise NotImplementedError
@@ -71,10 +576,20 @@ class BaseOpenGLFrame(tk.Frame):
         # Platform dependent part
         raise NotImplementedError
 
+    def tkDoneCurrent(self):
+        # Platform dependent part: release the context from this thread
+        raise NotImplementedError
+
+    def tkDestroyContext(self):
+        # Platform dependent part: free the context, called on destroy
+        pass
+
+    def tkSwapInterval(self, interval):
+        # Platform dependent part: returns the interval actually set
+        return None
+
     def tkExpose(self, evt):
-        if self.cb:
-            self.after_cancel(self.cb)
-        self._display()
+        self.invalidate()
 
     def tkResize(self, evt):
         """
@@ -89,19 +604,62 @@ class BaseOpenGLFrame(tk.Frame):
             gluOrtho2D(left * ratio, right * ratio, bottom, top)
         (assuming that left, right, bottom and top are all equal and
          ratio=width/height)
+
+        Only the size is recorded here. The next frame sets the viewport,
+        and calls initgl if initgl_on_resize is set, however many
+        <Configure> events came first.
         """
         self.width, self.height = evt.width, evt.height
-        if self.winfo_ismapped():
-            GL.glViewport(0, 0, self.width, self.height)
-            self.initgl()
+        self._resized = True
+        if self._mapped and self.context_created:
+            self.invalidate()
 
     def _display(self):
-        self.update_idletasks()
+        if not self.context_created:
+            return
+        if self.render_thread is not None:
+            self.invalidate()
+            return
+        start = time.perf_counter()
+        slack = self.scheduler.frame_started(start)
+        swapped = self._render_frame(start, slack)
+        self.scheduler.frame_done(start, swapped)
+
+    def _render_frame(self, start, slack):
+        """ Draw and swap one frame, returns the time after the swap """
+        self.dirty = False
         self.tkMakeCurrent()
-        self.redraw()
+        if self._resized:
+            self._resized = False
+            GL.glViewport(0, 0, self.width, self.height)
+            if self.initgl_on_resize:
+                self.initgl()
+        current = time.perf_counter()
+        self._drawing = True
+        target = self.render_target
+        if self.gpu_profiler is not None:
+            self.gpu_profiler.begin_frame()
+        if target is not None:
+            target.bind(self.width, self.height)
+        self._draw()
+        if target is not None:
+            target.blit()
+        if self.gpu_profiler is not None:
+            self.gpu_profiler.end_frame()
+        for hook in self._frame_hooks:
+            hook(self)
+        self._drawing = False
+        drawn = time.perf_counter()
         self.tkSwapBuffers()
-        if self.animate > 0:
-            self.cb = self.after(self.animate, self._display)
+        swapped = time.perf_counter()
+        if self.stats is not None:
+            self.stats.record(start, current, drawn, swapped, slack,
+                              self.scheduler.dropped)
+        return swapped
+
+    def _draw(self):
+        # Subclasses may wrap the user redraw here
+        self.redraw()
 
     def initgl(self):
         # For the user code
@@ -0,0 +1,198 @@
+"""
+Drawing NumPy arrays of points, lines and triangles from one buffer
+
+glBegin/glVertex/glEnd costs a Python call per vertex. A Batch instead
+collects whole arrays, copies them into one interleaved vertex buffer
+(x, y, z, r, g, b, a as float32) and draws each primitive type with a
+single glDrawArrays:
+
+    def initgl(self):
+        self.batch = Batch()
+
+    def redraw(self):
+        self.batch.clear()
+        self.batch.points(xy, color=(0, 0, 0))
+        self.batch.lines(corners, indices=edges, color=(1, 0, 0))
+        self.batch.draw()
+
+Whatever is added stays until clear(), so a batch filled once is only
+uploaded once. When it changes the vertices go into the next region of
+a StreamBuffer, so the driver never waits for the GPU to finish with
+the last frame's copy.
+
+By default the fixed function vertex and color arrays are used. With a
+shader give the attribute locations instead: Batch(position=0, color=1).
+The buffer belongs to the context current at the first draw().
+"""
+import ctypes
+
+import numpy
+from OpenGL import GL
+
+from pyopengltk.stream import StreamBuffer
+
+# Drawing order of the primitive types
+MODES = (
+    ("points", GL.GL_POINTS),
+    ("lines", GL.GL_LINES),
+    ("triangles", GL.GL_TRIANGLES),
+)
+
+# Floats per vertex: position then color
+STRIDE = 7
+
+
+def _colors(color, n):
+    """ (n, 4) float32 colors from one color or one per vertex """
+    c = numpy.asarray(color)
+    if c.dtype == numpy.uint8:
+        c = c / 255.0
+    c = numpy.asarray(c, numpy.float32)
+    if c.shape[-1] == 3:
+        c = numpy.concatenate(
+            (c, numpy.ones(c.shape[:-1] + (1,), numpy.float32)), axis=-1)
+    if c.shape[-1] != 4:
+        raise ValueError("Colors need 3 or 4 components")
+    return numpy.broadcast_to(c.reshape(-1, 4), (n, 4))
+
+
+class Batch(object):
+    """
+    Points, lines and triangles drawn together from one vertex buffer
+
+    position, color : attribute locations for a shader, None for the
+                      fixed function arrays
+    """
+
+    def __init__(self, position=None, color=None):
+        self.position = position
+        self.color_location = color
+        self.color = (1.0, 1.0, 1.0, 1.0)
+        self._parts = dict((name, []) for name, mode in MODES)
+        self._counts = dict((name, 0) for name, mode in MODES)
+        self._stage = numpy.empty((0, STRIDE), numpy.float32)
+        self._dirty = False
+        self._stream = StreamBuffer(1024 * STRIDE * 4)
+        self._vao = None
+
+    def __len__(self):
+        return sum(self._counts.values())
+
+    def clear(self):
+        """ Remove everything, e.g. at the start of each redraw """
+        for name in self._parts:
+            self._parts[name] = []
+            self._counts[name] = 0
+        self._dirty = True
+
+    def _add(self, name, vertices, color, indices, per):
+        v = numpy.asarray(vertices, numpy.float32)
+        v = v.reshape(-1, v.shape[-1])
+        if v.shape[1] not in (2, 3):
+            raise ValueError("Vertices need 2 or 3 coordinates")
+        c = _colors(self.color if color is None else color, len(v))
+        if indices is not None:
+            indices = numpy.asarray(indices, numpy.intp).ravel()
+            v = v[indices]
+            c = c[indices]
+        if len(v) % per:
+            raise ValueError("%s need a multiple of %d vertices" % (name, per))
+        self._parts[name].append((v, c))
+        self._counts[name] += len(v)
+        self._dirty = True
+
+    def points(self, vertices, color=None, indices=None):
+        """
+        Add (n, 2|3) vertices. color is one RGB(A) color or one per
+        vertex, floats 0-1 or uint8. indices picks vertices by number.
+        """
+        self._add("points", vertices, color, indices, 1)
+
+    def lines(self, vertices, color=None, indices=None):
+        """ Add line segments, a pair of vertices each """
+        self._add("lines", vertices, color, indices, 2)
+
+    def line_strip(self, vertices, color=None):
+        """ Add a polyline through the vertices, as segments """
+        n = len(vertices)
+        if n > 1:
+            pairs = numpy.repeat(numpy.arange(n), 2)[1:-1]
+            self._add("lines", vertices, color, pairs, 2)
+
+    def triangles(self, vertices, color=None, indices=None):
+        """ Add triangles, three vertices each """
+        self._add("triangles", vertices, color, indices, 3)
+
+    def _fill(self):
+        """ Interleave everything into the staging array """
+        total = len(self)
+        if len(self._stage) < total:
+            self._stage = numpy.empty((max(total, 2 * len(self._stage)),
+                                       STRIDE), numpy.float32)
+        stage = self._stage
+        offset = 0
+        for name, mode in MODES:
+            for v, c in self._parts[name]:
+                end = offset + len(v)
+                stage[offset:end, :v.shape[1]] = v
+                if v.shape[1] == 2:
+                    stage[offset:end, 2] = 0.0
+                stage[offset:end, 3:] = c
+                offset = end
+        return stage[:total]
+
+    def _bind(self, offset):
+        nbytes = STRIDE * 4
+        position = ctypes.c_void_p(offset)
+        color = ctypes.c_void_p(offset + 12)
+        if self.position is None:
+            GL.glEnableClientState(GL.GL_VERTEX_ARRAY)
+            GL.glEnableClientState(GL.GL_COLOR_ARRAY)
+            GL.glVertexPointer(3, GL.GL_FLOAT, nbytes, position)
+            GL.glColorPointer(4, GL.GL_FLOAT, nbytes, color)
+            return
+        if self._vao is None:
+            self._vao = GL.glGenVertexArrays(1)
+            GL.glBindVertexArray(self._vao)
+            GL.glEnableVertexAttribArray(self.position)
+            if self.color_location is not None:
+                GL.glEnableVertexAttribArray(self.color_location)
+        else:
+            GL.glBindVertexArray(self._vao)
+        # The offset moves with the stream region
+        GL.glVertexAttribPointer(self.position, 3, GL.GL_FLOAT, False,
+                                 nbytes, position)
+        if self.color_location is not None:
+            GL.glVertexAttribPointer(self.color_location, 4, GL.GL_FLOAT,
+                                     False, nbytes, color)
+
+    def _unbind(self):
+        if self.position is None:
+            GL.glDisableClientState(GL.GL_COLOR_ARRAY)
+            GL.glDisableClientState(GL.GL_VERTEX_ARRAY)
+        else:
+            GL.glBindVertexArray(0)
+        GL.glBindBuffer(GL.GL_ARRAY_BUFFER, 0)
+
+    def draw(self):
+        """ Upload if anything changed and draw, one call per type """
+        if self._dirty or self._stream.buffer is None:
+            self._stream.write(self._fill())
+            self._dirty = False
+        self._stream.bind()
+        self._bind(self._stream.offset)
+        first = 0
+        for name, mode in MODES:
+            count = self._counts[name]
+            if count:
+                GL.glDrawArrays(mode, first, count)
+                first += count
+        self._unbind()
+
+    def release(self):
+        """ Delete the GL objects, needs the context to be current """
+        if self._vao is not None:
+            GL.glDeleteVertexArrays(1, [self._vao])
+            self._vao = None
+        self._stream.release()
+        self._dirty = True
@@ -0,0 +1,217 @@
+"""
+Camera matrices computed with NumPy instead of the GL matrix stack
+
+Reading matrices back with glGetDoublev, gluProject or gluUnProject
+waits for the GL pipeline. Here the view and projection live on the CPU
+as 4x4 float64 arrays (row major, acting on column vectors like the GL
+documentation writes them) and are only sent to GL once per frame:
+
+    camera.load()                        # fixed function
+    GL.glUniformMatrix4fv(loc, 1, GL.GL_TRUE,
+                          camera.matrix().astype(numpy.float32))
+
+The second form also works in core profile contexts.
+"""
+import math
+
+import numpy
+from OpenGL import GL
+
+
+def _normalize(v):
+    n = numpy.linalg.norm(v)
+    return v / n if n > 0 else v
+
+
+def translate(x, y, z):
+    m = numpy.identity(4)
+    m[:3, 3] = x, y, z
+    return m
+
+
+def rotate(angle, x, y, z):
+    """ Like glRotate: angle in degrees about the axis (x, y, z) """
+    x, y, z = _normalize(numpy.array((x, y, z), float))
+    c = math.cos(math.radians(angle))
+    s = math.sin(math.radians(angle))
+    t = 1 - c
+    m = numpy.identity(4)
+    m[:3, :3] = ((t * x * x + c, t * x * y - s * z, t * x * z + s * y),
+                 (t * x * y + s * z, t * y * y + c, t * y * z - s * x),
+                 (t * x * z - s * y, t * y * z + s * x, t * z * z + c))
+    return m
+
+
+def look_at(eye, center, up):
+    """ Like gluLookAt """
+    eye = numpy.asarray(eye, float)
+    f = _normalize(numpy.asarray(center, float) - eye)
+    s = _normalize(numpy.cross(f, up))
+    u = numpy.cross(s, f)
+    m = numpy.identity(4)
+    m[0, :3] = s
+    m[1, :3] = u
+    m[2, :3] = -f
+    m[:3, 3] = -numpy.dot(m[:3, :3], eye)
+    return m
+
+
+def perspective(fovy, aspect, near, far):
+    """ Like gluPerspective, fovy in degrees """
+    f = 1.0 / math.tan(math.radians(fovy) / 2)
+    m = numpy.zeros((4, 4))
+    m[0, 0] = f / aspect
+    m[1, 1] = f
+    m[2, 2] = (far + near) / (near - far)
+    m[2, 3] = 2 * far * near / (near - far)
+    m[3, 2] = -1
+    return m
+
+
+def ortho(left, right, bottom, top, near, far):
+    """ Like glOrtho """
+    m = numpy.identity(4)
+    m[0, 0] = 2.0 / (right - left)
+    m[1, 1] = 2.0 / (top - bottom)
+    m[2, 2] = -2.0 / (far - near)
+    m[:3, 3] = (-(right + left) / (right - left),
+                -(top + bottom) / (top - bottom),
+                -(far + near) / (far - near))
+    return m
+
+
+def project(points, matrix, viewport):
+    """
+    Like gluProject for an (..., 3) array of points. matrix is the
+    projection times the modelview, viewport is (x, y, width, height).
+    """
+    points = numpy.asarray(points, float)
+    clip = numpy.dot(points, matrix[:3, :3].T) + matrix[:3, 3]
+    w = numpy.dot(points, matrix[3, :3]) + matrix[3, 3]
+    ndc = clip / w[..., None]
+    x, y, width, height = viewport
+    return numpy.stack((x + (ndc[..., 0] + 1) * width / 2,
+                        y + (ndc[..., 1] + 1) * height / 2,
+                        (ndc[..., 2] + 1) / 2), axis=-1)
+
+
+def unproject(window, matrix, viewport):
+    """
+    Like gluUnProject for an (..., 3) array of window coordinates (y up,
+    depth 0 to 1), giving the points in object coordinates
+    """
+    window = numpy.asarray(window, float)
+    x, y, width, height = viewport
+    ndc = numpy.stack(((window[..., 0] - x) * 2 / width - 1,
+                       (window[..., 1] - y) * 2 / height - 1,
+                       window[..., 2] * 2 - 1), axis=-1)
+    inverse = numpy.linalg.inv(matrix)
+    obj = numpy.dot(ndc, inverse[:3, :3].T) + inverse[:3, 3]
+    w = numpy.dot(ndc, inverse[3, :3]) + inverse[3, 3]
+    return obj / w[..., None]
+
+
+def gl_matrix(m):
+    """ Column major copy for glLoadMatrixd """
+    return numpy.ascontiguousarray(m.T)
+
+
+class Camera(object):
+    """
+    An eye looking at center from distance along +z, at a scene moved
+    by the mouse through self.model (the old GL modelview matrix).
+
+    The mouse methods take deltas in pixels, so motion events can be
+    added up and applied once per frame.
+    """
+
+    def __init__(self, center=(0.0, 0.0, 0.0), distance=10.0, fovy=30.0,
+                 near=0.1, far=1000.0):
+        self.center = numpy.array(center, float)
+        self.distance = distance
+        self.fovy = fovy
+        self.near = near
+        self.far = far
+        self.width, self.height = 1, 1
+        self.model = numpy.identity(4)
+
+    def resize(self, width, height):
+        self.width, self.height = max(1, width), max(1, height)
+
+    @property
+    def viewport(self):
+        return (0, 0, self.width, self.height)
+
+    def reset(self):
+        """ Forget the rotations and translations """
+        self.model = numpy.identity(4)
+
+    def projection(self):
+        return perspective(self.fovy, self.width / float(self.height),
+                           self.near, self.far)
+
+    def view(self):
+        """ The modelview matrix: look at center, then the mouse motion """
+        eye = self.center + (0.0, 0.0, self.distance)
+        return numpy.dot(look_at(eye, self.center, (0.0, 1.0, 0.0)),
+                         self.model)
+
+    def matrix(self):
+        """ Projection times view, for a single uniform """
+        return numpy.dot(self.projection(), self.view())
+
+    def load(self):
+        """ Set the GL projection and modelview matrices """
+        GL.glMatrixMode(GL.GL_PROJECTION)
+        GL.glLoadMatrixd(gl_matrix(self.projection()))
+        GL.glMatrixMode(GL.GL_MODELVIEW)
+        GL.glLoadMatrixd(gl_matrix(self.view()))
+
+    def pixel_size(self):
+        """ Scene units per pixel at the depth of the center """
+        depth = -numpy.dot(self.view(), numpy.append(self.center, 1.0))[2]
+        return 2 * depth * math.tan(math.radians(self.fovy) / 2) / self.height
+
+    def _about_center(self, m):
+        # Apply m in eye orientation around the center, before self.model
+        c = self.center
+        self.model = translate(*c).dot(m).dot(translate(*-c)).dot(self.model)
+
+    def rotate(self, dx, dy, scale=0.5):
+        """ Turn about the center, scale degrees per pixel """
+        self._about_center(numpy.dot(rotate(scale * dy, 1.0, 0.0, 0.0),
+                                     rotate(scale * dx, 0.0, 1.0, 0.0)))
+
+    def trackball(self, x0, y0, x1, y1):
+        """ Virtual trackball from window position (x0, y0) to (x1, y1) """
+        def sphere(x, y):
+            r = min(self.width, self.height) / 2.0
+            p = numpy.array(((x - self.width / 2.0) / r,
+                             (self.height / 2.0 - y) / r, 0.0))
+            d = numpy.dot(p, p)
+            if d < 1:
+                p[2] = math.sqrt(1 - d)
+            return _normalize(p)
+        a, b = sphere(x0, y0), sphere(x1, y1)
+        axis = numpy.cross(a, b)
+        if not axis.any():
+            return
+        angle = math.degrees(math.acos(min(1.0, numpy.dot(a, b))))
+        self._about_center(rotate(angle, *axis))
+
+    def translate(self, dx, dy):
+        """ Move the scene with the mouse, dy down the window """
+        s = self.pixel_size()
+        self.model = numpy.dot(translate(s * dx, -s * dy, 0.0), self.model)
+
+    def zoom(self, factor):
+        """ Move the eye, factor < 1 comes closer """
+        self.distance *= factor
+
+    def project(self, points):
+        """ Window coordinates (y up) of scene points """
+        return project(points, self.matrix(), self.viewport)
+
+    def unproject(self, x, y, z):
+        """ Scene point at window x, y (y up) and depth z (0 to 1) """
+        return unproject((x, y, z), self.matrix(), self.viewport)
@@ -0,0 +1,169 @@
+"""
+Reading back what was rendered as NumPy arrays
+
+read_pixels is a plain synchronous glReadPixels. FrameCapture streams
+frames through a ring of pixel pack buffers: the read of frame N is
+queued on the GPU and only mapped nbuffers-1 frames later, so the
+transfer overlaps with rendering the following frames. The arrays it
+hands out are views of the mapped buffer with no copy, valid until the
+next frame is captured.
+"""
+import ctypes
+from collections import deque
+
+import numpy
+from OpenGL import GL
+
+# name : (GL format, GL type, channels, numpy dtype)
+FORMATS = {
+    "rgb": (GL.GL_RGB, GL.GL_UNSIGNED_BYTE, 3, numpy.uint8),
+    "rgba": (GL.GL_RGBA, GL.GL_UNSIGNED_BYTE, 4, numpy.uint8),
+    "bgra": (GL.GL_BGRA, GL.GL_UNSIGNED_BYTE, 4, numpy.uint8),
+    "luminance": (GL.GL_RED, GL.GL_UNSIGNED_BYTE, 1, numpy.uint8),
+    "depth": (GL.GL_DEPTH_COMPONENT, GL.GL_FLOAT, 1, numpy.float32),
+}
+
+
+def _shape(width, height, channels):
+    if channels == 1:
+        return (height, width)
+    return (height, width, channels)
+
+
+def read_pixels(x, y, width, height, format="rgb", buffer=None, out=None):
+    """
+    Read a region of the current framebuffer into a numpy array of
+    shape (height, width, channels). The first row is the top of the
+    image (a flipped view, not a copy). buffer is for glReadBuffer,
+    e.g. GL_FRONT or GL_BACK. out is an optional C contiguous array to
+    read into.
+    """
+    glformat, gltype, channels, dtype = FORMATS[format]
+    if out is None:
+        out = numpy.empty(_shape(width, height, channels), dtype)
+    if buffer is not None:
+        GL.glReadBuffer(buffer)
+    GL.glPixelStorei(GL.GL_PACK_ALIGNMENT, 1)
+    GL.glReadPixels(x, y, width, height, glformat, gltype, out)
+    return out[::-1]
+
+
+class FrameCapture(object):
+    """
+    Asynchronous readback through a ring of pixel pack buffers
+
+    nbuffers : PBOs in the ring, frames are handed out nbuffers-1 late
+    format : one of FORMATS
+    callback : called as callback(array, frame_number) for each frame
+               when used as a frame hook (see BaseOpenGLFrame.add_frame_hook)
+
+    The arrays point straight into mapped GL memory. They are read only
+    and become invalid at the next capture() or release(): copy them if
+    they are needed for longer.
+    """
+
+    def __init__(self, nbuffers=3, format="rgb", callback=None):
+        self.nbuffers = max(2, nbuffers)
+        self.format = format
+        self.callback = callback
+        self.nframes = 0
+        self._pbos = None
+        self._size = None
+        self._free = []
+        self._inflight = deque()
+        self._mapped = None
+
+    def _allocate(self, width, height):
+        self.release()
+        channels = FORMATS[self.format][2]
+        itemsize = numpy.dtype(FORMATS[self.format][3]).itemsize
+        nbytes = width * height * channels * itemsize
+        self._pbos = [int(b) for b in GL.glGenBuffers(self.nbuffers)]
+        for pbo in self._pbos:
+            GL.glBindBuffer(GL.GL_PIXEL_PACK_BUFFER, pbo)
+            GL.glBufferData(GL.GL_PIXEL_PACK_BUFFER, nbytes, None,
+                            GL.GL_STREAM_READ)
+        GL.glBindBuffer(GL.GL_PIXEL_PACK_BUFFER, 0)
+        self._size = (width, height, nbytes)
+        self._free = list(self._pbos)
+
+    def _unmap(self):
+        if self._mapped is not None:
+            GL.glBindBuffer(GL.GL_PIXEL_PACK_BUFFER, self._mapped)
+            GL.glUnmapBuffer(GL.GL_PIXEL_PACK_BUFFER)
+            GL.glBindBuffer(GL.GL_PIXEL_PACK_BUFFER, 0)
+            self._free.append(self._mapped)
+            self._mapped = None
+
+    def _map(self, pbo, number):
+        width, height, nbytes = self._size
+        glformat, gltype, channels, dtype = FORMATS[self.format]
+        GL.glBindBuffer(GL.GL_PIXEL_PACK_BUFFER, pbo)
+        ptr = GL.glMapBufferRange(GL.GL_PIXEL_PACK_BUFFER, 0, nbytes,
+                                  GL.GL_MAP_READ_BIT)
+        GL.glBindBuffer(GL.GL_PIXEL_PACK_BUFFER, 0)
+        self._mapped = pbo
+        data = (ctypes.c_ubyte * nbytes).from_address(ptr)
+        arr = numpy.frombuffer(data, dtype).reshape(
+            _shape(width, height, channels))[::-1]
+        arr.flags.writeable = False
+        return arr, number
+
+    def capture(self, x, y, width, height, buffer=None):
+        """
+        Queue a read of the current framebuffer. Returns the oldest
+        finished (array, frame_number), or (None, None) while the ring
+        is filling up.
+        """
+        self._unmap()
+        if self._size is None or self._size[:2] != (width, height):
+            self._allocate(width, height)
+        pbo = self._free.pop()
+        glformat, gltype = FORMATS[self.format][:2]
+        if buffer is not None:
+            GL.glReadBuffer(buffer)
+        GL.glPixelStorei(GL.GL_PACK_ALIGNMENT, 1)
+        GL.glBindBuffer(GL.GL_PIXEL_PACK_BUFFER, pbo)
+        GL.glReadPixels(x, y, width, height, glformat, gltype,
+                        ctypes.c_void_p(0))
+        GL.glBindBuffer(GL.GL_PIXEL_PACK_BUFFER, 0)
+        self._inflight.append((pbo, self.nframes))
+        self.nframes += 1
+        if self._free:
+            return None, None
+        # Every buffer is in flight, hand out the oldest
+        pbo, number = self._inflight.popleft()
+        return self._map(pbo, number)
+
+    def flush(self):
+        """
+        Yield (array, frame_number) for the frames still in flight,
+        oldest first. Each array is valid until the next one is yielded.
+        """
+        while self._inflight:
+            self._unmap()
+            pbo, number = self._inflight.popleft()
+            yield self._map(pbo, number)
+        self._unmap()
+
+    def __call__(self, frame):
+        """ Frame hook: capture the frame just drawn """
+        arr, number = self.capture(0, 0, frame.width, frame.height)
+        if arr is not None and self.callback is not None:
+            self.callback(arr, number)
+
+    def finish(self):
+        """ Pass the frames still in flight to the callback """
+        for arr, number in self.flush():
+            if self.callback is not None:
+                self.callback(arr, number)
+
+    def release(self):
+        """ Delete the buffers, needs the context to be current """
+        self._unmap()
+        if self._pbos:
+            GL.glDeleteBuffers(len(self._pbos), self._pbos)
+        self._pbos = None
+        self._size = None
+        self._free = []
+        self._inflight.clear()
@@ -0,0 +1,167 @@
+"""
+Handing data from worker threads to redraw
+
+A TripleBuffer holds three slots: one the producer fills, one ready
+for the next frame and one redraw is using. Publishing and acquiring
+only swap slot numbers under a lock held for a few bytecodes, never
+while data is written or drawn, so neither side waits for the other
+and redraw always gets the newest complete value:
+
+    # worker thread
+    frame.publish("points", compute_points())
+
+    # redraw
+    points, changed = frame.acquire("points")
+    if changed:
+        upload(points)                  # only when there is new data
+
+Values are passed by reference, nothing is copied. To reuse arrays
+instead of making new ones, give the channel a factory and fill the
+producer's slot in place. It is not read by redraw until published:
+
+    channel = frame.channel("image", lambda: numpy.empty((h, w)))
+
+    # worker thread
+    detector.read_into(channel.back())
+    frame.publish("image")
+
+A publish() from a worker thread wakes Tk through a Waker, a pipe the
+Tcl notifier watches, so neither thread polls the other. Event loops
+that drive Tk themselves (pyopengltk.aio) add a wake hook to be told.
+"""
+import os
+import threading
+
+# publish() without a value: the back slot was filled in place
+_IN_PLACE = object()
+_wake_hooks = []
+
+
+def add_wake_hook(hook):
+    """
+    Call hook() in the publishing thread when a frame drawn by Tk gets
+    data from another thread
+    """
+    _wake_hooks.append(hook)
+
+
+def remove_wake_hook(hook):
+    _wake_hooks.remove(hook)
+
+
+def call_wake_hooks():
+    """ From the publishing thread """
+    for hook in list(_wake_hooks):
+        hook()
+
+
+def _set_nonblocking(fd):
+    import fcntl
+    flags = fcntl.fcntl(fd, fcntl.F_GETFL)
+    fcntl.fcntl(fd, fcntl.F_SETFL, flags | os.O_NONBLOCK)
+
+
+class Waker(object):
+    """
+    Calls callback() in the Tk thread after wake() from any thread.
+    Wakes made before the callback runs are folded into one call.
+
+    tkapp : the Tcl interpreter (widget.tk) of the thread to wake.
+            Raises NotImplementedError where it has no file handlers
+            (Windows).
+    """
+
+    def __init__(self, tkapp, callback):
+        if not hasattr(tkapp, "createfilehandler"):
+            raise NotImplementedError("Tk has no file handlers here")
+        import _tkinter
+        self._tkapp = tkapp
+        self._callback = callback
+        self._pending = False
+        self._read, self._write = os.pipe()
+        _set_nonblocking(self._read)
+        _set_nonblocking(self._write)
+        tkapp.createfilehandler(self._read, _tkinter.READABLE,
+                                self._readable)
+
+    def wake(self):
+        """ From any thread """
+        if self._pending:
+            return
+        self._pending = True
+        try:
+            os.write(self._write, b"!")
+        except (OSError, TypeError):
+            # Full, so a wake is queued anyway, or closed
+            pass
+
+    def _readable(self, fd, mask):
+        try:
+            while os.read(self._read, 512):
+                pass
+        except OSError:
+            pass
+        # After draining: a wake() from now on writes again
+        self._pending = False
+        self._callback()
+
+    def close(self):
+        """ In the Tk thread """
+        if self._write is None:
+            return
+        write, self._write = self._write, None
+        self._tkapp.deletefilehandler(self._read)
+        os.close(self._read)
+        os.close(write)
+
+
+class TripleBuffer(object):
+    """
+    Latest value channel for one producer thread and one consumer
+
+    factory : makes the contents of each slot for back(), None to
+              publish new objects
+    """
+
+    def __init__(self, factory=None):
+        if factory is None:
+            self._slots = [None, None, None]
+        else:
+            self._slots = [factory(), factory(), factory()]
+        self._back, self._ready, self._front = 0, 1, 2
+        self._fresh = False
+        self._lock = threading.Lock()
+        self.published = 0
+
+    def back(self):
+        """ The producer's slot, to fill before publish() """
+        return self._slots[self._back]
+
+    def publish(self, value=_IN_PLACE):
+        """
+        Make value (or the back slot) the newest, replacing any value
+        the consumer has not acquired yet
+        """
+        if value is not _IN_PLACE:
+            self._slots[self._back] = value
+        with self._lock:
+            self._back, self._ready = self._ready, self._back
+            self._fresh = True
+            self.published += 1
+
+    def acquire(self):
+        """
+        (newest value, True if it changed since the last acquire). The
+        value stays the consumer's until the next acquire.
+        """
+        with self._lock:
+            changed = self._fresh
+            if changed:
+                self._front, self._ready = self._ready, self._front
+                self._fresh = False
+        return self._slots[self._front], changed
+
+    @property
+    def pending(self):
+        """ True when a value was published and not acquired yet """
+        return self._fresh
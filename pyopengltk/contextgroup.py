@@ -0,0 +1,111 @@
+"""
+Frames sharing one set of GL objects
+
+Frames created with the same ContextGroup get contexts that share their
+object namespace (a GLX share list, wglShareLists on Windows), so a
+buffer, texture or shader program made in one of them can be used by
+all. Container objects (vertex array objects, framebuffers) are never
+shared by GL and still need one per frame.
+
+    group = ContextGroup()
+    left = MyFrame(root, share_with=group)
+    right = MyFrame(root, share_with=left)    # a frame works too
+
+    def initgl(self):
+        self.vbo = self.context_group.resource("points", upload_points)
+
+Every frame has a context_group, a private one unless share_with was
+given, so code using the registry works the same with a single frame.
+Contexts only share when the driver can: the frames need compatible
+framebuffer configs on the same screen (or GPU on Windows).
+"""
+import logging
+import threading
+
+from OpenGL import GL
+
+from pyopengltk import shadercache
+
+_log = logging.getLogger(__name__)
+
+
+class ContextGroup(object):
+    """
+    The frames sharing GL objects and a registry of those objects
+
+    resource(key, create, delete) returns the object stored under key,
+    calling create() the first time from whichever frame asks first.
+    """
+
+    def __init__(self):
+        self._contexts = {}
+        self._resources = {}
+        self._lock = threading.RLock()
+
+    @property
+    def frames(self):
+        """ The frames of the group which have a context """
+        return list(self._contexts)
+
+    @property
+    def context(self):
+        """ A native context to share with, None for the first frame """
+        with self._lock:
+            for context in self._contexts.values():
+                return context
+        return None
+
+    def add(self, frame, context):
+        """ Called by the platform code once the frame has its context """
+        with self._lock:
+            self._contexts[frame] = context
+
+    def remove(self, frame):
+        """ Called when the frame is destroyed """
+        with self._lock:
+            self._contexts.pop(frame, None)
+            if not self._contexts and self._resources:
+                # The objects went away with the last context
+                _log.debug("Context group emptied, forgetting %d objects",
+                           len(self._resources))
+                self._resources.clear()
+
+    def resource(self, key, create, delete=None):
+        """
+        The object registered as key, made by create() if it is new.
+        Needs a context of the group current. delete(obj) is called by
+        release(key) to free it.
+        """
+        with self._lock:
+            if key not in self._resources:
+                obj = create()
+                # Other contexts only see the object after a flush
+                GL.glFlush()
+                self._resources[key] = (obj, delete)
+            return self._resources[key][0]
+
+    def program(self, **sources):
+        """
+        Shader program linked from sources given by stage (vertex=...,
+        fragment=...), built once for the group. The linked binary is
+        cached on disk when the driver allows, see shadercache.
+        """
+        key = ("program", shadercache.source_hash(**sources))
+        return self.resource(
+            key, lambda: shadercache.default_cache().program(**sources),
+            GL.glDeleteProgram)
+
+    def __contains__(self, key):
+        return key in self._resources
+
+    def release(self, key):
+        """ Delete one object, needs a context of the group current """
+        with self._lock:
+            obj, delete = self._resources.pop(key)
+        if delete is not None:
+            delete(obj)
+
+    def release_all(self):
+        """ Delete every object, needs a context of the group current """
+        for key in list(self._resources):
+            self.release(key)
@@ -0,0 +1,137 @@
+"""
+GPU timing of the frame using timer queries
+
+GL work only runs when the driver gets to it, so timing redraw() on the
+CPU mostly measures how long it took to queue the commands. Here each
+section is bracketed by two GL_TIMESTAMP queries (glQueryCounter),
+which unlike GL_TIME_ELAPSED queries may be nested. Results are read
+back a few frames later, only once the driver says they are available,
+so profiling never waits for the GPU.
+"""
+import ctypes
+import logging
+from collections import deque
+from contextlib import contextmanager
+from OpenGL import GL
+from OpenGL.raw.GL.VERSION.GL_3_3 import glGetQueryObjectui64v
+
+from pyopengltk.stats import percentile
+
+_log = logging.getLogger(__name__)
+
+
+class GPUProfiler(object):
+    """
+    Times named sections of each frame on the GPU
+
+    size : number of results kept per section
+    max_pending : frames in flight before profiling skips a frame
+
+    The frame calls begin_frame/end_frame around redraw, which is the
+    "redraw" section. User code opens nested sections with:
+
+        with frame.gpu_section("points"):
+            ...
+    """
+
+    def __init__(self, size=300, max_pending=8):
+        self.size = size
+        self.max_pending = max_pending
+        self.skipped = 0
+        self.results = {}
+        self._free = []
+        self._queries = []
+        self._pending = deque()
+        self._sections = None
+        self._stack = []
+
+    def _query(self):
+        if not self._free:
+            names = GL.glGenQueries(16)
+            self._queries.extend(int(q) for q in names)
+            self._free.extend(int(q) for q in names)
+        q = self._free.pop()
+        GL.glQueryCounter(q, GL.GL_TIMESTAMP)
+        return q
+
+    def begin_frame(self):
+        self.collect()
+        if len(self._pending) >= self.max_pending:
+            self.skipped += 1
+            self._sections = None
+            return
+        self._sections = []
+        self.begin("redraw")
+
+    def end_frame(self):
+        if self._sections is None:
+            return
+        while self._stack:
+            self.end()
+        self._pending.append(self._sections)
+        self._sections = None
+
+    def begin(self, name):
+        if self._sections is None:
+            return
+        section = [name, self._query(), None]
+        self._sections.append(section)
+        self._stack.append(section)
+
+    def end(self):
+        if self._sections is None or not self._stack:
+            return
+        self._stack.pop()[2] = self._query()
+
+    @contextmanager
+    def section(self, name):
+        self.begin(name)
+        try:
+            yield
+        finally:
+            self.end()
+
+    def collect(self):
+        """ Read back every finished frame without waiting """
+        value = GL.GLuint64(0)
+        while self._pending:
+            sections = self._pending[0]
+            # The redraw section is ended last, by end_frame
+            last = sections[0][2]
+            if not GL.glGetQueryObjectiv(last, GL.GL_QUERY_RESULT_AVAILABLE):
+                break
+            self._pending.popleft()
+            for name, q0, q1 in sections:
+                glGetQueryObjectui64v(q0, GL.GL_QUERY_RESULT,
+                                      ctypes.byref(value))
+                t0 = value.value
+                glGetQueryObjectui64v(q1, GL.GL_QUERY_RESULT,
+                                      ctypes.byref(value))
+                if name not in self.results:
+                    self.results[name] = deque(maxlen=self.size)
+                self.results[name].append((value.value - t0) * 1e-6)
+                self._free.extend((q0, q1))
+
+    def summary(self):
+        """ Dict of section -> mean/p50/p95/p99/max in ms """
+        result = {}
+        for name, times in self.results.items():
+            v = sorted(times)
+            result[name] = {
+                "mean": sum(v) / max(1, len(v)),
+                "p50": percentile(v, 50),
+                "p95": percentile(v, 95),
+                "p99": percentile(v, 99),
+                "max": v[-1] if v else 0.0,
+            }
+        return result
+
+    def release(self):
+        """ Delete the query objects, needs the context to be current """
+        if self._queries:
+            GL.glDeleteQueries(len(self._queries), self._queries)
+        self._queries = []
+        self._free = []
+        self._pending.clear()
+        self._stack = []
+        self._sections = None
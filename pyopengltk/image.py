@@ -0,0 +1,325 @@
+"""
+Showing live NumPy images, e.g. from a detector or camera
+
+An ImageView keeps the image in textures and draws it with a shader
+that applies the contrast levels and a colormap on the GPU, so a new
+frame costs one copy of the array:
+
+    def initgl(self):
+        self.view = ImageView(levels=(0, 4000), colormap=lut)
+
+    def redraw(self):
+        GL.glClear(GL.GL_COLOR_BUFFER_BIT)
+        self.view.draw(self.view.fit(self.width, self.height))
+
+    def on_new_frame(self, array):          # in the Tk thread
+        self.view.set_image(array)
+        self.invalidate()
+
+Images are uint8, uint16 or float32 arrays of shape (rows, columns) or
+(rows, columns, channels) with 1 to 4 channels, row 0 at the top.
+They are copied into a ring of pixel buffer objects (a StreamBuffer)
+and go to the textures with glTexSubImage2D, which only allocates
+again when the shape or dtype change. Images bigger than
+GL_MAX_TEXTURE_SIZE are split into tiles. The shader needs GL 3.2,
+core or compatibility profile.
+"""
+import ctypes
+import logging
+
+import numpy
+from OpenGL import GL
+
+from pyopengltk import shadercache
+from pyopengltk.stream import StreamBuffer
+
+_log = logging.getLogger(__name__)
+
+# dtype -> (pixel type, internal format by channels, full scale)
+FORMATS = {
+    numpy.dtype(numpy.uint8): (
+        GL.GL_UNSIGNED_BYTE,
+        (GL.GL_R8, GL.GL_RG8, GL.GL_RGB8, GL.GL_RGBA8), 255.0),
+    numpy.dtype(numpy.uint16): (
+        GL.GL_UNSIGNED_SHORT,
+        (GL.GL_R16, GL.GL_RG16, GL.GL_RGB16, GL.GL_RGBA16), 65535.0),
+    numpy.dtype(numpy.float32): (
+        GL.GL_FLOAT,
+        (GL.GL_R32F, GL.GL_RG32F, GL.GL_RGB32F, GL.GL_RGBA32F), 1.0),
+}
+
+PIXEL_FORMATS = (GL.GL_RED, GL.GL_RG, GL.GL_RGB, GL.GL_RGBA)
+
+vertex_shader = """#version 150
+uniform vec4 rect;
+out vec2 texcoord;
+void main()
+{
+    vec2 corner = vec2(gl_VertexID & 1, gl_VertexID >> 1);
+    gl_Position = vec4(mix(rect.xy, rect.zw, corner), 0.0, 1.0);
+    // Row 0 of the texture is the top of the image
+    texcoord = vec2(corner.x, 1.0 - corner.y);
+}
+"""
+
+fragment_shader = """#version 150
+uniform sampler2D image;
+uniform sampler2D lut;
+uniform int channels;
+uniform int lut_size;
+uniform vec2 levels;
+in vec2 texcoord;
+out vec4 color;
+void main()
+{
+    vec4 v = texture(image, texcoord);
+    vec4 c = clamp((v - levels.x) * levels.y, 0.0, 1.0);
+    if (channels == 1 && lut_size > 0) {
+        float x = (c.r * (lut_size - 1) + 0.5) / lut_size;
+        c = texture(lut, vec2(x, 0.5));
+    } else if (channels == 1) {
+        c = vec4(c.rrr, 1.0);
+    } else if (channels == 2) {
+        c = vec4(c.rrr, v.g);
+    } else if (channels == 3) {
+        c.a = 1.0;
+    } else {
+        c.a = v.a;
+    }
+    color = c;
+}
+"""
+
+
+def _shape(image):
+    if image.ndim == 2:
+        return image.shape + (1,)
+    if image.ndim == 3 and 1 <= image.shape[2] <= 4:
+        return image.shape
+    raise ValueError("Images need shape (rows, columns[, 1 to 4 channels])")
+
+
+class ImageView(object):
+    """
+    Textures holding an image and the shader to draw them
+
+    levels : (low, high) data values shown black to white, None for the
+             full range of the dtype (0 to 1 for float32)
+    colormap : (n, 3|4) colors for single channel images, None for grey
+    smooth : interpolate between pixels when zoomed in
+    max_tile : largest texture side, None for GL_MAX_TEXTURE_SIZE
+
+    Needs a context current except for set_image and the attributes.
+    """
+
+    def __init__(self, levels=None, colormap=None, smooth=False,
+                 max_tile=None, nbuffers=3):
+        self.levels = levels
+        self.colormap = colormap
+        self.smooth = smooth
+        self.max_tile = max_tile
+        self.nbuffers = nbuffers
+        self.shape = None
+        self.dtype = None
+        self.uploads = 0
+        self.tiles = []
+        self._pending = None
+        self._stream = None
+        self._program = None
+        self._uniforms = {}
+        self._vao = None
+        self._lut = None
+        self._lut_size = 0
+
+    @property
+    def colormap(self):
+        return self._colormap
+
+    @colormap.setter
+    def colormap(self, value):
+        self._colormap = value
+        self._lut_dirty = True
+
+    def set_image(self, image):
+        """ Keep image to upload at the next draw, from any thread """
+        self._pending = image
+
+    def _allocate(self, rows, columns, channels, dtype):
+        self._delete_tiles()
+        pixel_type, internal, scale = FORMATS[dtype]
+        size = self.max_tile or GL.glGetIntegerv(GL.GL_MAX_TEXTURE_SIZE)
+        interpolation = GL.GL_LINEAR if self.smooth else GL.GL_NEAREST
+        for y0 in range(0, rows, size):
+            for x0 in range(0, columns, size):
+                w = min(size, columns - x0)
+                h = min(size, rows - y0)
+                texture = GL.glGenTextures(1)
+                GL.glBindTexture(GL.GL_TEXTURE_2D, texture)
+                GL.glTexImage2D(GL.GL_TEXTURE_2D, 0, internal[channels - 1],
+                                w, h, 0, PIXEL_FORMATS[channels - 1],
+                                pixel_type, None)
+                for name in (GL.GL_TEXTURE_WRAP_S, GL.GL_TEXTURE_WRAP_T):
+                    GL.glTexParameteri(GL.GL_TEXTURE_2D, name,
+                                       GL.GL_CLAMP_TO_EDGE)
+                for name in (GL.GL_TEXTURE_MIN_FILTER,
+                             GL.GL_TEXTURE_MAG_FILTER):
+                    GL.glTexParameteri(GL.GL_TEXTURE_2D, name, interpolation)
+                self.tiles.append((x0, y0, w, h, texture))
+        GL.glBindTexture(GL.GL_TEXTURE_2D, 0)
+        self.shape = (rows, columns, channels)
+        self.dtype = dtype
+        _log.debug("Image textures for %s %s in %d tiles", self.shape,
+                   dtype, len(self.tiles))
+
+    def upload(self, image):
+        """ Copy image to the textures now """
+        image = numpy.ascontiguousarray(image)
+        if image.dtype not in FORMATS:
+            raise ValueError("Images need dtype uint8, uint16 or float32, "
+                             "not %s" % image.dtype)
+        rows, columns, channels = _shape(image)
+        if (rows, columns, channels) != self.shape or \
+                image.dtype != self.dtype:
+            self._allocate(rows, columns, channels, image.dtype)
+        if self._stream is None:
+            self._stream = StreamBuffer(image.nbytes, self.nbuffers,
+                                        GL.GL_PIXEL_UNPACK_BUFFER)
+        offset = self._stream.write(image)
+        self._stream.bind()
+        pixel_type = FORMATS[image.dtype][0]
+        GL.glPixelStorei(GL.GL_UNPACK_ALIGNMENT, 1)
+        GL.glPixelStorei(GL.GL_UNPACK_ROW_LENGTH, columns)
+        for x0, y0, w, h, texture in self.tiles:
+            GL.glPixelStorei(GL.GL_UNPACK_SKIP_PIXELS, x0)
+            GL.glPixelStorei(GL.GL_UNPACK_SKIP_ROWS, y0)
+            GL.glBindTexture(GL.GL_TEXTURE_2D, texture)
+            GL.glTexSubImage2D(GL.GL_TEXTURE_2D, 0, 0, 0, w, h,
+                               PIXEL_FORMATS[channels - 1], pixel_type,
+                               ctypes.c_void_p(offset))
+        GL.glBindTexture(GL.GL_TEXTURE_2D, 0)
+        for name, value in ((GL.GL_UNPACK_SKIP_PIXELS, 0),
+                            (GL.GL_UNPACK_SKIP_ROWS, 0),
+                            (GL.GL_UNPACK_ROW_LENGTH, 0),
+                            (GL.GL_UNPACK_ALIGNMENT, 4)):
+            GL.glPixelStorei(name, value)
+        GL.glBindBuffer(GL.GL_PIXEL_UNPACK_BUFFER, 0)
+        self.uploads += 1
+
+    def _upload_lut(self):
+        self._lut_dirty = False
+        if self._colormap is None:
+            self._lut_size = 0
+            return
+        colors = numpy.asarray(self._colormap)
+        if colors.dtype != numpy.uint8:
+            colors = numpy.clip(colors * 255.0 + 0.5, 0, 255)
+        colors = colors.astype(numpy.uint8).reshape(-1, colors.shape[-1])
+        if colors.shape[1] == 3:
+            colors = numpy.concatenate(
+                (colors, numpy.full((len(colors), 1), 255, numpy.uint8)), 1)
+        if colors.shape[1] != 4:
+            raise ValueError("Colormaps need 3 or 4 components")
+        colors = numpy.ascontiguousarray(colors)
+        if self._lut is None:
+            self._lut = GL.glGenTextures(1)
+        GL.glBindTexture(GL.GL_TEXTURE_2D, self._lut)
+        GL.glPixelStorei(GL.GL_UNPACK_ALIGNMENT, 1)
+        GL.glTexImage2D(GL.GL_TEXTURE_2D, 0, GL.GL_RGBA8, len(colors), 1, 0,
+                        GL.GL_RGBA, GL.GL_UNSIGNED_BYTE, colors)
+        GL.glPixelStorei(GL.GL_UNPACK_ALIGNMENT, 4)
+        for name in (GL.GL_TEXTURE_MIN_FILTER, GL.GL_TEXTURE_MAG_FILTER):
+            GL.glTexParameteri(GL.GL_TEXTURE_2D, name, GL.GL_LINEAR)
+        for name in (GL.GL_TEXTURE_WRAP_S, GL.GL_TEXTURE_WRAP_T):
+            GL.glTexParameteri(GL.GL_TEXTURE_2D, name, GL.GL_CLAMP_TO_EDGE)
+        GL.glBindTexture(GL.GL_TEXTURE_2D, 0)
+        self._lut_size = len(colors)
+
+    def _levels(self):
+        """ Offset and gain in the units the shader samples """
+        scale = FORMATS[self.dtype][2]
+        if self.levels is None:
+            low, high = 0.0, 1.0
+        else:
+            low, high = self.levels[0] / scale, self.levels[1] / scale
+        if high == low:
+            high = low + 1.0 / scale
+        return low, 1.0 / (high - low)
+
+    def fit(self, width, height):
+        """ rect for draw() showing the whole image with square pixels """
+        if self.shape is None:
+            return (-1.0, -1.0, 1.0, 1.0)
+        rows, columns = self.shape[:2]
+        sx = float(columns) * height / (rows * width)
+        if sx > 1:
+            return (-1.0, -1.0 / sx, 1.0, 1.0 / sx)
+        return (-sx, -1.0, sx, 1.0)
+
+    def draw(self, rect=(-1.0, -1.0, 1.0, 1.0)):
+        """
+        Upload any image from set_image and draw it over rect (left,
+        bottom, right, top) in normalized device coordinates
+        """
+        image, self._pending = self._pending, None
+        if image is not None:
+            self.upload(image)
+        if self._lut_dirty:
+            self._upload_lut()
+        if not self.tiles:
+            return
+        if self._program is None:
+            self._program = shadercache.default_cache().program(
+                vertex=vertex_shader, fragment=fragment_shader)
+            for name in ("rect", "image", "lut", "channels",
+                         "lut_size", "levels"):
+                self._uniforms[name] = GL.glGetUniformLocation(
+                    self._program, name)
+            # Core profiles draw nothing without a vertex array bound
+            self._vao = GL.glGenVertexArrays(1)
+        u = self._uniforms
+        GL.glUseProgram(self._program)
+        GL.glUniform1i(u["image"], 0)
+        GL.glUniform1i(u["lut"], 1)
+        GL.glUniform1i(u["channels"], self.shape[2])
+        GL.glUniform1i(u["lut_size"], self._lut_size)
+        GL.glUniform2f(u["levels"], *self._levels())
+        if self._lut_size:
+            GL.glActiveTexture(GL.GL_TEXTURE1)
+            GL.glBindTexture(GL.GL_TEXTURE_2D, self._lut)
+            GL.glActiveTexture(GL.GL_TEXTURE0)
+        GL.glBindVertexArray(self._vao)
+        left, bottom, right, top = rect
+        rows, columns = self.shape[:2]
+        sx = (right - left) / float(columns)
+        sy = (top - bottom) / float(rows)
+        for x0, y0, w, h, texture in self.tiles:
+            GL.glUniform4f(u["rect"], left + sx * x0, top - sy * (y0 + h),
+                           left + sx * (x0 + w), top - sy * y0)
+            GL.glBindTexture(GL.GL_TEXTURE_2D, texture)
+            GL.glDrawArrays(GL.GL_TRIANGLE_STRIP, 0, 4)
+        GL.glBindVertexArray(0)
+        GL.glBindTexture(GL.GL_TEXTURE_2D, 0)
+        GL.glUseProgram(0)
+
+    def _delete_tiles(self):
+        if self.tiles:
+            GL.glDeleteTextures([t[4] for t in self.tiles])
+        self.tiles = []
+        self.shape = None
+
+    def release(self):
+        """ Delete the GL objects, needs the context current """
+        self._delete_tiles()
+        if self._stream is not None:
+            self._stream.release()
+            self._stream = None
+        if self._lut is not None:
+            GL.glDeleteTextures([self._lut])
+            self._lut = None
+        self._lut_dirty = True
+        if self._vao is not None:
+            GL.glDeleteVertexArrays(1, [self._vao])
+            self._vao = None
+        if self._program is not None:
+            GL.glDeleteProgram(self._program)
+            self._program = None
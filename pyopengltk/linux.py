@@ -1,11 +1,35 @@
 """
 Linux implementation of the opengl frame
+
+The frames talk to the X server for GLX through a Display connection
+separate from the one used by Tk. One connection per screen is opened
+and shared by the frames on that screen, together with the FBConfigs
+already chosen there. With render_thread=True a frame gets a connection
+of its own, only used from the render thread.
 """
 from __future__ import print_function
+import atexit
 import logging
 from ctypes import c_int, c_char_p, c_void_p, cdll, POINTER, util, \
-    pointer, CFUNCTYPE, c_bool
+    pointer, CFUNCTYPE, cast
 from OpenGL import GL, GLX
+from OpenGL.error import GLError
+from OpenGL.raw.GLX.ARB.create_context import glXCreateContextAttribsARB, \
+    GLX_CONTEXT_MAJOR_VERSION_ARB, GLX_CONTEXT_MINOR_VERSION_ARB, \
+    GLX_CONTEXT_FLAGS_ARB, GLX_CONTEXT_DEBUG_BIT_ARB
+from OpenGL.raw.GLX.ARB.create_context_profile import \
+    GLX_CONTEXT_PROFILE_MASK_ARB, GLX_CONTEXT_CORE_PROFILE_BIT_ARB, \
+    GLX_CONTEXT_COMPATIBILITY_PROFILE_BIT_ARB
+from OpenGL.raw.GLX.ARB.create_context_robustness import \
+    GLX_CONTEXT_ROBUST_ACCESS_BIT_ARB, \
+    GLX_CONTEXT_RESET_NOTIFICATION_STRATEGY_ARB, GLX_LOSE_CONTEXT_ON_RESET_ARB
+from OpenGL.raw.GLX.ARB.create_context_no_error import \
+    GLX_CONTEXT_OPENGL_NO_ERROR_ARB
+from OpenGL.raw.GLX.ARB.framebuffer_sRGB import \
+    GLX_FRAMEBUFFER_SRGB_CAPABLE_ARB
+from OpenGL.raw.GLX.EXT.swap_control import glXSwapIntervalEXT
+from OpenGL.raw.GLX.MESA.swap_control import glXSwapIntervalMESA
+from OpenGL.raw.GLX.SGI.swap_control import glXSwapIntervalSGI
 from pyopengltk.base import BaseOpenGLFrame
 
 try:
@@ -20,6 +44,89 @@ _x11lib = cdll.LoadLibrary(util.find_library("X11"))
 XOpenDisplay = _x11lib.XOpenDisplay
 XOpenDisplay.argtypes = [c_char_p]
 XOpenDisplay.restype = POINTER(Display)
+XCloseDisplay = _x11lib.XCloseDisplay
+XCloseDisplay.argtypes = [POINTER(Display)]
+XDefaultScreen = _x11lib.XDefaultScreen
+XDefaultScreen.argtypes = [POINTER(Display)]
+XDefaultScreen.restype = c_int
+XFree = _x11lib.XFree
+XFree.argtypes = [c_void_p]
+
+_x11lib.XSync.argtypes = [POINTER(Display), c_int]
+_x11lib.XSetErrorHandler.argtypes = [c_void_p]
+_x11lib.XSetErrorHandler.restype = c_void_p
+
+_threads_initialised = False
+
+
+def init_threads():
+    """
+    Make Xlib thread safe with XInitThreads, needed for render_thread.
+    Xlib wants this before any other call, so call it before creating
+    the Tk root window. OpenGLFrame(render_thread=True) calls it too,
+    which is enough with libX11 1.8 and later.
+    """
+    global _threads_initialised
+    if not _threads_initialised:
+        _x11lib.XInitThreads()
+        _threads_initialised = True
+
+# A context that cannot be created is reported as an X error, which by
+# default ends the process, so errors are trapped while trying
+XErrorHandler = CFUNCTYPE(c_int, POINTER(Display), c_void_p)
+_x_errors = []
+
+
+@XErrorHandler
+def _trap_x_error(dpy, event):
+    _x_errors.append(event)
+    return 0
+
+
+def create_context_attribs(dpy, fbconfig, share, attribs):
+    """ glXCreateContextAttribsARB returning None on failure """
+    attribs = list(attribs) + [0]
+    del _x_errors[:]
+    previous = _x11lib.XSetErrorHandler(_trap_x_error)
+    try:
+        context = glXCreateContextAttribsARB(
+            dpy, fbconfig, share, True, (c_int * len(attribs))(*attribs))
+        _x11lib.XSync(dpy, 0)
+    except GLError:
+        context = None
+    finally:
+        _x11lib.XSetErrorHandler(previous)
+    if _x_errors or not context:
+        return None
+    return context
+
+
+def context_attribs(version=None, profile=None, debug=False,
+                    no_error=False, robust=False):
+    """ Attribute list for glXCreateContextAttribsARB, without the 0 """
+    attribs = []
+    if version:
+        attribs += [GLX_CONTEXT_MAJOR_VERSION_ARB, version[0],
+                    GLX_CONTEXT_MINOR_VERSION_ARB, version[1]]
+    if profile == "core":
+        attribs += [GLX_CONTEXT_PROFILE_MASK_ARB,
+                    GLX_CONTEXT_CORE_PROFILE_BIT_ARB]
+    elif profile == "compat":
+        attribs += [GLX_CONTEXT_PROFILE_MASK_ARB,
+                    GLX_CONTEXT_COMPATIBILITY_PROFILE_BIT_ARB]
+    flags = 0
+    if debug:
+        flags |= GLX_CONTEXT_DEBUG_BIT_ARB
+    if robust:
+        flags |= GLX_CONTEXT_ROBUST_ACCESS_BIT_ARB
+        attribs += [GLX_CONTEXT_RESET_NOTIFICATION_STRATEGY_ARB,
+                    GLX_LOSE_CONTEXT_ON_RESET_ARB]
+    if flags:
+        attribs += [GLX_CONTEXT_FLAGS_ARB, flags]
+    if no_error:
+        attribs += [GLX_CONTEXT_OPENGL_NO_ERROR_ARB, 1]
+    return [int(a) for a in attribs]
+
 
 Colormap = c_void_p
 # Attributes for old style creation
@@ -44,120 +151,271 @@ fbatt = [
 ]
 
 
+def fbconfig_attribs(double_buffer=True, depth_size=None, stencil_size=None,
+                     alpha_size=None, samples=None, srgb=False):
+    """
+    glXChooseFBConfig attributes for the framebuffer options of a frame,
+    and the attributes which must match exactly rather than be at least
+    """
+    # fbatt up to GLX_DOUBLEBUFFER
+    attribs = fbatt[:-3] + [GLX.GLX_DOUBLEBUFFER, int(bool(double_buffer))]
+    exact = {}
+    for name, value in ((GLX.GLX_DEPTH_SIZE, depth_size),
+                        (GLX.GLX_STENCIL_SIZE, stencil_size),
+                        (GLX.GLX_ALPHA_SIZE, alpha_size)):
+        if value is not None:
+            attribs += [name, value]
+            if value == 0:
+                exact[name] = 0
+    if samples:
+        attribs += [GLX.GLX_SAMPLE_BUFFERS, 1, GLX.GLX_SAMPLES, samples]
+    elif samples is not None:
+        exact[GLX.GLX_SAMPLES] = 0
+    if srgb:
+        attribs += [GLX_FRAMEBUFFER_SRGB_CAPABLE_ARB, 1]
+    return [int(a) for a in attribs] + [0], exact
+
+
+class Screen(object):
+    """
+    A GLX Display connection to one X screen, with the GLX version,
+    extensions and the configs chosen for it so far
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.dpy = XOpenDisplay(name.encode('utf-8'))
+        if not self.dpy:
+            raise RuntimeError("Cannot open display %s" % name)
+        self.screen = XDefaultScreen(self.dpy)
+        major = c_int(0)
+        minor = c_int(0)
+        GLX.glXQueryVersion(self.dpy, major, minor)
+        self.version = (major.value, minor.value)
+        self.extensions = GLX.glXQueryExtensionsString(self.dpy, self.screen)
+        self._configs = {}
+        _log.debug("GLX version %d.%d on %s", major.value, minor.value, name)
+
+    def visual(self, attribs):
+        """ XVisualInfo from glXChooseVisual, for GLX 1.2 and less """
+        key = ("visual", tuple(attribs))
+        if key not in self._configs:
+            visual = GLX.glXChooseVisual(self.dpy, self.screen,
+                                         (GL.GLint * len(attribs))(*attribs))
+            if not visual:
+                raise RuntimeError("glXChooseVisual call failed")
+            self._configs[key] = visual
+        return self._configs[key]
+
+    def attrib(self, config, name):
+        value = c_int(0)
+        GLX.glXGetFBConfigAttrib(self.dpy, config, name, value)
+        return value.value
+
+    def describe(self, config):
+        """ What an FBConfig gives, named like the frame options """
+        return {
+            "double_buffer": bool(self.attrib(config, GLX.GLX_DOUBLEBUFFER)),
+            "depth_size": self.attrib(config, GLX.GLX_DEPTH_SIZE),
+            "stencil_size": self.attrib(config, GLX.GLX_STENCIL_SIZE),
+            "alpha_size": self.attrib(config, GLX.GLX_ALPHA_SIZE),
+            "samples": self.attrib(config, GLX.GLX_SAMPLES),
+            "srgb": bool(self.attrib(config,
+                                     GLX_FRAMEBUFFER_SRGB_CAPABLE_ARB)),
+            "visual_id": self.attrib(config, GLX.GLX_VISUAL_ID),
+        }
+
+    def fbconfig(self, attribs, visualid=None, exact=None):
+        """
+        The best FBConfig matching attribs, preferably for visualid.
+        exact maps attributes to values they must equal.
+        """
+        exact = exact or {}
+        key = (tuple(attribs), visualid, tuple(sorted(exact.items())))
+        if key in self._configs:
+            return self._configs[key]
+        ncfg = GL.GLint(0)
+        cfgs = GLX.glXChooseFBConfig(self.dpy, self.screen,
+                                     (GL.GLint * len(attribs))(*attribs),
+                                     ncfg)
+        if not cfgs or ncfg.value == 0:
+            raise RuntimeError("No GLX FBConfig matches %s" % (attribs,))
+        _log.debug("Number of FBconfigs %d", ncfg.value)
+        # Sorted best first by glXChooseFBConfig
+        candidates = [i for i in range(ncfg.value)
+                      if all(self.attrib(cfgs[i], name) == value
+                             for name, value in exact.items())]
+        if not candidates:
+            _log.warning("No FBConfig has exactly %s", exact)
+            candidates = list(range(ncfg.value))
+        best = candidates[0]
+        if visualid is not None:
+            for i in candidates:
+                if self.attrib(cfgs[i], GLX.GLX_VISUAL_ID) == visualid:
+                    _log.debug("Got a matching visual: index %d xid %s",
+                               i, hex(visualid))
+                    best = i
+                    break
+            else:
+                _log.warning("No FBConfig for visual %s, taking the first",
+                             hex(visualid))
+        # Copy the handle out before freeing the list
+        config = cast(cfgs[best], GLX.GLXFBConfig)
+        XFree(cfgs)
+        self._configs[key] = config
+        return config
+
+    def close(self):
+        XCloseDisplay(self.dpy)
+        self.dpy = None
+
+
+_screens = {}
+
+
+def open_screen(name, shared=True):
+    """ The shared Screen for name, or a new one owned by the caller """
+    if not shared:
+        return Screen(name)
+    if name not in _screens:
+        _screens[name] = Screen(name)
+    return _screens[name]
+
+
+@atexit.register
+def close_screens():
+    """ Close the shared connections, frames using them must be gone """
+    while _screens:
+        _screens.popitem()[1].close()
+
+
 # Inherits the base and fills in the 3 platform dependent functions
 class OpenGLFrame(BaseOpenGLFrame):
 
     def __init__(self, *args, **kw):
+        if kw.get('render_thread'):
+            init_threads()
         super().__init__(*args, **kw)
 
+    def tkChooseVisual(self, master, kw):
+        # The visual is fixed when Tk creates the window, so pick the
+        # FBConfig for the options first and ask Tk for its visual
+        if not self._wants_framebuffer() or 'visual' in kw:
+            return
+        if master is None:
+            raise ValueError("Framebuffer options need a master widget "
+                             "or a Tk root to find the screen")
+        screen = open_screen(master.winfo_screen())
+        if screen.version < (1, 3):
+            return
+        attribs, exact = fbconfig_attribs(**self.framebuffer_options)
+        config = screen.fbconfig(attribs, None, exact)
+        kw['visual'] = screen.attrib(config, GLX.GLX_VISUAL_ID)
+
     def tkCreateContext(self):
-        self.__window = XOpenDisplay(self.winfo_screen().encode('utf-8'))
-        # Check glx version:
-        major = c_int(0)
-        minor = c_int(0)
-        GLX.glXQueryVersion(self.__window, major, minor)
-        print("GLX version: %d.%d" % (major.value, minor.value))
-        if major.value == 1 and minor.value < 3:  # e.g. 1.2 and down
-            visual = GLX.glXChooseVisual(self.__window, 0, (GL.GLint * len(att))(* att))
-            if not visual:
-                _log.error("glXChooseVisual call failed")
+        # A render thread needs a connection of its own
+        self.__screen = open_screen(self.winfo_screen(),
+                                    shared=not self._use_render_thread)
+        self.__window = self.__screen.dpy
+        if self.__screen.version < (1, 3):  # e.g. 1.2 and down
+            if self._wants_framebuffer():
+                _log.warning("GLX %d.%d ignores the framebuffer options",
+                             *self.__screen.version)
+            visual = self.__screen.visual(att)
             self.__context = GLX.glXCreateContext(self.__window,
                                                   visual,
-                                                  None,
+                                                  self.context_group.context,
                                                   GL.GL_TRUE)
+            self.context_group.add(self, self.__context)
+            self._context_created(None)
             GLX.glXMakeCurrent(self.__window, self._wid, self.__context)
             return  # OUT HERE FOR 1.2 and less
         else:
             # 1.3 or higher
-            # which screen - should it be winfo_screen instead ??
-            XDefaultScreen = _x11lib.XDefaultScreen
-            XDefaultScreen.argtypes = [POINTER(Display)]
-            XDefaultScreen.restype = c_int
-            screen = XDefaultScreen(self.__window)
-            print("Screen is ", screen)
-            # Look at framebuffer configs
-            ncfg = GL.GLint(0)
-            cfgs = GLX.glXChooseFBConfig(
-                self.__window,
-                screen,
-                (GL.GLint * len(fbatt))(* fbatt),
-                ncfg,
-            )
-            print("Number of FBconfigs", ncfg.value)
-            #
             # Try to match to the current window
             # ... might also be possible to set this for the frame
             # ... but for now we just take what Tk gave us
             ideal = int(self.winfo_visualid(), 16)  # convert from hex
-            best = -1
-            for i in range(ncfg.value):
-                vis = GLX.glXGetVisualFromFBConfig(self.__window,  cfgs[i])
-                if ideal == vis.contents.visualid:
-                    best = i
-                    print("Got a matching visual: index %d %d xid %s" % (
-                        best, vis.contents.visualid, hex(ideal)))
-            if best < 0:
-                print("oh dear - visual does not match")
-                # Take the first in the list (should be another I guess)
-                best = 0
+            if self._wants_framebuffer():
+                attribs, exact = fbconfig_attribs(**self.framebuffer_options)
+            else:
+                attribs, exact = fbatt, None
+            fbconfig = self.__screen.fbconfig(attribs, ideal, exact)
+            self.framebuffer = self.__screen.describe(fbconfig)
+            self.__context = self._create_context(fbconfig)
+            _log.debug("Direct rendering: %s",
+                       bool(GLX.glXIsDirect(self.__window, self.__context)))
+            GLX.glXMakeContextCurrent(self.__window, self._wid, self._wid, self.__context)
+
+    def _create_context(self, fbconfig):
+        """ The requested context if possible, else a legacy one """
+        share = self.context_group.context
+        context = None
+        options = None
+        if self._wants_context_attribs():
+            if b"GLX_ARB_create_context" in self.__screen.extensions:
+                for options in self._context_attempts():
+                    context = create_context_attribs(
+                        self.__window, fbconfig, share,
+                        context_attribs(**options))
+                    if context:
+                        break
+        if not context:
+            options = None
             # Here we insist on RGBA - but didn't check earlier
-            self.__context = GLX.glXCreateNewContext(
+            context = GLX.glXCreateNewContext(
                 self.__window,
-                cfgs[best],
+                fbconfig,
                 GLX.GLX_RGBA_TYPE,
-                None,  # share list
+                share,  # share list
                 GL.GL_TRUE,  # direct
             )
-            print("Is Direct?: ", GLX.glXIsDirect(self.__window, self.__context))
-            # Not creating another window ... some tutorials do
-            # print("wid: ", self._wid)
-            # self._wid = GLX.glXCreateWindow(self.__window, cfgs[best], self._wid, None)
-            # print("wid: ", self._wid)
-            GLX.glXMakeContextCurrent(self.__window, self._wid, self._wid, self.__context)
-            print("Done making a first context")
-            extensions = GLX.glXQueryExtensionsString(self.__window, screen)
-            # Here we quit - getting a modern context needs further work below
-            return
-            if "GLX_ARB_create_context" in extensions:
-                # We can try to upgrade it ??
-                print("Trying to upgrade context")
-                s = "glXCreateContextAttribsARB"
-                p = GLX.glXGetProcAddress(c_char_p(s))
-
-                print(p)
-                if not p:
-                    p = GLX.glXGetProcAddressARB((GL.GLubyte * len(s)).from_buffer_copy(s))
-                print(p)
-                if p:
-                    print(" p is true")
-                p.restype = GLX.GLXContext
-                p.argtypes = [
-                    POINTER(Display),
-                    GLX.GLXFBConfig,
-                    GLX.GLXContext,
-                    c_bool,
-                    POINTER(c_int),
-                ]
-                arb_attrs = fbatt[:-1] + []
-
-                #    GLX.GLX_CONTEXT_MAJOR_VERSION_ARB , 3
-                #    GLX.GLX_CONTEXT_MINOR_VERSION_ARB , 1,
-                #    0 ]
-                #
-                #    GLX.GLX_CONTEXT_FLAGS_ARB
-                #    GLX.GLX_CONTEXT_PROFILE_MASK_ARB
-                # ]
-#                    import pdb
-#                    pdb.set_trace()
-                self.__context = p(
-                    self.__window, cfgs[best], None, GL.GL_TRUE,
-                    (GL.GLint * len(arb_attrs))(* arb_attrs),
-                )
+        if not context:
+            raise RuntimeError("glXCreateNewContext failed")
+        self.context_group.add(self, context)
+        self._context_created(options)
+        return context
 
     def tkMakeCurrent(self):
-        if self.winfo_ismapped():
+        if self._mapped and not self._is_current():
             GLX.glXMakeCurrent(self.__window, self._wid, self.__context)
+            self._set_current()
+
+    def tkDoneCurrent(self):
+        GLX.glXMakeCurrent(self.__window, 0, None)
+        self._set_current(False)
+
+    def tkSwapInterval(self, interval):
+        extensions = self.__screen.extensions.split()
+        if interval < 0 and b"GLX_EXT_swap_control_tear" not in extensions:
+            # No adaptive vsync, plain vsync is the nearest
+            interval = -interval
+        if b"GLX_EXT_swap_control" in extensions:
+            glXSwapIntervalEXT(self.__window, self._wid, interval)
+        elif interval >= 0 and b"GLX_MESA_swap_control" in extensions:
+            if glXSwapIntervalMESA(interval) != 0:
+                return None
+        elif interval > 0 and b"GLX_SGI_swap_control" in extensions:
+            if glXSwapIntervalSGI(interval) != 0:
+                return None
+        else:
+            return None
+        return interval
+
+    def tkDestroyContext(self):
+        if self._is_current():
+            self.tkDoneCurrent()
+        GLX.glXDestroyContext(self.__window, self.__context)
+        self.__context = None
+        if self.__screen is not _screens.get(self.__screen.name):
+            self.__screen.close()
+        self.__screen = None
+        self.__window = None
 
     def tkSwapBuffers(self):
-        if self.winfo_ismapped():
+        if not self._mapped:
+            return
+        if self.double_buffered:
             GLX.glXSwapBuffers(self.__window, self._wid)
+        else:
+            GL.glFlush()
@@ -0,0 +1,261 @@
+"""
+Headless offscreen rendering, without Tk or an X display
+
+PyOpenGL picks its platform when OpenGL is first imported, so set
+PYOPENGL_PLATFORM=egl (or osmesa) in the environment before importing
+pyopengltk. With EGL this runs on Mesa llvmpipe on machines without a
+GPU or display.
+
+The user code has the same initgl/redraw contract as an OpenGLFrame and
+draws into a framebuffer object of the requested size:
+
+    class Thumbnail(OffscreenOpenGL):
+        def initgl(self):
+            GL.glClearColor(0.0, 1.0, 0.0, 0.0)
+        def redraw(self):
+            GL.glClear(GL.GL_COLOR_BUFFER_BIT)
+
+    ogl = Thumbnail(256, 256)
+    ogl.render()
+"""
+import ctypes
+import logging
+import os
+from concurrent.futures import Future
+
+from OpenGL import GL
+
+from pyopengltk.capture import read_pixels
+from pyopengltk.contextgroup import ContextGroup
+
+_log = logging.getLogger(__name__)
+
+EGL_PLATFORM_SURFACELESS_MESA = 0x31DD
+
+
+def headless_platform():
+    """ The PyOpenGL platform if it is one we can use without a display """
+    platform = os.environ.get("PYOPENGL_PLATFORM", "").lower()
+    if platform in ("egl", "osmesa"):
+        return platform
+    return None
+
+
+class EGLContext(object):
+    """ An EGL context, surfaceless where supported, else on a pbuffer """
+
+    def __init__(self, width, height):
+        from OpenGL import EGL
+        self.EGL = EGL
+        self.display = self._get_display()
+        major, minor = EGL.EGLint(), EGL.EGLint()
+        if not EGL.eglInitialize(self.display, ctypes.pointer(major),
+                                 ctypes.pointer(minor)):
+            raise RuntimeError("eglInitialize failed")
+        _log.debug("EGL version: %d.%d", major.value, minor.value)
+        EGL.eglBindAPI(EGL.EGL_OPENGL_API)
+        att = [
+            EGL.EGL_SURFACE_TYPE,    EGL.EGL_PBUFFER_BIT,
+            EGL.EGL_RENDERABLE_TYPE, EGL.EGL_OPENGL_BIT,
+            EGL.EGL_RED_SIZE,        8,
+            EGL.EGL_GREEN_SIZE,      8,
+            EGL.EGL_BLUE_SIZE,       8,
+            EGL.EGL_NONE,
+        ]
+        config = EGL.EGLConfig()
+        nconfig = EGL.EGLint()
+        if not EGL.eglChooseConfig(self.display, (EGL.EGLint * len(att))(*att),
+                                   ctypes.pointer(config), 1,
+                                   ctypes.pointer(nconfig)) or \
+                nconfig.value < 1:
+            raise RuntimeError("eglChooseConfig found no configs")
+        self.context = EGL.eglCreateContext(self.display, config,
+                                            EGL.EGL_NO_CONTEXT, None)
+        if not self.context:
+            raise RuntimeError("eglCreateContext failed")
+        extensions = EGL.eglQueryString(self.display, EGL.EGL_EXTENSIONS)
+        if b"EGL_KHR_surfaceless_context" in extensions:
+            self.surface = EGL.EGL_NO_SURFACE
+        else:
+            patt = [EGL.EGL_WIDTH, width, EGL.EGL_HEIGHT, height,
+                    EGL.EGL_NONE]
+            self.surface = EGL.eglCreatePbufferSurface(
+                self.display, config, (EGL.EGLint * len(patt))(*patt))
+
+    def _get_display(self):
+        EGL = self.EGL
+        client = EGL.eglQueryString(EGL.EGL_NO_DISPLAY, EGL.EGL_EXTENSIONS)
+        if client and b"EGL_MESA_platform_surfaceless" in client:
+            from OpenGL.EGL.EXT.platform_base import eglGetPlatformDisplayEXT
+            display = eglGetPlatformDisplayEXT(
+                EGL_PLATFORM_SURFACELESS_MESA, None, None)
+            if display:
+                return display
+        return EGL.eglGetDisplay(EGL.EGL_DEFAULT_DISPLAY)
+
+    def make_current(self):
+        self.EGL.eglMakeCurrent(self.display, self.surface, self.surface,
+                                self.context)
+
+    def destroy(self):
+        EGL = self.EGL
+        EGL.eglMakeCurrent(self.display, EGL.EGL_NO_SURFACE,
+                           EGL.EGL_NO_SURFACE, EGL.EGL_NO_CONTEXT)
+        if self.surface != EGL.EGL_NO_SURFACE:
+            EGL.eglDestroySurface(self.display, self.surface)
+        EGL.eglDestroyContext(self.display, self.context)
+        EGL.eglTerminate(self.display)
+
+
+class OSMesaContext(object):
+    """ A software OSMesa context, drawing into a 1x1 dummy buffer """
+
+    def __init__(self, width, height):
+        from OpenGL import osmesa
+        self.osmesa = osmesa
+        self.context = osmesa.OSMesaCreateContextExt(
+            osmesa.OSMESA_RGBA, 24, 8, 0, None)
+        if not self.context:
+            raise RuntimeError("OSMesaCreateContextExt failed")
+        # All drawing goes to our framebuffer object
+        self._buffer = (GL.GLubyte * 4)()
+
+    def make_current(self):
+        self.osmesa.OSMesaMakeCurrent(self.context, self._buffer,
+                                      GL.GL_UNSIGNED_BYTE, 1, 1)
+
+    def destroy(self):
+        self.osmesa.OSMesaDestroyContext(self.context)
+
+
+class OffscreenOpenGL(object):
+    """
+    Renders initgl/redraw user code into a framebuffer object with no
+    window. backend is "egl" or "osmesa", by default the PyOpenGL
+    platform in use. Method names follow BaseOpenGLFrame so that code
+    written against a frame also works here. Tk is not needed.
+    """
+
+    def __init__(self, width=256, height=256, backend=None):
+        if backend is None:
+            backend = headless_platform()
+        if backend not in ("egl", "osmesa"):
+            raise RuntimeError(
+                "Offscreen rendering needs PYOPENGL_PLATFORM=egl or osmesa")
+        self.backend = backend
+        self.width, self.height = width, height
+        self.context = None
+        self.context_created = False
+        # Registry only, offscreen contexts are not shared
+        self.context_group = ContextGroup()
+        self.fbo = None
+        self._renderbuffers = None
+        self._frame_hooks = []
+        self.nframes = 0
+
+    def tkCreateContext(self):
+        if self.backend == "egl":
+            self.context = EGLContext(self.width, self.height)
+        else:
+            self.context = OSMesaContext(self.width, self.height)
+        self.context.make_current()
+        self.context_group.add(self, self.context)
+        self._create_framebuffer()
+
+    def _create_framebuffer(self):
+        self.fbo = GL.glGenFramebuffers(1)
+        self._renderbuffers = GL.glGenRenderbuffers(2)
+        GL.glBindFramebuffer(GL.GL_FRAMEBUFFER, self.fbo)
+        for rb, fmt, attach in zip(
+                self._renderbuffers,
+                (GL.GL_RGBA8, GL.GL_DEPTH24_STENCIL8),
+                (GL.GL_COLOR_ATTACHMENT0, GL.GL_DEPTH_STENCIL_ATTACHMENT)):
+            GL.glBindRenderbuffer(GL.GL_RENDERBUFFER, rb)
+            GL.glRenderbufferStorage(GL.GL_RENDERBUFFER, fmt,
+                                     self.width, self.height)
+            GL.glFramebufferRenderbuffer(GL.GL_FRAMEBUFFER, attach,
+                                         GL.GL_RENDERBUFFER, rb)
+        status = GL.glCheckFramebufferStatus(GL.GL_FRAMEBUFFER)
+        if status != GL.GL_FRAMEBUFFER_COMPLETE:
+            raise RuntimeError("Framebuffer incomplete: %s" % status)
+        GL.glViewport(0, 0, self.width, self.height)
+
+    def _delete_framebuffer(self):
+        GL.glBindFramebuffer(GL.GL_FRAMEBUFFER, 0)
+        GL.glDeleteRenderbuffers(2, self._renderbuffers)
+        GL.glDeleteFramebuffers(1, [self.fbo])
+        self.fbo = None
+
+    def tkMakeCurrent(self):
+        self.context.make_current()
+        GL.glBindFramebuffer(GL.GL_FRAMEBUFFER, self.fbo)
+
+    def tkSwapBuffers(self):
+        # Nothing is shown, just make sure the frame is drawn
+        GL.glFlush()
+
+    def create(self):
+        """ Create the context and call initgl, done by the first render """
+        if not self.context_created:
+            self.tkCreateContext()
+            self.initgl()
+            self.context_created = True
+
+    def resize(self, width, height):
+        """ Change the framebuffer size, initgl is called again """
+        self.width, self.height = width, height
+        if self.context_created:
+            self.tkMakeCurrent()
+            self._delete_framebuffer()
+            self._create_framebuffer()
+            self.initgl()
+
+    def render(self, nframes=1):
+        """ Draw nframes frames """
+        self.create()
+        for i in range(nframes):
+            self._display()
+
+    def _display(self):
+        self.tkMakeCurrent()
+        self.redraw()
+        for hook in self._frame_hooks:
+            hook(self)
+        self.tkSwapBuffers()
+        self.nframes += 1
+
+    def add_frame_hook(self, func):
+        """ Call func(self) after each redraw """
+        self._frame_hooks.append(func)
+
+    def remove_frame_hook(self, func):
+        self._frame_hooks.remove(func)
+
+    def call_in_gl_thread(self, func, *args):
+        """ Run func(*args) now, as there is no render thread here """
+        future = Future()
+        future.set_result(func(*args))
+        return future
+
+    def read_pixels(self, format="rgb"):
+        """ The framebuffer contents as a numpy array, top row first """
+        self.tkMakeCurrent()
+        return read_pixels(0, 0, self.width, self.height, format,
+                           GL.GL_COLOR_ATTACHMENT0)
+
+    def destroy(self):
+        if self.context_created:
+            self.tkMakeCurrent()
+            self._delete_framebuffer()
+            self.context.destroy()
+            self.context_group.remove(self)
+            self.context = None
+            self.context_created = False
+
+    def initgl(self):
+        # For the user code
+        raise NotImplementedError
+
+    def redraw(self):
+        # For the user code
+        raise NotImplementedError
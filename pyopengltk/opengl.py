@@ -8,9 +8,9 @@ Department of Chemistry
 University of York, UK
 """
 import sys
-import math
-from OpenGL import GL, GLU
+from OpenGL import GL
 from pyopengltk import OpenGLFrame
+from pyopengltk.camera import Camera
 
 if sys.version_info[0] < 3:
     import Tkinter as tk
@@ -44,19 +44,30 @@ def v3distsq(a, b):
     return d[0] * d[0] + d[1] * d[1] + d[2] * d[2]
 
 
+def _camera_attribute(name, index=None):
+    # The old Opengl attributes, now kept in self.camera
+    def get(self):
+        value = getattr(self.camera, name)
+        return value if index is None else value[index]
+
+    def set(self, value):
+        if index is None:
+            setattr(self.camera, name, value)
+        else:
+            getattr(self.camera, name)[index] = value
+    return property(get, set)
+
+
 class RawOpengl(OpenGLFrame):
     """Widget without any sophisticated bindings\
     by Tom Schwaller"""
     def __init__(self, master=None, cnf={}, **kw):
         OpenGLFrame.__init__(*(self, master, cnf), **kw)
 
-    # replaces our _display method
-    def tkRedraw(self, *dummy):
-        # This must be outside of a pushmatrix, since a resize event
-        # will call redraw recursively.
-        self.update_idletasks()
-        self.tkMakeCurrent()
-        _mode = GL.glGetDoublev(GL.GL_MATRIX_MODE)
+    # wraps the user redraw inside our _display method
+    def _draw(self):
+        # The matrix mode is left as GL_MODELVIEW rather than read back
+        # with glGet, which would stall the pipeline every frame
         try:
             GL.glMatrixMode(GL.GL_PROJECTION)
             GL.glPushMatrix()
@@ -66,8 +77,11 @@ class RawOpengl(OpenGLFrame):
             finally:
                 GL.glPopMatrix()
         finally:
-            GL.glMatrixMode(_mode)
-        self.tkSwapBuffers()
+            GL.glMatrixMode(GL.GL_MODELVIEW)
+
+    def tkRedraw(self, *dummy):
+        """Redraw now, use invalidate() to redraw on the next idle"""
+        self._display()
 
 
 class Opengl(RawOpengl):
@@ -77,7 +91,17 @@ class Opengl(RawOpengl):
     Department of Chemistry
     University of York, UK
     http://www.yorvic.york.ac.uk/~mjh/
+
+    The view is computed by self.camera (a pyopengltk.camera.Camera)
+    without reading matrices back from GL.
     """
+    xcenter = _camera_attribute("center", 0)
+    ycenter = _camera_attribute("center", 1)
+    zcenter = _camera_attribute("center", 2)
+    distance = _camera_attribute("distance")
+    fovy = _camera_attribute("fovy")
+    near = _camera_attribute("near")
+    far = _camera_attribute("far")
 
     def __init__(self, master=None, cnf={}, **kw):
         """\
@@ -88,6 +112,7 @@ class Opengl(RawOpengl):
         # Widget.__init__(self, master, 'togl', cnf, kw)
         RawOpengl.__init__(*(self, master, cnf), **kw)
         self.initialised = 0
+        self.camera = Camera()
 
         # Current coordinates of the mouse.
         self.xmouse = 0
@@ -119,6 +144,9 @@ class Opengl(RawOpengl):
         # Is the widget currently autospinning?
         self.autospin = 0
 
+        # Mouse motion waiting for the next frame, in pixels
+        self.clear_motion()
+
         # Basic bindings for the virtual trackball
         self.bind('<Shift-Button-1>', self.tkHandlePick)
         # self.bind('<Button-1><ButtonRelease-1>', self.tkHandlePick)
@@ -176,7 +204,7 @@ class Opengl(RawOpengl):
         self.g_back = g
         self.b_back = b
 
-        self.tkRedraw()
+        self.invalidate()
 
     def set_centerpoint(self, x, y, z):
         """Set the new center point for the model.
@@ -186,41 +214,50 @@ class Opengl(RawOpengl):
         self.ycenter = y
         self.zcenter = z
 
-        self.tkRedraw()
+        self.invalidate()
 
     def set_eyepoint(self, distance):
         """Set how far the eye is from the position we are looking."""
 
         self.distance = distance
-        self.tkRedraw()
+        self.invalidate()
 
     def reset(self):
         """Reset rotation matrix for this widget."""
 
-        GL.glMatrixMode(GL.GL_MODELVIEW)
-        GL.glLoadIdentity()
-        self.tkRedraw()
+        self.camera.reset()
+        self.clear_motion()
+        self.invalidate()
 
     def tkHandlePick(self, event):
-        """Handle a pick on the scene."""
+        """Handle a pick on the scene.
 
-        if hasattr(self, 'pick'):
-            # here we need to use glu.UnProject
+        With enable_picking the id buffer is read and pick(self, result)
+        gets a PickResult (or None), otherwise pick(self, p1, p2) gets
+        the two ends of the ray under the mouse."""
 
+        if hasattr(self, 'pick') and self.picker is not None:
+            self.pick_at(event.x, event.y, self._handle_pick_result)
+        elif hasattr(self, 'pick'):
             # Tk and X have their origin top left, 
             # while Opengl has its origin bottom left.
             # So we need to subtract y from the window height to get
             # the proper pick position for Opengl
 
-            realy = self.winfo_height() - event.y
+            realy = self.height - event.y
 
-            p1 = GLU.gluUnProject(event.x, realy, 0.)
-            p2 = GLU.gluUnProject(event.x, realy, 1.)
+            self.camera.resize(self.width, self.height)
+            p1 = self.camera.unproject(event.x, realy, 0.)
+            p2 = self.camera.unproject(event.x, realy, 1.)
 
             if self.pick(self, p1, p2):
                 """If the pick method returns true we redraw the scene."""
 
-                self.tkRedraw()
+                self.invalidate()
+
+    def _handle_pick_result(self, result):
+        if self.pick(self, result):
+            self.invalidate()
 
     def tkRecordMouse(self, event):
         """Record the current mouse position."""
@@ -246,16 +283,14 @@ class Opengl(RawOpengl):
             scale = 0.001
         elif scale > 1000:
             scale = 1000
-        self.distance = self.distance * scale
-        self.tkRedraw()
+        self._zoom *= scale
+        self.invalidate()
         self.tkRecordMouse(event)
 
     def do_AutoSpin(self):
-        self.activate()
-
-        glRotateScene(0.5, self.xcenter, self.ycenter, self.zcenter,
-                      self.yspin, self.xspin, 0, 0)
-        self.tkRedraw()
+        self._rotate[0] += self.yspin
+        self._rotate[1] += self.xspin
+        self.invalidate()
 
         if self.autospin:
             self.after(10, self.do_AutoSpin)
@@ -285,89 +320,78 @@ class Opengl(RawOpengl):
     def tkRotate(self, event):
         """Perform rotation of scene."""
 
-        self.activate()
-        glRotateScene(0.5, self.xcenter, self.ycenter, self.zcenter,
-                      event.x, event.y, self.xmouse, self.ymouse)
-        self.tkRedraw()
+        self._rotate[0] += event.x - self.xmouse
+        self._rotate[1] += event.y - self.ymouse
+        self.invalidate()
         self.tkRecordMouse(event)
 
     def tkTranslate(self, event):
         """Perform translation of scene."""
 
-        self.activate()
+        self._translate[0] += event.x - self.xmouse
+        self._translate[1] += event.y - self.ymouse
+        self.invalidate()
+        self.tkRecordMouse(event)
 
-        # Scale mouse translations to object viewplane so object
-        # tracks with mouse
+    def clear_motion(self):
+        """Forget any mouse motion not yet applied to the scene."""
 
-        win_height = max(1, self.winfo_height())
-        obj_c = (self.xcenter, self.ycenter, self.zcenter)
-        win = GLU.gluProject(obj_c[0], obj_c[1], obj_c[2])
-        obj = GLU.gluUnProject(win[0], win[1] + 0.5 * win_height, win[2])
-        dist = math.sqrt(v3distsq(obj, obj_c))
-        scale = abs(dist / (0.5 * win_height))
+        self._rotate = [0, 0]
+        self._translate = [0, 0]
+        self._zoom = 1.0
 
-        glTranslateScene(scale, event.x, event.y, self.xmouse, self.ymouse)
-        self.tkRedraw()
-        self.tkRecordMouse(event)
+    def apply_motion(self):
+        """Apply the mouse motion accumulated since the last frame.
 
-    def tkRedraw(self, *dummy):
-        """Cause the opengl widget to redraw itself."""
+        Motion events only add up their deltas, so however many arrive
+        between two frames the scene is moved once per frame."""
 
-        if not self.initialised:
-            return
+        self.camera.resize(self.width, self.height)
+        if self._zoom != 1.0:
+            self.camera.zoom(self._zoom)
+        if self._translate != [0, 0]:
+            # Mouse translations are scaled to the object viewplane
+            # so the object tracks with the mouse
+            self.camera.translate(self._translate[0], self._translate[1])
+        if self._rotate != [0, 0]:
+            self.camera.rotate(self._rotate[0], self._rotate[1], 0.5)
+        self.clear_motion()
 
-        self.activate()
+    def _display(self):
+        if self.initialised:
+            RawOpengl._display(self)
+
+    def _draw(self):
+        """Set up the view and call the user redraw."""
 
+        self.apply_motion()
+        GL.glMatrixMode(GL.GL_MODELVIEW)
         GL.glPushMatrix()        # Protect our matrix
-        self.update_idletasks()
-        self.activate()
-        w = self.winfo_width()
-        h = self.winfo_height()
-        GL.glViewport(0, 0, w, h)
+        GL.glViewport(0, 0, *self.render_size)
 
         # Clear the background and depth buffer.
         GL.glClearColor(self.r_back, self.g_back, self.b_back, 0.)
         GL.glClear(GL.GL_COLOR_BUFFER_BIT | GL.GL_DEPTH_BUFFER_BIT)
 
-        GL.glMatrixMode(GL.GL_PROJECTION)
-        GL.glLoadIdentity()
-        GLU.gluPerspective(self.fovy, float(w)/float(h), self.near, self.far)
-
-        if 0:
-            # Now translate the scene origin away from the world origin
-            GL.glMatrixMode(GL.GL_MODELVIEW)
-            mat = GL.glGetDoublev(GL.GL_MODELVIEW_MATRIX)
-            GL.glLoadIdentity()
-            GL.glTranslatef(-self.xcenter, -self.ycenter, -(
-                self.zcenter+self.distance))
-            GL.glMultMatrixd(mat)
-        else:
-            GLU.gluLookAt(self.xcenter, self.ycenter, self.zcenter + self.distance,
-                          self.xcenter, self.ycenter, self.zcenter,
-                          0., 1., 0.)
-            GL.glMatrixMode(GL.GL_MODELVIEW)
+        # Projection and look at + mouse motion, leaves GL_MODELVIEW
+        self.camera.load()
 
         # Call objects redraw method.
         self.redraw(self)
         GL.glFlush()      # Tidy up
         GL.glPopMatrix()  # Restore the matrix
 
-        self.tkSwapBuffers()
-
     def redraw(self, *args, **named):
         """Prevent access errors if user doesn't set redraw fast enough"""
 
     def tkExpose(self, *dummy):
-        """Redraw the widget.
-        Make it active, update tk events, call redraw procedure and
-        swap the buffers.  Note: swapbuffers is clever enough to
-        only swap double buffered visuals."""
+        """Redraw the widget on the next idle.
+        The first expose also sets up the lighting."""
 
-        self.activate()
         if not self.initialised:
-            self.basic_lighting()
+            self.call_in_gl_thread(self.basic_lighting)
             self.initialised = 1
-        self.tkRedraw()
+        self.invalidate()
 
     def tkPrint(self, file):
         """Turn the current scene into PostScript via the feedback buffer."""
@@ -0,0 +1,245 @@
+"""
+Picking by drawing object ids instead of casting rays in Python
+
+A Picker draws the scene a second time into an integer color buffer,
+writing (object id, primitive id) for each fragment, but only in a
+small square around the cursor. That square is read back through a
+pixel pack buffer and looked at a frame or two later, once the GPU is
+done, so picking never waits for the pipeline:
+
+    def draw_ids(frame, picker):
+        program = picker.use()              # or your own shader
+        frame.camera.load()
+        for number, item in enumerate(items, 1):
+            picker.set_object(number)       # 0 means nothing there
+            item.draw()
+
+    frame.enable_picking(draw_ids)
+    frame.bind("<Motion>", lambda e: frame.pick_at(e.x, e.y, hover))
+
+    def hover(result):                      # a PickResult or None
+        ...
+
+The primitive id is gl_PrimitiveID: the point, line or triangle number
+within the draw call. Shaders of your own need a fragment output that
+is a uvec2, see fragment_shader. Needs GL 3.2 for the default shaders.
+"""
+import ctypes
+import logging
+import threading
+from collections import namedtuple
+
+import numpy
+from OpenGL import GL
+
+from pyopengltk import shadercache
+from pyopengltk.rendertarget import RenderTarget
+
+_log = logging.getLogger(__name__)
+
+
+class PickResult(namedtuple("PickResult",
+                            "object_id primitive_id depth x y")):
+    """
+    What is under the cursor: ids from the id pass, depth 0 to 1 as in
+    the depth buffer and x, y the window position (y down) of that
+    pixel. The scene position is
+    frame.camera.unproject(x, frame.height - 1 - y, depth).
+    """
+    __slots__ = ()
+
+
+# Fixed function transforms, for legacy and compatibility contexts
+vertex_shader = """#version 150 compatibility
+void main()
+{
+    gl_Position = ftransform();
+}
+"""
+
+fragment_shader = """#version 150
+uniform uint object_id;
+out uvec2 pick_id;
+void main()
+{
+    pick_id = uvec2(object_id, uint(gl_PrimitiveID));
+}
+"""
+
+
+class Picker(object):
+    """
+    Id buffer picking, used as a frame hook by enable_picking
+
+    draw_ids : draw_ids(frame, picker) draws the scene with ids
+    radius : pixels around the cursor searched for the nearest object
+    """
+
+    def __init__(self, draw_ids, radius=2):
+        self.draw_ids = draw_ids
+        self.radius = radius
+        self.target = RenderTarget(color_format=GL.GL_RG32UI,
+                                   pixel_format=GL.GL_RG_INTEGER,
+                                   pixel_type=GL.GL_UNSIGNED_INT)
+        self.program = None
+        self.object_location = -1
+        self._requests = []
+        self._lock = threading.Lock()
+        self._inflight = []
+        self._free = []
+        self._programs = {}
+
+    @property
+    def pending(self):
+        """ Picks asked for whose callback has not run yet """
+        return len(self._requests) + len(self._inflight)
+
+    def request(self, x, y, callback):
+        """
+        Pick at window position x, y (y down) when the next frame is
+        drawn. A request not drawn yet is replaced by a newer one with
+        the same callback, so hovering only picks where the cursor is.
+        """
+        with self._lock:
+            self._requests = [r for r in self._requests if r[2] != callback]
+            self._requests.append((x, y, callback))
+
+    def use(self, vertex=None):
+        """
+        Bind an id program made from a vertex shader source, the fixed
+        function transform by default, and return it
+        """
+        vertex = vertex or vertex_shader
+        if vertex not in self._programs:
+            program = shadercache.default_cache().program(
+                vertex=vertex, fragment=fragment_shader)
+            self._programs[vertex] = program
+        self.program = self._programs[vertex]
+        GL.glUseProgram(self.program)
+        self.object_location = GL.glGetUniformLocation(self.program,
+                                                       "object_id")
+        return self.program
+
+    def set_object(self, object_id):
+        """ Id written by what is drawn next, 1 or more """
+        GL.glUniform1ui(self.object_location, object_id)
+
+    def _buffer(self, nbytes):
+        if self._free:
+            pbo = self._free.pop()
+        else:
+            pbo = int(GL.glGenBuffers(1))
+        GL.glBindBuffer(GL.GL_PIXEL_PACK_BUFFER, pbo)
+        GL.glBufferData(GL.GL_PIXEL_PACK_BUFFER, nbytes, None,
+                        GL.GL_STREAM_READ)
+        return pbo
+
+    def __call__(self, frame):
+        """ Frame hook: draw the ids for the pending requests """
+        with self._lock:
+            requests, self._requests = self._requests, []
+        if not requests:
+            self.poll()
+            return
+        width, height = frame.width, frame.height
+        r = self.radius
+        self.target.bind(width, height)
+        GL.glEnable(GL.GL_SCISSOR_TEST)
+        regions = []
+        for x, y, callback in requests:
+            # Clipped to the window, in GL coordinates (y up)
+            cy = height - 1 - y
+            x0, y0 = max(0, x - r), max(0, cy - r)
+            x1, y1 = min(width, x + r + 1), min(height, cy + r + 1)
+            if x1 <= x0 or y1 <= y0:
+                callback(None)
+                continue
+            regions.append((x, cy, callback, x0, y0, x1 - x0, y1 - y0))
+            GL.glScissor(x0, y0, x1 - x0, y1 - y0)
+            GL.glClearBufferuiv(GL.GL_COLOR, 0, (GL.GLuint * 4)(0, 0, 0, 0))
+            GL.glClear(GL.GL_DEPTH_BUFFER_BIT)
+        if regions:
+            # One pass for all of them, the scissor is the union
+            xs = [g[3] for g in regions]
+            ys = [g[4] for g in regions]
+            x0, y0 = min(xs), min(ys)
+            x1 = max(g[3] + g[5] for g in regions)
+            y1 = max(g[4] + g[6] for g in regions)
+            GL.glScissor(x0, y0, x1 - x0, y1 - y0)
+            self.draw_ids(frame, self)
+            GL.glUseProgram(0)
+        GL.glDisable(GL.GL_SCISSOR_TEST)
+        GL.glReadBuffer(GL.GL_COLOR_ATTACHMENT0)
+        GL.glPixelStorei(GL.GL_PACK_ALIGNMENT, 4)
+        for x, cy, callback, x0, y0, w, h in regions:
+            n = w * h
+            pbo = self._buffer(n * 12)
+            GL.glReadPixels(x0, y0, w, h, GL.GL_RG_INTEGER,
+                            GL.GL_UNSIGNED_INT, ctypes.c_void_p(0))
+            GL.glReadPixels(x0, y0, w, h, GL.GL_DEPTH_COMPONENT,
+                            GL.GL_FLOAT, ctypes.c_void_p(n * 8))
+            fence = GL.glFenceSync(GL.GL_SYNC_GPU_COMMANDS_COMPLETE, 0)
+            self._inflight.append((fence, pbo, callback,
+                                   (x, cy, height), (x0, y0, w, h)))
+        GL.glBindBuffer(GL.GL_PIXEL_PACK_BUFFER, 0)
+        GL.glBindFramebuffer(GL.GL_FRAMEBUFFER, 0)
+        GL.glViewport(0, 0, width, height)
+        # Ask the GPU to start, poll() looks at the results later
+        GL.glFlush()
+        self.poll()
+
+    def poll(self):
+        """ Run the callbacks of the picks the GPU has finished """
+        while self._inflight:
+            fence, pbo, callback, cursor, region = self._inflight[0]
+            status = GL.glClientWaitSync(fence, 0, 0)
+            if status == GL.GL_TIMEOUT_EXPIRED:
+                break
+            self._inflight.pop(0)
+            GL.glDeleteSync(fence)
+            result = self._read(pbo, cursor, region)
+            self._free.append(pbo)
+            callback(result)
+
+    def _read(self, pbo, cursor, region):
+        x, cy, height = cursor
+        x0, y0, w, h = region
+        n = w * h
+        GL.glBindBuffer(GL.GL_PIXEL_PACK_BUFFER, pbo)
+        ptr = GL.glMapBufferRange(GL.GL_PIXEL_PACK_BUFFER, 0, n * 12,
+                                  GL.GL_MAP_READ_BIT)
+        data = (ctypes.c_ubyte * (n * 12)).from_address(ptr)
+        ids = numpy.frombuffer(data, numpy.uint32, n * 2).reshape(h, w, 2)
+        depth = numpy.frombuffer(data, numpy.float32, n, n * 8) \
+            .reshape(h, w)
+        hit = numpy.nonzero(ids[..., 0])
+        result = None
+        if len(hit[0]):
+            # Nearest the cursor, then nearest the eye
+            rows, cols = hit
+            gy = y0 + rows
+            gx = x0 + cols
+            d2 = (gx - x) ** 2 + (gy - cy) ** 2
+            best = numpy.lexsort((depth[hit], d2))[0]
+            row, col = rows[best], cols[best]
+            result = PickResult(int(ids[row, col, 0]), int(ids[row, col, 1]),
+                                float(depth[row, col]), int(gx[best]),
+                                int(height - 1 - gy[best]))
+        GL.glUnmapBuffer(GL.GL_PIXEL_PACK_BUFFER)
+        GL.glBindBuffer(GL.GL_PIXEL_PACK_BUFFER, 0)
+        return result
+
+    def release(self):
+        """ Delete the GL objects, needs the context current """
+        for fence, pbo, callback, cursor, region in self._inflight:
+            GL.glDeleteSync(fence)
+            self._free.append(pbo)
+        self._inflight = []
+        if self._free:
+            GL.glDeleteBuffers(len(self._free), self._free)
+        self._free = []
+        for program in self._programs.values():
+            GL.glDeleteProgram(program)
+        self._programs = {}
+        self.program = None
+        self.target.release()
@@ -0,0 +1,295 @@
+"""
+Drawing point clouds too big to draw every frame
+
+A PointCloud sorts the points into a grid of cells, in a background
+thread, and keeps them in a random order inside each cell so the first
+k points of a cell are a fair sample of it. Each frame it then draws,
+for the cells in view, about as many points as the cell covers pixels
+on the screen, within a budget:
+
+    cloud = PointCloud(xyz, colors=rgb)
+
+    def redraw(self):
+        self.camera.load()
+        if cloud.draw(self.camera.matrix(), self.width, self.height):
+            self.after(1, self.invalidate)    # still refining
+
+When the view stops changing the budget and density double every frame
+until everything visible is drawn, then draw() returns False. While the
+index is being built a strided sample of the points is shown.
+
+The chosen points are gathered into a StreamBuffer only when the
+selection changes. Memory use is about twice the size of the arrays
+while the index is built, and once more for the sorted copy.
+"""
+import ctypes
+import logging
+import threading
+
+import numpy
+from OpenGL import GL
+
+from pyopengltk.stream import StreamBuffer
+
+_log = logging.getLogger(__name__)
+
+
+class GridIndex(object):
+    """
+    Points sorted by grid cell, randomly ordered within each cell
+
+    points, colors : the sorted copies
+    starts, counts : where each occupied cell's points are
+    centers : (ncells, 3) cell centers, cell_size the side of a cell
+    """
+
+    def __init__(self, points, colors=None, cell_size=None,
+                 points_per_cell=4096, seed=None):
+        points = numpy.asarray(points, numpy.float32).reshape(-1, 3)
+        n = len(points)
+        lo = points.min(axis=0)
+        extent = points.max(axis=0) - lo
+        if cell_size is None:
+            # Cubes with points_per_cell points on average if filled
+            cells = max(1.0, n / float(points_per_cell))
+            volume = numpy.prod(numpy.maximum(extent, extent.max() * 1e-3))
+            cell_size = float((volume / cells) ** (1 / 3.0))
+        cell_size = max(cell_size, float(extent.max()) * 1e-6, 1e-30)
+        dims = numpy.maximum(1, numpy.ceil(extent / cell_size)
+                             .astype(numpy.int64))
+        ijk = ((points - lo) / cell_size).astype(numpy.int64)
+        numpy.minimum(ijk, dims - 1, out=ijk)
+        key = (ijk[:, 0] * dims[1] + ijk[:, 1]) * dims[2] + ijk[:, 2]
+        del ijk
+        # Shuffled then stably sorted: random order inside each cell
+        order = numpy.random.RandomState(seed).permutation(n)
+        order = order[numpy.argsort(key[order], kind="stable")]
+        key = key[order]
+        cells, self.starts, self.counts = numpy.unique(
+            key, return_index=True, return_counts=True)
+        ijk = numpy.stack(numpy.unravel_index(cells, dims), axis=-1)
+        self.centers = lo + (ijk + 0.5) * cell_size
+        self.cell_size = cell_size
+        self.points = points[order]
+        self.colors = None if colors is None else colors[order]
+        _log.debug("Grid index of %d points in %d cells of %g",
+                   n, len(cells), cell_size)
+
+
+def _colors(colors, n):
+    """ (n, 4) uint8 colors """
+    c = numpy.asarray(colors)
+    if c.dtype != numpy.uint8:
+        c = numpy.clip(c * 255.0 + 0.5, 0, 255).astype(numpy.uint8)
+    if c.shape[-1] == 3:
+        c = numpy.concatenate((c, numpy.full(c.shape[:-1] + (1,), 255,
+                                             numpy.uint8)), axis=-1)
+    if c.shape[-1] != 4:
+        raise ValueError("Colors need 3 or 4 components")
+    return numpy.broadcast_to(c.reshape(-1, 4), (n, 4))
+
+
+def frustum_planes(matrix):
+    """ (6, 4) planes of the clip volume of a projection * view matrix """
+    m = numpy.asarray(matrix, float)
+    return numpy.array((m[3] + m[0], m[3] - m[0], m[3] + m[1],
+                        m[3] - m[1], m[3] + m[2], m[3] - m[2]))
+
+
+def ranges(starts, counts):
+    """ Indices of counts[i] items from each starts[i], as one array """
+    total = int(counts.sum())
+    if total == 0:
+        return numpy.empty(0, numpy.intp)
+    ends = numpy.cumsum(counts)
+    shift = numpy.repeat(starts - (ends - counts), counts)
+    return numpy.arange(total) + shift
+
+
+class PointCloud(object):
+    """
+    Level of detail drawing of a big point cloud
+
+    points : (n, 3) positions, colors : (n, 3|4) or one color
+    budget : points drawn while the view changes
+    max_budget : limit when refining, None for ten times the budget
+    density : points drawn per pixel a cell covers
+    position, color : attribute locations for a shader, None for the
+                      fixed function arrays
+    background : build the index in a thread, False to build it now
+    """
+
+    def __init__(self, points, colors=None, cell_size=None, budget=1000000,
+                 max_budget=None, density=1.0, position=None, color=None,
+                 background=True):
+        self.budget = budget
+        if max_budget is None:
+            max_budget = 10 * budget
+        self.max_budget = max_budget
+        self.density = density
+        self.position = position
+        self.color_location = color
+        self.index = None
+        self.drawn = 0
+        self._points = numpy.asarray(points, numpy.float32).reshape(-1, 3)
+        n = len(self._points)
+        self._colors = None if colors is None else _colors(colors, n)
+        self._level = 1
+        self._more = True
+        self._matrix = None
+        self._selection = None
+        self._count = 0
+        self._stream = None
+        self._vao = None
+        args = (self._points, self._colors, cell_size)
+        if background:
+            self._thread = threading.Thread(target=self._build, args=args)
+            self._thread.daemon = True
+            self._thread.start()
+        else:
+            self._build(*args)
+
+    def _build(self, points, colors, cell_size):
+        try:
+            index = GridIndex(points, colors, cell_size)
+        except Exception:
+            _log.exception("Building the point cloud index failed")
+            return
+        self.index = index
+
+    @property
+    def ready(self):
+        """ True once the index is built """
+        return self.index is not None
+
+    def _select(self, matrix, width, height):
+        """ Starts and counts of the points to draw, and if more wait """
+        index = self.index
+        budget = min(self.budget * self._level, self.max_budget)
+        # Cells touching the view volume
+        planes = frustum_planes(matrix)
+        radius = 0.5 * index.cell_size * numpy.abs(planes[:, :3]).sum(axis=1)
+        distance = numpy.dot(index.centers, planes[:, :3].T) + planes[:, 3]
+        visible = numpy.nonzero((distance + radius >= 0).all(axis=1))[0]
+        counts = index.counts[visible]
+        # Pixels a cell covers, from its w in clip space
+        m = numpy.asarray(matrix, float)
+        w = numpy.dot(index.centers[visible], m[3, :3]) + m[3, 3]
+        w = numpy.maximum(w, 1e-6 * numpy.abs(w).max() if len(w) else 1.0)
+        scale = 0.5 * max(width * numpy.linalg.norm(m[0, :3]),
+                          height * numpy.linalg.norm(m[1, :3]))
+        pixels = (index.cell_size * scale / w) ** 2
+        wanted = numpy.minimum(counts, numpy.ceil(
+            pixels * self.density * self._level)).astype(numpy.int64)
+        total = wanted.sum()
+        if total > budget:
+            wanted = (wanted * (budget / float(total))).astype(numpy.int64)
+        more = bool((wanted < counts).any())
+        return index.starts[visible], wanted, more
+
+    def _write(self, idx):
+        """ Gather points (and colors) idx into the stream """
+        n = len(idx)
+        nbytes = n * (16 if self._colors is not None else 12)
+        if self._stream is None:
+            self._stream = StreamBuffer(max(nbytes, 1 << 20))
+        data = self._stream.acquire(max(nbytes, 16))
+        if n:
+            numpy.take(self.index.points, idx, axis=0,
+                       out=data[:n * 12].view(numpy.float32).reshape(n, 3))
+            if self._colors is not None:
+                numpy.take(self.index.colors, idx, axis=0,
+                           out=data[n * 12:n * 16].reshape(n, 4))
+        self._count = n
+
+    def _write_sample(self):
+        """ Before the index is ready: every k-th point """
+        n = len(self._points)
+        step = max(1, -(-n // self.budget))
+        points = self._points[::step]
+        nbytes = len(points) * (16 if self._colors is not None else 12)
+        if self._stream is None:
+            self._stream = StreamBuffer(max(nbytes, 1 << 20))
+        data = self._stream.acquire(max(nbytes, 16))
+        m = len(points)
+        data[:m * 12].view(numpy.float32).reshape(m, 3)[...] = points
+        if self._colors is not None:
+            data[m * 12:m * 16].reshape(m, 4)[...] = self._colors[::step]
+        self._count = m
+
+    def _bind(self, offset):
+        color = ctypes.c_void_p(offset + self._count * 12)
+        position = ctypes.c_void_p(offset)
+        if self.position is None:
+            GL.glEnableClientState(GL.GL_VERTEX_ARRAY)
+            GL.glVertexPointer(3, GL.GL_FLOAT, 0, position)
+            if self._colors is not None:
+                GL.glEnableClientState(GL.GL_COLOR_ARRAY)
+                GL.glColorPointer(4, GL.GL_UNSIGNED_BYTE, 0, color)
+            return
+        if self._vao is None:
+            self._vao = GL.glGenVertexArrays(1)
+        GL.glBindVertexArray(self._vao)
+        GL.glEnableVertexAttribArray(self.position)
+        GL.glVertexAttribPointer(self.position, 3, GL.GL_FLOAT, False, 0,
+                                 position)
+        if self.color_location is not None and self._colors is not None:
+            GL.glEnableVertexAttribArray(self.color_location)
+            GL.glVertexAttribPointer(self.color_location, 4,
+                                     GL.GL_UNSIGNED_BYTE, True, 0, color)
+
+    def _unbind(self):
+        if self.position is None:
+            GL.glDisableClientState(GL.GL_COLOR_ARRAY)
+            GL.glDisableClientState(GL.GL_VERTEX_ARRAY)
+        else:
+            GL.glBindVertexArray(0)
+        GL.glBindBuffer(GL.GL_ARRAY_BUFFER, 0)
+
+    def draw(self, matrix, width, height):
+        """
+        Draw the points for a view with this projection * view matrix
+        and window size. Returns True when drawing again with the same
+        view would show more, i.e. call again soon.
+        """
+        matrix = numpy.asarray(matrix, float)
+        if self.index is None:
+            if self._selection is None:
+                self._write_sample()
+                self._selection = ()
+            more = True
+        else:
+            if self._matrix is not None and \
+                    numpy.array_equal(matrix, self._matrix):
+                if self._more:
+                    self._level *= 2
+            else:
+                self._level = 1
+            self._matrix = matrix
+            starts, counts, more = self._select(matrix, width, height)
+            selection = (starts, counts)
+            old = self._selection
+            if not old or not (numpy.array_equal(old[0], starts) and
+                               numpy.array_equal(old[1], counts)):
+                self._write(ranges(starts, counts))
+                self._selection = selection
+            if self.budget * self._level >= self.max_budget:
+                more = False
+        self._stream.bind()
+        self._bind(self._stream.offset)
+        if self._count:
+            GL.glDrawArrays(GL.GL_POINTS, 0, self._count)
+        self._unbind()
+        self.drawn = self._count
+        self._more = more
+        return more
+
+    def release(self):
+        """ Delete the GL objects, needs the context current """
+        if self._vao is not None:
+            GL.glDeleteVertexArrays(1, [self._vao])
+            self._vao = None
+        if self._stream is not None:
+            self._stream.release()
+            self._stream = None
+        self._selection = None
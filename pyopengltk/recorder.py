@@ -0,0 +1,243 @@
+"""
+Recording frames to disk from a background thread
+
+A Recorder captures each frame with a FrameCapture hook, copies it into
+a bounded queue and lets a writer thread save it, so the Tk mainloop
+never waits for the disk or for ffmpeg. When the queue is full the
+policy decides what happens:
+
+    "drop-newest" : discard the frame just rendered (default)
+    "drop-oldest" : discard the oldest queued frame
+    "block"       : wait for the writer, which slows down rendering
+
+    rec = Recorder(app, PNGWriter("shots/frame%06d.png"))
+    rec.start()
+    ...
+    rec.stop()
+"""
+import logging
+import struct
+import subprocess
+import sys
+import threading
+import zlib
+from collections import deque
+
+if sys.version_info[0] < 3:
+    import Queue as queue
+else:
+    import queue
+
+import numpy
+
+from pyopengltk.capture import FrameCapture
+
+_log = logging.getLogger(__name__)
+
+POLICIES = ("drop-newest", "drop-oldest", "block")
+
+
+def _channels(arr):
+    return 1 if arr.ndim == 2 else arr.shape[2]
+
+
+def _png_chunk(tag, data):
+    crc = zlib.crc32(tag + data) & 0xffffffff
+    return struct.pack(">I", len(data)) + tag + data + struct.pack(">I", crc)
+
+
+def encode_png(arr, level=1):
+    """ PNG bytes for a uint8 (height, width[, channels]) array """
+    height, width = arr.shape[:2]
+    channels = _channels(arr)
+    colortype = {1: 0, 2: 4, 3: 2, 4: 6}[channels]
+    rows = numpy.zeros((height, 1 + width * channels), numpy.uint8)
+    rows[:, 1:] = arr.reshape(height, width * channels)
+    header = struct.pack(">IIBBBBB", width, height, 8, colortype, 0, 0, 0)
+    return b"".join((
+        b"\x89PNG\r\n\x1a\n",
+        _png_chunk(b"IHDR", header),
+        _png_chunk(b"IDAT", zlib.compress(rows.tobytes(), level)),
+        _png_chunk(b"IEND", b""),
+    ))
+
+
+class PNGWriter(object):
+    """ Writes numbered PNG files, pattern is formatted with the frame """
+
+    def __init__(self, pattern="frame%06d.png", level=1):
+        self.pattern = pattern
+        self.level = level
+
+    def write(self, arr, number):
+        with open(self.pattern % number, "wb") as f:
+            f.write(encode_png(arr, self.level))
+
+    def close(self):
+        pass
+
+
+class RawWriter(object):
+    """ Appends the raw pixels of every frame to a single file """
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.shape = None
+        self._file = None
+
+    def write(self, arr, number):
+        if self._file is None:
+            self._file = open(self.filename, "wb")
+            self.shape = arr.shape
+            _log.info("Raw frames %s %s in %s", arr.shape, arr.dtype,
+                      self.filename)
+        self._file.write(memoryview(numpy.ascontiguousarray(arr)))
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class FFmpegWriter(object):
+    """
+    Pipes the frames into a local ffmpeg process. args are the ffmpeg
+    output options placed before the filename.
+    """
+    PIX_FMTS = {1: "gray", 3: "rgb24", 4: "rgba"}
+
+    def __init__(self, filename, fps=60, args=("-pix_fmt", "yuv420p"),
+                 ffmpeg="ffmpeg"):
+        self.filename = filename
+        self.fps = fps
+        self.args = list(args)
+        self.ffmpeg = ffmpeg
+        self._proc = None
+
+    def _open(self, arr):
+        height, width = arr.shape[:2]
+        cmd = [self.ffmpeg, "-loglevel", "error", "-y",
+               "-f", "rawvideo",
+               "-pix_fmt", self.PIX_FMTS[_channels(arr)],
+               "-s", "%dx%d" % (width, height),
+               "-r", str(self.fps),
+               "-i", "-"] + self.args + [self.filename]
+        _log.debug("Running %s", " ".join(cmd))
+        self._proc = subprocess.Popen(cmd, stdin=subprocess.PIPE)
+
+    def write(self, arr, number):
+        if self._proc is None:
+            self._open(arr)
+        self._proc.stdin.write(memoryview(numpy.ascontiguousarray(arr)))
+
+    def close(self):
+        if self._proc is not None:
+            self._proc.stdin.close()
+            self._proc.wait()
+            self._proc = None
+
+
+class Recorder(object):
+    """
+    Streams the frames of a BaseOpenGLFrame (or OffscreenOpenGL) to a
+    writer with write(array, number) and close() methods.
+
+    maxsize : frames that may wait for the writer
+    policy : what to do when they are all waiting, see POLICIES
+    """
+
+    def __init__(self, frame, writer, maxsize=8, policy="drop-newest",
+                 nbuffers=3, format="rgb"):
+        if policy not in POLICIES:
+            raise ValueError("policy must be one of %s" % (POLICIES,))
+        self.frame = frame
+        self.writer = writer
+        self.policy = policy
+        self.written = 0
+        self.dropped = 0
+        self.error = None
+        self._queue = queue.Queue(maxsize)
+        self._spare = deque()
+        self._capture = FrameCapture(nbuffers, format, self._push)
+        self._thread = None
+
+    @property
+    def recording(self):
+        return self._thread is not None
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run,
+                                        name="pyopengltk-recorder")
+        self._thread.daemon = True
+        self._thread.start()
+        self.frame.add_frame_hook(self._capture)
+
+    def stop(self):
+        """ Write the frames still queued and close the writer """
+        if self._thread is None:
+            return
+        self.frame.remove_frame_hook(self._capture)
+        self.frame.call_in_gl_thread(self._finish).result()
+        self._queue.put(None)
+        self._thread.join()
+        self._thread = None
+        self.writer.close()
+
+    def _finish(self):
+        self.frame.tkMakeCurrent()
+        self._capture.finish()
+        self._capture.release()
+
+    def _copy(self, arr):
+        # Reuse arrays the writer has finished with
+        while self._spare:
+            buf = self._spare.pop()
+            if buf.shape == arr.shape and buf.dtype == arr.dtype:
+                numpy.copyto(buf, arr)
+                return buf
+        return numpy.array(arr)
+
+    def _push(self, arr, number):
+        # Called from the frame hook in the Tk thread
+        if self.policy == "drop-newest" and self._queue.full():
+            self.dropped += 1
+            return
+        item = (self._copy(arr), number)
+        if self.policy == "block":
+            self._queue.put(item)
+            return
+        try:
+            self._queue.put_nowait(item)
+            return
+        except queue.Full:
+            pass
+        self.dropped += 1
+        if self.policy == "drop-oldest":
+            try:
+                old = self._queue.get_nowait()
+                self._spare.append(old[0])
+            except queue.Empty:
+                pass
+            try:
+                self._queue.put_nowait(item)
+                return
+            except queue.Full:
+                pass
+        self._spare.append(item[0])
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            arr, number = item
+            if self.error is None:
+                try:
+                    self.writer.write(arr, number)
+                    self.written += 1
+                except Exception as e:
+                    _log.exception("Recording frame %d failed", number)
+                    self.error = e
+            self._spare.append(arr)
@@ -0,0 +1,204 @@
+"""
+Drawing into a framebuffer object, then onto the window
+
+A RenderTarget holds a color texture and a depth/stencil renderbuffer
+attached to a framebuffer object. The frame draws into it at a fraction
+of the window size (scale) and blits the result up to the window, so a
+large window can keep an interactive frame rate:
+
+    frame = MyFrame(root, render_scale=0.5)
+    frame.render_scale = 0.75               # any time
+
+The attachments are only resized when a frame is drawn, whatever the
+number of <Configure> events in between. They grow with headroom (or to
+powers of two) and draw into the lower left of the texture when bigger
+than needed, so dragging the window edge reallocates a few times rather
+than every frame. They shrink back once the size has settled.
+"""
+import logging
+import math
+import time
+
+from OpenGL import GL
+
+_log = logging.getLogger(__name__)
+
+
+def _grow(size, growth, pow2, align):
+    if pow2:
+        return 1 << max(0, int(math.ceil(math.log(size, 2))))
+    size = int(math.ceil(size * growth))
+    return -(-size // align) * align
+
+
+class RenderTarget(object):
+    """
+    Color texture plus depth/stencil renderbuffer in an FBO
+
+    scale : fraction of the window size to draw at
+    depth : False for no depth/stencil renderbuffer
+    color_format : internal format of the texture, GL_SRGB8_ALPHA8 for
+                   an sRGB framebuffer
+    pixel_format, pixel_type : matching it, e.g. GL_RG_INTEGER and
+                               GL_UNSIGNED_INT for GL_RG32UI
+    growth, pow2, align : how far ahead of the size to allocate
+    settle : seconds the size must be unchanged before shrinking
+
+    width and height are the size being drawn at, allocated the size of
+    the attachments. Needs a context current for everything but
+    __init__ and the scale.
+    """
+
+    def __init__(self, scale=1.0, depth=True, color_format=GL.GL_RGBA8,
+                 growth=1.25, pow2=False, align=64, settle=0.5,
+                 pixel_format=GL.GL_RGBA, pixel_type=GL.GL_UNSIGNED_BYTE):
+        self.scale = scale
+        self.depth = depth
+        self.color_format = color_format
+        self.pixel_format = pixel_format
+        self.pixel_type = pixel_type
+        self.growth = growth
+        self.pow2 = pow2
+        self.align = align
+        self.settle = settle
+        self.width, self.height = 1, 1
+        self.allocated = (0, 0)
+        self.reallocations = 0
+        self.fbo = None
+        self.texture = None
+        self.renderbuffer = None
+        self._window = (1, 1)
+        self._changed = 0.0
+
+    @property
+    def scale(self):
+        """ Fraction of the window size drawn, 0 to 1 (or more) """
+        return self._scale
+
+    @scale.setter
+    def scale(self, value):
+        if value <= 0:
+            raise ValueError("scale must be positive")
+        self._scale = value
+
+    @property
+    def uv_scale(self):
+        """ Texture coordinates of the top right of what was drawn """
+        return (self.width / float(self.allocated[0]),
+                self.height / float(self.allocated[1]))
+
+    def _allocate(self, width, height):
+        self.release()
+        self.fbo = GL.glGenFramebuffers(1)
+        GL.glBindFramebuffer(GL.GL_FRAMEBUFFER, self.fbo)
+        self.texture = GL.glGenTextures(1)
+        GL.glBindTexture(GL.GL_TEXTURE_2D, self.texture)
+        GL.glTexImage2D(GL.GL_TEXTURE_2D, 0, self.color_format, width, height,
+                        0, self.pixel_format, self.pixel_type, None)
+        if self.pixel_format in (GL.GL_RED_INTEGER, GL.GL_RG_INTEGER,
+                                 GL.GL_RGB_INTEGER, GL.GL_RGBA_INTEGER):
+            interpolation = GL.GL_NEAREST
+        else:
+            interpolation = GL.GL_LINEAR
+        for name in (GL.GL_TEXTURE_MIN_FILTER, GL.GL_TEXTURE_MAG_FILTER):
+            GL.glTexParameteri(GL.GL_TEXTURE_2D, name, interpolation)
+        for name in (GL.GL_TEXTURE_WRAP_S, GL.GL_TEXTURE_WRAP_T):
+            GL.glTexParameteri(GL.GL_TEXTURE_2D, name, GL.GL_CLAMP_TO_EDGE)
+        GL.glBindTexture(GL.GL_TEXTURE_2D, 0)
+        GL.glFramebufferTexture2D(GL.GL_FRAMEBUFFER, GL.GL_COLOR_ATTACHMENT0,
+                                  GL.GL_TEXTURE_2D, self.texture, 0)
+        if self.depth:
+            self.renderbuffer = GL.glGenRenderbuffers(1)
+            GL.glBindRenderbuffer(GL.GL_RENDERBUFFER, self.renderbuffer)
+            GL.glRenderbufferStorage(GL.GL_RENDERBUFFER,
+                                     GL.GL_DEPTH24_STENCIL8, width, height)
+            GL.glBindRenderbuffer(GL.GL_RENDERBUFFER, 0)
+            GL.glFramebufferRenderbuffer(GL.GL_FRAMEBUFFER,
+                                         GL.GL_DEPTH_STENCIL_ATTACHMENT,
+                                         GL.GL_RENDERBUFFER,
+                                         self.renderbuffer)
+        status = GL.glCheckFramebufferStatus(GL.GL_FRAMEBUFFER)
+        if status != GL.GL_FRAMEBUFFER_COMPLETE:
+            GL.glBindFramebuffer(GL.GL_FRAMEBUFFER, 0)
+            self.release()
+            raise RuntimeError("Framebuffer incomplete: 0x%x" % status)
+        self.allocated = (width, height)
+        self.reallocations += 1
+        _log.debug("Render target allocated %dx%d", width, height)
+
+    def _fit(self, width, height):
+        """ Reallocate if needed to draw width x height """
+        now = time.perf_counter()
+        alloc_w, alloc_h = self.allocated
+        if self.fbo is None or width > alloc_w or height > alloc_h:
+            self._allocate(_grow(width, self.growth, self.pow2, self.align),
+                           _grow(height, self.growth, self.pow2, self.align))
+            self._changed = now
+            return
+        # Much too big, and nobody dragging the window any more
+        limit = 2 * self.growth * self.growth
+        if (alloc_w * alloc_h > limit * width * height and
+                now - self._changed > self.settle):
+            self._allocate(_grow(width, self.growth, self.pow2, self.align),
+                           _grow(height, self.growth, self.pow2, self.align))
+
+    def bind(self, width, height):
+        """
+        Draw into the target from now on, for a window of width x height
+        pixels. Sets the viewport to the scaled size.
+        """
+        if (width, height) != self._window:
+            self._window = (width, height)
+            self._changed = time.perf_counter()
+        self.width = max(1, int(round(width * self._scale)))
+        self.height = max(1, int(round(height * self._scale)))
+        self._fit(self.width, self.height)
+        GL.glBindFramebuffer(GL.GL_FRAMEBUFFER, self.fbo)
+        GL.glViewport(0, 0, self.width, self.height)
+
+    def blit(self, framebuffer=0):
+        """
+        Copy what was drawn to the window size given to bind(), into
+        framebuffer (the window's by default), and draw there again
+        """
+        width, height = self._window
+        if (self.width, self.height) == (width, height):
+            interpolation = GL.GL_NEAREST
+        else:
+            interpolation = GL.GL_LINEAR
+        GL.glBindFramebuffer(GL.GL_READ_FRAMEBUFFER, self.fbo)
+        GL.glBindFramebuffer(GL.GL_DRAW_FRAMEBUFFER, framebuffer)
+        GL.glBlitFramebuffer(0, 0, self.width, self.height,
+                             0, 0, width, height,
+                             GL.GL_COLOR_BUFFER_BIT, interpolation)
+        GL.glBindFramebuffer(GL.GL_FRAMEBUFFER, framebuffer)
+        GL.glViewport(0, 0, width, height)
+
+    def adjust_scale(self, frame_time, budget, minimum=0.25, maximum=1.0):
+        """
+        Dynamic resolution: move the scale so a frame taking frame_time
+        (GPU time, seconds) would take about budget. Changes of less
+        than 10% are ignored to avoid flicker. Returns the scale.
+        """
+        if frame_time <= 0:
+            return self._scale
+        # Fill cost goes with the pixel count, the square of the scale
+        wanted = self._scale * math.sqrt(budget / float(frame_time))
+        wanted = min(maximum, max(minimum, wanted))
+        if (abs(wanted - self._scale) > 0.1 * self._scale or
+                wanted in (minimum, maximum)):
+            self._scale = wanted
+        return self._scale
+
+    def release(self):
+        """ Delete the GL objects, needs the context current """
+        if self.fbo is not None:
+            GL.glDeleteFramebuffers(1, [self.fbo])
+            self.fbo = None
+        if self.texture is not None:
+            GL.glDeleteTextures([self.texture])
+            self.texture = None
+        if self.renderbuffer is not None:
+            GL.glDeleteRenderbuffers(1, [self.renderbuffer])
+            self.renderbuffer = None
+        self.allocated = (0, 0)
@@ -0,0 +1,102 @@
+"""
+Rendering on a dedicated thread instead of inside Tk callbacks
+
+With OpenGLFrame(..., render_thread=True) the context is made current
+on a RenderThread which calls initgl and then draws frames on its own
+clock, so a slow redraw no longer freezes the rest of the interface.
+Tk only forwards work to it (resizes, user calls) through a deque,
+whose append/popleft need no lock. The frame's scheduler still sets
+the pace through its period: None waits for invalidate(), 0 draws
+continuously and anything else is a target frame time in seconds.
+
+Everything that touches GL must then go through
+frame.call_in_gl_thread(func, *args), and redraw must not call Tk.
+"""
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+_log = logging.getLogger(__name__)
+
+
+class RenderThread(threading.Thread):
+
+    def __init__(self, frame):
+        threading.Thread.__init__(self, name="pyopengltk-render")
+        self.daemon = True
+        self.frame = frame
+        self._calls = deque()
+        self._wake = threading.Event()
+        self._stopping = False
+
+    def wake(self):
+        """ Make the thread look at the frame again, from any thread """
+        self._wake.set()
+
+    def call(self, func, *args):
+        """ Run func(*args) on the render thread before the next frame """
+        future = Future()
+        self._calls.append((future, func, args))
+        self._wake.set()
+        return future
+
+    def stop(self):
+        """ Ask the thread to finish and wait for it """
+        self._stopping = True
+        self._wake.set()
+        if self is not threading.current_thread():
+            self.join()
+
+    def _run_calls(self):
+        while self._calls:
+            future, func, args = self._calls.popleft()
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                future.set_result(func(*args))
+            except Exception as e:
+                _log.exception("Error in render thread call %r", func)
+                future.set_exception(e)
+
+    def run(self):
+        frame = self.frame
+        frame.tkMakeCurrent()
+        frame.initgl()
+        deadline = None
+        while True:
+            self._wake.clear()
+            self._run_calls()
+            if self._stopping:
+                break
+            scheduler = frame.scheduler
+            period = scheduler.period
+            now = time.perf_counter()
+            if period is None:
+                deadline = None
+                if not frame.dirty:
+                    self._wake.wait()
+                    continue
+                slack = 0.0
+            else:
+                if deadline is None:
+                    deadline = now
+                if now < deadline:
+                    self._wake.wait(deadline - now)
+                    continue
+                slack = 0.0
+                # Continuous (period 0) is never behind
+                if period > 0:
+                    slack = now - deadline
+                    deadline += period
+                    if now - deadline > period:
+                        missed = int((now - deadline) / period)
+                        scheduler.dropped += missed
+                        deadline += missed * period
+            try:
+                frame._render_frame(now, slack)
+            except Exception:
+                _log.exception("Error drawing frame on the render thread")
+        self._run_calls()
+        frame.tkDoneCurrent()
@@ -0,0 +1,170 @@
+"""
+Frame schedulers deciding when BaseOpenGLFrame._display runs next
+
+A scheduler is attached to one frame. The frame calls request() when
+something needs drawing (expose, resize, user code) and frame_done()
+after each buffer swap. Requests made while a frame is already pending
+are folded into that frame.
+
+Each scheduler keeps the time its next frame is due, and next_due()
+gives the earliest over all of them, so an event loop driving Tk (see
+pyopengltk.aio) can sleep until then instead of polling. Due hooks are
+called whenever a scheduler arms a new frame, so such a loop can wake
+up early when a frame is asked for while it sleeps.
+"""
+import time
+import weakref
+
+# Schedulers attached to a frame
+_attached = weakref.WeakSet()
+_due_hooks = []
+
+
+def add_due_hook(hook):
+    """ Call hook() from the Tk thread each time a frame is armed """
+    _due_hooks.append(hook)
+
+
+def remove_due_hook(hook):
+    _due_hooks.remove(hook)
+
+
+def next_due():
+    """
+    time.perf_counter() time of the next frame any scheduler has asked
+    Tk for, None when no frame is pending
+    """
+    times = [s.due for s in list(_attached) if s.due is not None]
+    return min(times) if times else None
+
+
+class FrameScheduler(object):
+    """ Base class: draws only when asked to (on demand) """
+    # Seconds per frame for a render thread, None means on demand
+    period = None
+
+    def __init__(self):
+        self.frame = None
+        self._cb = None
+        self._deadline = None
+        self.dropped = 0
+        # When the pending callback runs, from time.perf_counter
+        self.due = None
+
+    def attach(self, frame):
+        self.cancel()
+        self.frame = frame
+        _attached.add(self)
+
+    def detach(self):
+        self.cancel()
+        self.frame = None
+        _attached.discard(self)
+
+    @property
+    def pending(self):
+        return self._cb is not None
+
+    def request(self):
+        """ Ask for a frame as soon as Tk is idle """
+        if self._cb is None and self.frame is not None:
+            self._idle()
+
+    def _idle(self):
+        self._cb = self.frame.after_idle(self._tick)
+        self._set_due(time.perf_counter())
+
+    def _set_due(self, due):
+        self.due = due
+        for hook in list(_due_hooks):
+            hook()
+
+    def cancel(self):
+        if self._cb is not None:
+            self.frame.after_cancel(self._cb)
+            self._cb = None
+            self.due = None
+
+    def _tick(self):
+        self._cb = None
+        self.due = None
+        self.frame._display()
+
+    def _schedule(self, delay_ms):
+        # A request() made while drawing is folded into the next frame
+        self.cancel()
+        # Never after(0): Tcl only runs idle callbacks (geometry, widget
+        # redraws) when no timer is due, so a chain of zero delay timers
+        # would starve them
+        delay_ms = max(1, delay_ms)
+        self._cb = self.frame.after(delay_ms, self._tick)
+        self._set_due(time.perf_counter() + delay_ms * 0.001)
+
+    def frame_started(self, now):
+        """ Called at the start of _display, returns lateness in seconds """
+        self.cancel()
+        if self._deadline is None:
+            return 0.0
+        return max(0.0, now - self._deadline)
+
+    def frame_done(self, start, now):
+        """ Called after the swap. start/now come from time.perf_counter """
+        pass
+
+
+class OnDemandScheduler(FrameScheduler):
+    """ Only draws after request(), e.g. on expose or invalidate """
+
+
+class ContinuousScheduler(FrameScheduler):
+    """ Draws as fast as possible, giving Tk 1 ms between frames """
+    period = 0.0
+
+    def frame_done(self, start, now):
+        self._schedule(1)
+
+
+class VsyncScheduler(ContinuousScheduler):
+    """
+    Used by animate when the frame has a swap interval set: the buffer
+    swap waits for the display, which then sets the frame rate
+    """
+
+
+class FixedRateScheduler(FrameScheduler):
+    """
+    Draws at a target rate, scheduling each frame against a deadline
+    so that the render time does not add to the frame period.
+    If we fall more than one period behind the deadline is reset and
+    the missed frames are counted in self.dropped.
+    """
+
+    def __init__(self, fps=60.0):
+        FrameScheduler.__init__(self)
+        self.period = 1.0 / fps
+
+    @property
+    def fps(self):
+        return 1.0 / self.period
+
+    @fps.setter
+    def fps(self, value):
+        self.period = 1.0 / value
+
+    def request(self):
+        # A deadline is already queued for the next frame
+        if self._cb is None and self.frame is not None:
+            self._deadline = None
+            self._idle()
+
+    def frame_done(self, start, now):
+        if self._deadline is None:
+            self._deadline = start
+        self._deadline += self.period
+        late = now - self._deadline
+        if late > self.period:
+            missed = int(late / self.period)
+            self.dropped += missed
+            self._deadline += missed * self.period
+        delay = max(1, int((self._deadline - time.perf_counter()) * 1000))
+        self._schedule(delay)
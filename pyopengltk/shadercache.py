@@ -0,0 +1,266 @@
+"""
+Compiling shader programs once, in a process and across runs
+
+Programs are looked up by a hash of their sources. In a process the
+ContextGroup keeps one program per group of sharing frames:
+
+    def initgl(self):
+        self.shader = self.context_group.program(vertex=vertex_shader,
+                                                 fragment=fragment_shader)
+
+When the driver has GL 4.1 or ARB_get_program_binary the linked binary
+is also saved to disk, so the next start skips compiling and linking.
+Binaries are kept per driver (vendor, renderer and version strings) in
+
+    $PYOPENGLTK_SHADER_CACHE, or
+    $XDG_CACHE_HOME/pyopengltk/shaders (~/.cache/pyopengltk/shaders)
+
+A driver may still refuse a binary it wrote, after an update that kept
+the version string for example. The program is then compiled from the
+sources and the file replaced. Set PYOPENGLTK_SHADER_CACHE to an empty
+string to keep nothing on disk.
+"""
+import ctypes
+import hashlib
+import logging
+import os
+import struct
+import threading
+
+import numpy
+from OpenGL import GL
+from OpenGL.error import GLError
+
+_log = logging.getLogger(__name__)
+
+# Keyword names of the stages, in the order they are hashed
+STAGES = (
+    ("vertex", GL.GL_VERTEX_SHADER),
+    ("tess_control", GL.GL_TESS_CONTROL_SHADER),
+    ("tess_evaluation", GL.GL_TESS_EVALUATION_SHADER),
+    ("geometry", GL.GL_GEOMETRY_SHADER),
+    ("fragment", GL.GL_FRAGMENT_SHADER),
+    ("compute", GL.GL_COMPUTE_SHADER),
+)
+
+# Binary format as a little endian uint32 ahead of the binary
+HEADER = struct.Struct("<I")
+
+
+def _text(source):
+    if isinstance(source, bytes):
+        return source.decode("utf-8")
+    return source
+
+
+def _stages(sources):
+    """ [(name, shader type, source)] in STAGES order """
+    unknown = set(sources) - set(name for name, kind in STAGES)
+    if unknown:
+        raise ValueError("Unknown shader stages %s" % sorted(unknown))
+    return [(name, kind, _text(sources[name]))
+            for name, kind in STAGES if sources.get(name) is not None]
+
+
+def source_hash(**sources):
+    """ Hex digest naming a program made from the sources """
+    h = hashlib.sha1()
+    for name, kind, source in _stages(sources):
+        h.update(("%s\0%s\0" % (name, source)).encode("utf-8"))
+    return h.hexdigest()
+
+
+def default_directory():
+    """ Where binaries go, None when disabled """
+    directory = os.environ.get("PYOPENGLTK_SHADER_CACHE")
+    if directory is not None:
+        return directory or None
+    cache = os.environ.get("XDG_CACHE_HOME")
+    if not cache:
+        if os.name == "nt" and os.environ.get("LOCALAPPDATA"):
+            cache = os.environ["LOCALAPPDATA"]
+        else:
+            cache = os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(cache, "pyopengltk", "shaders")
+
+
+def driver_key():
+    """ Digest of the current context's vendor, renderer and version """
+    h = hashlib.sha1()
+    for name in (GL.GL_VENDOR, GL.GL_RENDERER, GL.GL_VERSION):
+        h.update(GL.glGetString(name) or b"")
+        h.update(b"\0")
+    return h.hexdigest()[:16]
+
+
+def compile_shader(source, shader_type):
+    """ Compiled shader of shader_type, RuntimeError with the log if not """
+    shader = GL.glCreateShader(shader_type)
+    GL.glShaderSource(shader, [_text(source)])
+    GL.glCompileShader(shader)
+    if not GL.glGetShaderiv(shader, GL.GL_COMPILE_STATUS):
+        log = GL.glGetShaderInfoLog(shader)
+        GL.glDeleteShader(shader)
+        raise RuntimeError("Shader compile failure: %s" % _text(log),
+                           source, shader_type)
+    return shader
+
+
+def _linked(program):
+    return bool(GL.glGetProgramiv(program, GL.GL_LINK_STATUS))
+
+
+class ShaderCache(object):
+    """
+    Builds programs, reusing binaries saved by earlier runs
+
+    directory : None for default_directory(), False for no disk cache
+    binaries : None to save binaries when the context can
+
+    hits, misses and rejected count programs loaded from disk, compiled,
+    and whose binary the driver refused.
+    """
+
+    def __init__(self, directory=None, binaries=None):
+        if directory is None:
+            directory = default_directory()
+        self.directory = directory or None
+        self.binaries = binaries
+        self.hits = 0
+        self.misses = 0
+        self.rejected = 0
+        self._lock = threading.Lock()
+
+    def _can_save(self):
+        if self.directory is None or self.binaries is False:
+            return False
+        try:
+            return (bool(GL.glGetProgramBinary) and
+                    GL.glGetIntegerv(GL.GL_NUM_PROGRAM_BINARY_FORMATS) > 0)
+        except GL.GLError:
+            return False
+
+    def path(self, key):
+        """ File holding the binary for a source_hash, current driver """
+        return os.path.join(self.directory, driver_key(), key + ".bin")
+
+    def program(self, **sources):
+        """
+        Linked program from GLSL sources given by stage, vertex=...,
+        fragment=..., needs a context current. Not shared between
+        calls: use ContextGroup.program to compile once per group.
+        """
+        key = source_hash(**sources)
+        stages = _stages(sources)
+        save = self._can_save()
+        if save:
+            path = self.path(key)
+            program = self._load(path)
+            if program is not None:
+                with self._lock:
+                    self.hits += 1
+                return program
+        program = self._build(stages, retrievable=save)
+        with self._lock:
+            self.misses += 1
+        if save:
+            self._save(path, program)
+        return program
+
+    def _build(self, stages, retrievable):
+        shaders = [compile_shader(source, kind)
+                   for name, kind, source in stages]
+        program = GL.glCreateProgram()
+        if retrievable:
+            GL.glProgramParameteri(program,
+                                   GL.GL_PROGRAM_BINARY_RETRIEVABLE_HINT,
+                                   GL.GL_TRUE)
+        for shader in shaders:
+            GL.glAttachShader(program, shader)
+        GL.glLinkProgram(program)
+        for shader in shaders:
+            GL.glDetachShader(program, shader)
+            GL.glDeleteShader(shader)
+        if not _linked(program):
+            log = GL.glGetProgramInfoLog(program)
+            GL.glDeleteProgram(program)
+            raise RuntimeError("Shader link failure: %s" % _text(log))
+        return program
+
+    def _load(self, path):
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except (IOError, OSError):
+            return None
+        if len(data) <= HEADER.size:
+            return None
+        binary_format, = HEADER.unpack_from(data)
+        binary = data[HEADER.size:]
+        program = GL.glCreateProgram()
+        try:
+            # GL_INVALID_ENUM for a format the driver no longer has
+            GL.glProgramBinary(program, binary_format, binary, len(binary))
+            if _linked(program):
+                _log.debug("Program binary loaded from %s", path)
+                return program
+        except GLError as e:
+            _log.debug("glProgramBinary failed: %s", e)
+        GL.glDeleteProgram(program)
+        with self._lock:
+            self.rejected += 1
+        _log.info("Driver rejected program binary %s, recompiling", path)
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        return None
+
+    def _save(self, path, program):
+        length = GL.glGetProgramiv(program, GL.GL_PROGRAM_BINARY_LENGTH)
+        if length <= 0:
+            return
+        binary = numpy.empty(length, numpy.uint8)
+        written = GL.GLsizei()
+        binary_format = GL.GLenum()
+        GL.glGetProgramBinary(program, length, ctypes.byref(written),
+                              ctypes.byref(binary_format), binary)
+        data = HEADER.pack(binary_format.value) + \
+            binary[:written.value].tobytes()
+        # Write aside and rename, other processes only see whole files
+        tmp = "%s.%d.tmp" % (path, os.getpid())
+        try:
+            directory = os.path.dirname(path)
+            if not os.path.isdir(directory):
+                os.makedirs(directory)
+            with open(tmp, "wb") as f:
+                f.write(data)
+            if os.path.exists(path):
+                os.remove(path)
+            os.rename(tmp, path)
+        except (IOError, OSError) as e:
+            _log.warning("Could not save program binary %s: %s", path, e)
+            return
+        _log.debug("Program binary saved to %s", path)
+
+    def clear(self):
+        """ Remove the saved binaries of every driver """
+        if self.directory is None or not os.path.isdir(self.directory):
+            return
+        for driver in os.listdir(self.directory):
+            folder = os.path.join(self.directory, driver)
+            if not os.path.isdir(folder):
+                continue
+            for name in os.listdir(folder):
+                if name.endswith(".bin") or name.endswith(".tmp"):
+                    os.remove(os.path.join(folder, name))
+
+
+_default = []
+
+
+def default_cache():
+    """ The ShaderCache used by ContextGroup.program """
+    if not _default:
+        _default.append(ShaderCache())
+    return _default[0]
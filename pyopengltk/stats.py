@@ -0,0 +1,126 @@
+"""
+Frame time instrumentation for BaseOpenGLFrame
+
+Times are recorded for each phase of _display into fixed size ring
+buffers. Summaries give rolling mean/percentiles in milliseconds.
+"""
+import logging
+import time
+from array import array
+
+_log = logging.getLogger(__name__)
+
+# interval is start to start of consecutive frames
+# slack is how late the scheduler started the frame
+PHASES = ("makecurrent", "redraw", "swap", "slack", "frame", "interval")
+
+
+def percentile(sorted_values, p):
+    """ Nearest rank percentile of an already sorted sequence """
+    if not sorted_values:
+        return 0.0
+    i = int(round(p / 100.0 * (len(sorted_values) - 1)))
+    return sorted_values[i]
+
+
+class FrameStats(object):
+    """
+    Rolling frame statistics
+
+    size : number of frames kept
+    report_every : seconds between reports, 0 for no reports
+    callback : called with the summary() dict on each report
+    logger : logging.Logger used for reports when there is no callback
+    """
+
+    def __init__(self, size=300, report_every=0, callback=None, logger=None):
+        self.size = size
+        self.report_every = report_every
+        self.callback = callback
+        self.logger = logger if logger is not None else _log
+        # An optional GPUProfiler reported with the CPU times
+        self.gpu = None
+        self.reset()
+
+    def reset(self):
+        self._data = dict((p, array('d', [0.0]) * self.size) for p in PHASES)
+        self.count = 0
+        self.dropped = 0
+        self._dropped_total = None
+        self._last_start = None
+        self._last_report = time.perf_counter()
+
+    def record(self, start, current, drawn, swapped, slack, dropped_total):
+        """
+        Store one frame. The times come from time.perf_counter:
+        start of _display, after makeCurrent, after redraw, after swap.
+        dropped_total is the scheduler dropped frame counter.
+        """
+        i = self.count % self.size
+        d = self._data
+        d["makecurrent"][i] = current - start
+        d["redraw"][i] = drawn - current
+        d["swap"][i] = swapped - drawn
+        d["slack"][i] = slack
+        d["frame"][i] = swapped - start
+        if self._last_start is None:
+            d["interval"][i] = swapped - start
+        else:
+            d["interval"][i] = start - self._last_start
+        self._last_start = start
+        if self._dropped_total is not None:
+            self.dropped += dropped_total - self._dropped_total
+        self._dropped_total = dropped_total
+        self.count += 1
+        if self.report_every > 0 and \
+                swapped - self._last_report >= self.report_every:
+            self._last_report = swapped
+            self.report()
+
+    def values(self, phase):
+        """ The recorded times for one phase in seconds, oldest first """
+        n = min(self.count, self.size)
+        a = self._data[phase]
+        if self.count <= self.size:
+            return a[:n].tolist()
+        i = self.count % self.size
+        return (a[i:] + a[:i]).tolist()
+
+    def summary(self):
+        """ Dict of phase -> mean/p50/p95/p99/max in ms plus counters """
+        result = {"frames": self.count, "dropped": self.dropped}
+        for phase in PHASES:
+            v = sorted(self.values(phase))
+            n = max(1, len(v))
+            result[phase] = {
+                "mean": 1e3 * sum(v) / n,
+                "p50": 1e3 * percentile(v, 50),
+                "p95": 1e3 * percentile(v, 95),
+                "p99": 1e3 * percentile(v, 99),
+                "max": 1e3 * (v[-1] if v else 0.0),
+            }
+        mean_interval = result["interval"]["mean"]
+        result["fps"] = 1e3 / mean_interval if mean_interval > 0 else 0.0
+        if self.gpu is not None:
+            result["gpu"] = self.gpu.summary()
+        return result
+
+    def report(self):
+        s = self.summary()
+        if self.callback is not None:
+            self.callback(s)
+        else:
+            self.logger.info(format_summary(s))
+
+
+def format_summary(s):
+    """ One line text version of a FrameStats.summary() """
+    parts = ["fps %.1f frames %d dropped %d" % (
+        s["fps"], s["frames"], s["dropped"])]
+    for phase in PHASES[:-1]:
+        parts.append("%s %.2f/%.2f/%.2f ms" % (
+            phase, s[phase]["mean"], s[phase]["p95"], s[phase]["p99"]))
+    for name, t in sorted(s.get("gpu", {}).items()):
+        parts.append("gpu %s %.2f/%.2f/%.2f ms" % (
+            name, t["mean"], t["p95"], t["p99"]))
+    return ", ".join(parts)
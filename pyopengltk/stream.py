@@ -0,0 +1,171 @@
+"""
+Streaming vertex data that changes every frame
+
+A StreamBuffer is split into regions (three by default) used in turn,
+so while the GPU draws from one region the next frame is written into
+another. With GL 4.4 or ARB_buffer_storage the buffer is mapped once,
+persistently, and a fence after each region's draws tells when it may
+be overwritten. Writing is then a single copy into GPU visible memory,
+or none at all when the data is produced straight into acquire():
+
+    stream = StreamBuffer(npoints * 12)
+
+    def redraw(self):
+        points = stream.acquire(npoints * 12).view(numpy.float32)
+        source.read_into(points)             # or stream.write(array)
+        stream.bind()
+        GL.glVertexAttribPointer(0, 3, GL.GL_FLOAT, False, 12,
+                                 ctypes.c_void_p(stream.offset))
+        GL.glDrawArrays(GL.GL_POINTS, 0, npoints)
+
+Without buffer storage the buffer is orphaned and refilled with
+glBufferSubData, straight from the array's memory.
+"""
+import ctypes
+import logging
+
+import numpy
+from OpenGL import GL
+
+_log = logging.getLogger(__name__)
+
+MAP_FLAGS = (GL.GL_MAP_WRITE_BIT | GL.GL_MAP_PERSISTENT_BIT |
+             GL.GL_MAP_COHERENT_BIT)
+
+
+class StreamBuffer(object):
+    """
+    A buffer object refilled every frame without waiting for the GPU
+
+    nbytes : the most written per frame, grows when needed
+    nregions : frames that may be in flight
+    target : where it is bound, GL_ARRAY_BUFFER for vertices
+    persistent : None to use buffer storage when the context has it
+
+    After acquire() or write(), self.offset is where the data starts in
+    self.buffer. Needs the context current for everything but __init__.
+    """
+
+    def __init__(self, nbytes, nregions=3, target=GL.GL_ARRAY_BUFFER,
+                 persistent=None):
+        self.nbytes = nbytes
+        self.nregions = max(1, nregions)
+        self.target = target
+        self.persistent = persistent
+        self.buffer = None
+        self.offset = 0
+        self.waits = 0
+        self._region = -1
+        self._fences = []
+        self._mapped = None
+        self._pending = None
+        self._staging = None
+
+    def _create(self):
+        if self.persistent is None:
+            self.persistent = bool(GL.glBufferStorage)
+        self.buffer = GL.glGenBuffers(1)
+        GL.glBindBuffer(self.target, self.buffer)
+        if self.persistent:
+            total = self.nbytes * self.nregions
+            GL.glBufferStorage(self.target, total, None, MAP_FLAGS)
+            ptr = GL.glMapBufferRange(self.target, 0, total, MAP_FLAGS)
+            self._mapped = numpy.frombuffer(
+                (ctypes.c_ubyte * total).from_address(ptr), numpy.uint8)
+            self._fences = [None] * self.nregions
+        else:
+            GL.glBufferData(self.target, self.nbytes, None,
+                            GL.GL_STREAM_DRAW)
+        GL.glBindBuffer(self.target, 0)
+        self._region = -1
+        _log.debug("StreamBuffer of %d x %d bytes, persistent %s",
+                   self.nregions, self.nbytes, self.persistent)
+
+    def _next_region(self, nbytes):
+        if nbytes > self.nbytes:
+            self.release()
+            self.nbytes = max(nbytes, 2 * self.nbytes)
+        if self.buffer is None:
+            self._create()
+        if not self.persistent:
+            self.offset = 0
+            return
+        # Everything issued so far may read the current region
+        if self._region >= 0:
+            self._fences[self._region] = GL.glFenceSync(
+                GL.GL_SYNC_GPU_COMMANDS_COMPLETE, 0)
+        self._region = (self._region + 1) % self.nregions
+        self.offset = self._region * self.nbytes
+        self._wait(self._region)
+
+    def _wait(self, region):
+        fence = self._fences[region]
+        if fence is None:
+            return
+        result = GL.glClientWaitSync(fence, 0, 0)
+        if result == GL.GL_TIMEOUT_EXPIRED:
+            # The GPU is still reading it, more regions would help
+            self.waits += 1
+            while result == GL.GL_TIMEOUT_EXPIRED:
+                result = GL.glClientWaitSync(
+                    fence, GL.GL_SYNC_FLUSH_COMMANDS_BIT, 1000000)
+        GL.glDeleteSync(fence)
+        self._fences[region] = None
+
+    def acquire(self, nbytes):
+        """
+        uint8 array of nbytes to fill for this frame, in GPU memory when
+        persistent. Use .view() for other dtypes. Valid until the next
+        acquire() or write().
+        """
+        self._next_region(nbytes)
+        if self.persistent:
+            return self._mapped[self.offset:self.offset + nbytes]
+        # Orphan, the array is sent by the next bind()
+        GL.glBindBuffer(self.target, self.buffer)
+        GL.glBufferData(self.target, self.nbytes, None, GL.GL_STREAM_DRAW)
+        GL.glBindBuffer(self.target, 0)
+        if self._staging is None or len(self._staging) < nbytes:
+            self._staging = numpy.empty(self.nbytes, numpy.uint8)
+        self._pending = self._staging[:nbytes]
+        return self._pending
+
+    def write(self, data):
+        """ Copy an array (anything with the buffer protocol) in """
+        data = numpy.ascontiguousarray(data)
+        nbytes = data.nbytes
+        self._next_region(nbytes)
+        if self.persistent:
+            self._mapped[self.offset:self.offset + nbytes] = \
+                data.reshape(-1).view(numpy.uint8)
+        else:
+            GL.glBindBuffer(self.target, self.buffer)
+            GL.glBufferData(self.target, self.nbytes, None,
+                            GL.GL_STREAM_DRAW)
+            GL.glBufferSubData(self.target, 0, nbytes, data)
+            GL.glBindBuffer(self.target, 0)
+        return self.offset
+
+    def bind(self):
+        """ Bind to the target, sending what acquire() handed out """
+        GL.glBindBuffer(self.target, self.buffer)
+        if self._pending is not None:
+            GL.glBufferSubData(self.target, 0, self._pending.nbytes,
+                               self._pending)
+            self._pending = None
+
+    def release(self):
+        """ Delete the buffer and fences, needs the context current """
+        for fence in self._fences:
+            if fence is not None:
+                GL.glDeleteSync(fence)
+        self._fences = []
+        if self.buffer is not None:
+            if self._mapped is not None:
+                GL.glBindBuffer(self.target, self.buffer)
+                GL.glUnmapBuffer(self.target)
+                GL.glBindBuffer(self.target, 0)
+            GL.glDeleteBuffers(1, [self.buffer])
+        self._mapped = None
+        self.buffer = None
+        self._region = -1
@@ -1,29 +1,112 @@
 """
 Windows implementation of the opengl frame
 """
-from ctypes import WinDLL, c_void_p
+import logging
+from ctypes import WinDLL, c_int, c_void_p, byref, sizeof
 from ctypes.wintypes import HDC
+from OpenGL import GL
+from OpenGL.error import NullFunctionError
 from OpenGL.WGL import PIXELFORMATDESCRIPTOR, ChoosePixelFormat, \
-    SetPixelFormat, SwapBuffers, wglCreateContext, wglMakeCurrent
+    SetPixelFormat, DescribePixelFormat, SwapBuffers, wglCreateContext, \
+    wglMakeCurrent, wglShareLists, wglDeleteContext
+from OpenGL.raw.WGL.EXT.swap_control import wglSwapIntervalEXT
+from OpenGL.raw.WGL.ARB.create_context import wglCreateContextAttribsARB, \
+    WGL_CONTEXT_MAJOR_VERSION_ARB, WGL_CONTEXT_MINOR_VERSION_ARB, \
+    WGL_CONTEXT_FLAGS_ARB, WGL_CONTEXT_DEBUG_BIT_ARB
+from OpenGL.raw.WGL.ARB.create_context_profile import \
+    WGL_CONTEXT_PROFILE_MASK_ARB, WGL_CONTEXT_CORE_PROFILE_BIT_ARB, \
+    WGL_CONTEXT_COMPATIBILITY_PROFILE_BIT_ARB
+from OpenGL.raw.WGL.ARB.create_context_robustness import \
+    WGL_CONTEXT_ROBUST_ACCESS_BIT_ARB, \
+    WGL_CONTEXT_RESET_NOTIFICATION_STRATEGY_ARB, WGL_LOSE_CONTEXT_ON_RESET_ARB
+from OpenGL.raw.WGL.ARB.create_context_no_error import \
+    WGL_CONTEXT_OPENGL_NO_ERROR_ARB
 
 from pyopengltk.base import BaseOpenGLFrame
 
+_log = logging.getLogger(__name__)
+
 _user32 = WinDLL('user32')
 GetDC = _user32.GetDC
 GetDC.restype = HDC
 GetDC.argtypes = [c_void_p]
+ReleaseDC = _user32.ReleaseDC
+ReleaseDC.argtypes = [c_void_p, HDC]
 
-pfd = PIXELFORMATDESCRIPTOR()
 PFD_TYPE_RGBA =         0
 PFD_MAIN_PLANE =        0
 PFD_DOUBLEBUFFER =      0x00000001
 PFD_DRAW_TO_WINDOW =    0x00000004
 PFD_SUPPORT_OPENGL =    0x00000020
-pfd.dwFlags = PFD_DRAW_TO_WINDOW | PFD_SUPPORT_OPENGL | PFD_DOUBLEBUFFER
-pfd.iPixelType = PFD_TYPE_RGBA
-pfd.cColorBits = 24
-pfd.cDepthBits = 16
-pfd.iLayerType = PFD_MAIN_PLANE
+PFD_DEPTH_DONTCARE =    0x20000000
+
+
+def pixel_format_descriptor(double_buffer=True, depth_size=None,
+                            stencil_size=None, alpha_size=None,
+                            samples=None, srgb=False):
+    """ PIXELFORMATDESCRIPTOR for the framebuffer options of a frame """
+    pfd = PIXELFORMATDESCRIPTOR()
+    pfd.dwFlags = PFD_DRAW_TO_WINDOW | PFD_SUPPORT_OPENGL
+    if double_buffer:
+        pfd.dwFlags |= PFD_DOUBLEBUFFER
+    pfd.iPixelType = PFD_TYPE_RGBA
+    pfd.cColorBits = 24
+    pfd.cDepthBits = 16 if depth_size is None else depth_size
+    if depth_size == 0:
+        # ChoosePixelFormat only leaves out the depth buffer with this
+        pfd.dwFlags |= PFD_DEPTH_DONTCARE
+    pfd.cStencilBits = stencil_size or 0
+    pfd.cAlphaBits = alpha_size or 0
+    pfd.iLayerType = PFD_MAIN_PLANE
+    if samples or srgb:
+        # These need wglChoosePixelFormatARB and a dummy window
+        _log.warning("samples and srgb are not supported on Windows")
+    return pfd
+
+
+def describe_pixel_format(hdc, pixelformat):
+    """ What a pixel format gives, named like the frame options """
+    pfd = PIXELFORMATDESCRIPTOR()
+    DescribePixelFormat(hdc, pixelformat, sizeof(pfd), byref(pfd))
+    return {
+        "double_buffer": bool(pfd.dwFlags & PFD_DOUBLEBUFFER),
+        "depth_size": pfd.cDepthBits,
+        "stencil_size": pfd.cStencilBits,
+        "alpha_size": pfd.cAlphaBits,
+        "samples": 0,
+        "srgb": False,
+        "pixel_format": pixelformat,
+    }
+
+
+pfd = pixel_format_descriptor()
+
+
+def context_attribs(version=None, profile=None, debug=False,
+                    no_error=False, robust=False):
+    """ Attribute list for wglCreateContextAttribsARB, without the 0 """
+    attribs = []
+    if version:
+        attribs += [WGL_CONTEXT_MAJOR_VERSION_ARB, version[0],
+                    WGL_CONTEXT_MINOR_VERSION_ARB, version[1]]
+    if profile == "core":
+        attribs += [WGL_CONTEXT_PROFILE_MASK_ARB,
+                    WGL_CONTEXT_CORE_PROFILE_BIT_ARB]
+    elif profile == "compat":
+        attribs += [WGL_CONTEXT_PROFILE_MASK_ARB,
+                    WGL_CONTEXT_COMPATIBILITY_PROFILE_BIT_ARB]
+    flags = 0
+    if debug:
+        flags |= WGL_CONTEXT_DEBUG_BIT_ARB
+    if robust:
+        flags |= WGL_CONTEXT_ROBUST_ACCESS_BIT_ARB
+        attribs += [WGL_CONTEXT_RESET_NOTIFICATION_STRATEGY_ARB,
+                    WGL_LOSE_CONTEXT_ON_RESET_ARB]
+    if flags:
+        attribs += [WGL_CONTEXT_FLAGS_ARB, flags]
+    if no_error:
+        attribs += [WGL_CONTEXT_OPENGL_NO_ERROR_ARB, 1]
+    return [int(a) for a in attribs]
 
 
 # Inherits the base and fills in the 3 platform dependent functions
@@ -34,15 +117,70 @@ class OpenGLFrame(BaseOpenGLFrame):
 
     def tkCreateContext(self):
         self.__window = GetDC(self.winfo_id())
-        pixelformat = ChoosePixelFormat(self.__window, pfd)
-        SetPixelFormat(self.__window, pixelformat, pfd)
+        wanted = pixel_format_descriptor(**self.framebuffer_options)
+        pixelformat = ChoosePixelFormat(self.__window, wanted)
+        SetPixelFormat(self.__window, pixelformat, wanted)
+        self.framebuffer = describe_pixel_format(self.__window, pixelformat)
         self.__context = wglCreateContext(self.__window)
+        share = self.context_group.context
+        if self._wants_context_attribs():
+            # The ARB entry point is only found with a context current
+            wglMakeCurrent(self.__window, self.__context)
+            for options in self._context_attempts():
+                attribs = context_attribs(**options) + [0]
+                try:
+                    context = wglCreateContextAttribsARB(
+                        self.__window, share,
+                        (c_int * len(attribs))(*attribs))
+                except Exception:
+                    context = None
+                if context:
+                    wglMakeCurrent(None, None)
+                    wglDeleteContext(self.__context)
+                    self.__context = context
+                    self.context_group.add(self, context)
+                    self._context_created(options)
+                    wglMakeCurrent(self.__window, self.__context)
+                    return
+        # Must happen before the new context owns any objects
+        if share is not None and not wglShareLists(share, self.__context):
+            raise RuntimeError("wglShareLists failed")
+        self.context_group.add(self, self.__context)
+        self._context_created(None)
         wglMakeCurrent(self.__window, self.__context)
 
     def tkMakeCurrent(self):
-        if self.winfo_ismapped():
+        if self._mapped and not self._is_current():
             wglMakeCurrent(self.__window, self.__context)
+            self._set_current()
+
+    def tkDoneCurrent(self):
+        wglMakeCurrent(None, None)
+        self._set_current(False)
+
+    def tkSwapInterval(self, interval):
+        try:
+            if wglSwapIntervalEXT(interval):
+                return interval
+            # -1 needs WGL_EXT_swap_control_tear, fall back to vsync
+            if interval < 0 and wglSwapIntervalEXT(-interval):
+                return -interval
+        except NullFunctionError:
+            pass
+        return None
+
+    def tkDestroyContext(self):
+        if self._is_current():
+            self.tkDoneCurrent()
+        wglDeleteContext(self.__context)
+        ReleaseDC(self._wid, self.__window)
+        self.__context = None
+        self.__window = None
 
     def tkSwapBuffers(self):
-        if self.winfo_ismapped():
+        if not self._mapped:
+            return
+        if self.double_buffered:
             SwapBuffers(self.__window)
+        else:
+            GL.glFlush()
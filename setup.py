@@ -13,6 +13,7 @@ setup(
     packages=['pyopengltk'],
     install_requires=[
         'pyopengl',
+        'numpy',
     ],
     keywords=['opengl', 'window', 'context', 'tk', 'tkinter'],
     classifiers=[
@@ -0,0 +1,39 @@
+"""
+Shared fixtures. Without a display the GL tests run on EGL, which has to
+be chosen before OpenGL is first imported.
+"""
+import os
+
+import pytest
+
+if not os.environ.get("DISPLAY"):
+    os.environ.setdefault("PYOPENGL_PLATFORM", "egl")
+# Compile every shader, leave the user's cache alone
+os.environ["PYOPENGLTK_SHADER_CACHE"] = ""
+
+
+@pytest.fixture
+def offscreen():
+    """
+    Factory for current OffscreenOpenGL contexts, skipping the test when
+    there is no headless platform
+    """
+    from pyopengltk.offscreen import OffscreenOpenGL, headless_platform
+    if headless_platform() is None:
+        pytest.skip("needs PYOPENGL_PLATFORM=egl or osmesa")
+    made = []
+
+    def make(width=64, height=64, redraw=None):
+        ogl = OffscreenOpenGL(width, height)
+        ogl.initgl = lambda: None
+        ogl.redraw = redraw or (lambda: None)
+        try:
+            ogl.create()
+        except Exception as e:
+            pytest.skip("no headless GL: %s" % e)
+        made.append(ogl)
+        return ogl
+
+    yield make
+    for ogl in made:
+        ogl.destroy()
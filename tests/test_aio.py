@@ -0,0 +1,80 @@
+"""
+Pumping Tk from asyncio, against a Tcl interpreter
+"""
+import asyncio
+import time
+
+import pytest
+
+tkinter = pytest.importorskip("tkinter")
+
+from pyopengltk.aio import AsyncFrame, display_fd, pump
+
+
+def test_pump_handles_due_events():
+    tcl = tkinter.Tcl()
+    done = []
+    tcl.after_idle(lambda: done.append("idle"))
+    tcl.after(0, lambda: done.append("timer"))
+    assert pump(tcl) is False
+    assert sorted(done) == ["idle", "timer"]
+
+
+def test_pump_is_bounded():
+    tcl = tkinter.Tcl()
+    calls = []
+    pending = []
+
+    def chain():
+        calls.append(1)
+        pending[:] = [tcl.after(0, chain)]
+
+    tcl.after(0, chain)
+    start = time.perf_counter()
+    assert pump(tcl, budget=0.01) is True
+    assert time.perf_counter() - start < 0.5
+    assert calls
+    # Timers are per thread, not per interpreter
+    tcl.after_cancel(pending[0])
+
+
+class DrawnElsewhere(object):
+    """ What AsyncFrame needs of a frame drawn by a render thread """
+    render_thread = True
+
+    def __init__(self):
+        self.hooks = []
+        self.invalidated = 0
+
+    def add_frame_hook(self, hook):
+        self.hooks.append(hook)
+
+    def invalidate(self):
+        self.invalidated += 1
+
+
+def test_send_dropped_or_taken():
+    frame = DrawnElsewhere()
+    data = AsyncFrame(frame)
+
+    async def main():
+        first = asyncio.ensure_future(data.send(1))
+        second = asyncio.ensure_future(data.send(2))
+        await asyncio.sleep(0)
+        # Replaced before any frame took it
+        assert await first is False
+        assert data.take() == (2, True)
+        assert await second is True
+        # Taken values are not dropped by the next one
+        third = asyncio.ensure_future(data.send(3))
+        await asyncio.sleep(0)
+        assert data.take() == (3, True)
+        data.publish(4)
+        assert await third is True
+
+    asyncio.run(main())
+    assert frame.invalidated == 4
+
+
+def test_no_display_fd_without_tk():
+    assert display_fd(tkinter.Tcl()) is None
@@ -0,0 +1,85 @@
+"""
+Camera math against closed form results, no GL needed
+"""
+import math
+
+import numpy
+from numpy.testing import assert_allclose
+
+from pyopengltk import camera
+
+
+def apply(m, p):
+    p = numpy.dot(m, numpy.append(p, 1.0))
+    return p[:3] / p[3]
+
+
+def test_rotate():
+    assert_allclose(apply(camera.rotate(90, 0, 0, 1), (1, 0, 0)), (0, 1, 0),
+                    atol=1e-12)
+    assert_allclose(apply(camera.rotate(90, 1, 0, 0), (0, 1, 0)), (0, 0, 1),
+                    atol=1e-12)
+    # The axis does not need to be normalized
+    m = camera.rotate(37, 1, 2, 3)
+    assert_allclose(apply(m, (2, 4, 6)), (2, 4, 6))
+    assert_allclose(numpy.dot(m[:3, :3], m[:3, :3].T), numpy.identity(3),
+                    atol=1e-12)
+    assert_allclose(numpy.linalg.det(m), 1.0)
+
+
+def test_look_at():
+    eye, center = (1.0, 2.0, 3.0), (1.0, 2.0, -7.0)
+    m = camera.look_at(eye, center, (0, 1, 0))
+    assert_allclose(apply(m, eye), (0, 0, 0), atol=1e-12)
+    assert_allclose(apply(m, center), (0, 0, -10), atol=1e-12)
+    assert_allclose(apply(m, (1, 3, 3)), (0, 1, 0), atol=1e-12)
+    # Looking down -x instead
+    m = camera.look_at((0, 0, 0), (-5, 0, 0), (0, 1, 0))
+    assert_allclose(apply(m, (-5, 0, 0)), (0, 0, -5), atol=1e-12)
+    # -z is then on the right
+    assert_allclose(apply(m, (0, 0, -1)), (1, 0, 0), atol=1e-12)
+
+
+def test_perspective():
+    fovy, aspect, near, far = 60.0, 2.0, 0.5, 50.0
+    m = camera.perspective(fovy, aspect, near, far)
+    t = math.tan(math.radians(fovy) / 2)
+    assert_allclose(apply(m, (0, 0, -near)), (0, 0, -1), atol=1e-12)
+    assert_allclose(apply(m, (0, 0, -far)), (0, 0, 1), atol=1e-12)
+    # Top and right edges of the view at depth 10
+    assert_allclose(apply(m, (0, 10 * t, -10))[1], 1.0)
+    assert_allclose(apply(m, (10 * t * aspect, 0, -10))[0], 1.0)
+
+
+def test_ortho():
+    m = camera.ortho(-2, 6, -1, 3, 1, 11)
+    assert_allclose(apply(m, (-2, -1, -1)), (-1, -1, -1))
+    assert_allclose(apply(m, (6, 3, -11)), (1, 1, 1))
+
+
+def test_project_unproject():
+    cam = camera.Camera(center=(1, 2, 3), distance=20)
+    cam.resize(640, 480)
+    cam.rotate(30, -45)
+    cam.translate(5, 7)
+    rng = numpy.random.RandomState(1)
+    points = cam.center + rng.uniform(-5, 5, (50, 3))
+    window = cam.project(points)
+    assert_allclose(camera.unproject(window, cam.matrix(), cam.viewport),
+                    points, atol=1e-9)
+    x, y, z = window[0]
+    assert_allclose(cam.unproject(x, y, z), points[0], atol=1e-9)
+
+
+def test_camera_center_and_mouse():
+    cam = camera.Camera(center=(1, 2, 3), distance=20)
+    cam.resize(400, 300)
+    # The center is in the middle of the window whatever the rotation
+    cam.rotate(40, 25)
+    assert_allclose(cam.project(cam.center)[:2], (200, 150))
+    # Translating moves it with the mouse, y down the window
+    cam.reset()
+    cam.translate(10, 20)
+    assert_allclose(cam.project(cam.center)[:2], (210, 130))
+    size = cam.pixel_size()
+    assert_allclose(size, 2 * 20 * math.tan(math.radians(15)) / 300)
@@ -0,0 +1,65 @@
+"""
+Framebuffer readback, headless
+"""
+import numpy
+import pytest
+
+from pyopengltk.capture import FrameCapture, read_pixels
+
+
+def draw_frame(ogl):
+    # Frame n is cleared to red n, with a green top half
+    from OpenGL import GL
+    GL.glDisable(GL.GL_SCISSOR_TEST)
+    GL.glClearColor(ogl.nframes / 255.0, 0.0, 0.0, 1.0)
+    GL.glClear(GL.GL_COLOR_BUFFER_BIT)
+    GL.glEnable(GL.GL_SCISSOR_TEST)
+    GL.glScissor(0, ogl.height // 2, ogl.width, ogl.height - ogl.height // 2)
+    GL.glClearColor(0.0, 1.0, 0.0, 1.0)
+    GL.glClear(GL.GL_COLOR_BUFFER_BIT)
+    GL.glDisable(GL.GL_SCISSOR_TEST)
+
+
+def test_read_pixels_top_row_first(offscreen):
+    ogl = offscreen(8, 6)
+    ogl.redraw = lambda: draw_frame(ogl)
+    ogl.render()
+    rgb = ogl.read_pixels()
+    assert rgb.shape == (6, 8, 3)
+    assert (rgb[0] == (0, 255, 0)).all()
+    assert (rgb[-1] == (0, 0, 0)).all()
+    rgba = read_pixels(0, 0, 8, 6, "rgba")
+    assert (rgba[..., 3] == 255).all()
+
+
+@pytest.mark.parametrize("nbuffers", [2, 3])
+def test_capture_ring(offscreen, nbuffers):
+    ogl = offscreen(16, 8)
+    ogl.redraw = lambda: draw_frame(ogl)
+    got = []
+    capture = FrameCapture(nbuffers, "rgb",
+                           lambda arr, n: got.append((n, arr.copy())))
+    ogl.add_frame_hook(capture)
+    ogl.render(10)
+    # Handed out nbuffers-1 frames late
+    assert [n for n, arr in got] == list(range(10 - (nbuffers - 1)))
+    capture.finish()
+    assert [n for n, arr in got] == list(range(10))
+    for n, arr in got:
+        assert arr.shape == (8, 16, 3)
+        assert (arr[0] == (0, 255, 0)).all()
+        assert (arr[-1] == (n, 0, 0)).all()
+    capture.release()
+
+
+def test_capture_resize(offscreen):
+    ogl = offscreen(16, 8)
+    capture = FrameCapture(2, "luminance")
+    assert capture.capture(0, 0, 16, 8) == (None, None)
+    arr, n = capture.capture(0, 0, 4, 2)
+    # A new size starts a new ring
+    assert arr is None
+    arr, n = capture.capture(0, 0, 4, 2)
+    assert arr.shape == (2, 4) and n == 1
+    assert not arr.flags.writeable
+    capture.release()
@@ -0,0 +1,169 @@
+"""
+Handing data between threads: TripleBuffer, Waker and frame.publish
+"""
+import threading
+import time
+
+import pytest
+
+tkinter = pytest.importorskip("tkinter")
+
+from pyopengltk import base
+from pyopengltk.base import BaseOpenGLFrame
+from pyopengltk.channel import TripleBuffer, Waker, add_wake_hook, \
+    remove_wake_hook
+
+
+def produce(target, count):
+    thread = threading.Thread(target=target, args=(count,))
+    thread.start()
+    return thread
+
+
+def test_producer_thread_in_place():
+    # Each slot is filled in two steps, a torn read would see them differ
+    channel = TripleBuffer(lambda: [-1, -1])
+    count = 20000
+
+    def producer(count):
+        for n in range(count):
+            slot = channel.back()
+            slot[0] = n
+            slot[1] = n
+            channel.publish()
+
+    seen = []
+    thread = produce(producer, count)
+    while thread.is_alive() or channel.pending:
+        slot, changed = channel.acquire()
+        first = slot[0]
+        time.sleep(0)
+        assert slot[1] == first
+        if changed:
+            seen.append(first)
+    thread.join()
+    assert seen == sorted(set(seen))
+    assert seen[-1] == count - 1
+    assert channel.published == count
+    assert channel.acquire() == ([count - 1, count - 1], False)
+
+
+def test_producer_thread_new_objects():
+    channel = TripleBuffer()
+    count = 20000
+    thread = produce(lambda count: [channel.publish((n, str(n)))
+                                    for n in range(count)], count)
+    last = -1
+    while thread.is_alive() or channel.pending:
+        value, changed = channel.acquire()
+        if changed:
+            n, text = value
+            assert n > last and text == str(n)
+            last = n
+    thread.join()
+    assert last == count - 1
+
+
+def pump_until(tcl, done, seconds=1.0):
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end and not done():
+        if not tcl.dooneevent(tkinter._tkinter.DONT_WAIT):
+            time.sleep(0.0002)
+
+
+def test_waker():
+    tcl = tkinter.Tcl()
+    calls = []
+    try:
+        waker = Waker(tcl, lambda: calls.append(1))
+    except NotImplementedError:
+        pytest.skip("no Tk file handlers")
+    thread = produce(lambda count: [waker.wake() for n in range(count)], 100)
+    thread.join()
+    pump_until(tcl, lambda: calls)
+    # Folded into one call
+    pump_until(tcl, lambda: False, 0.05)
+    assert calls == [1]
+    waker.wake()
+    pump_until(tcl, lambda: len(calls) == 2)
+    assert calls == [1, 1]
+    waker.close()
+    waker.wake()
+    pump_until(tcl, lambda: False, 0.05)
+    assert calls == [1, 1]
+
+
+class StubFrame(object):
+    """ The channel methods of a frame, timers and files from Tcl """
+    wake_interval = BaseOpenGLFrame.wake_interval
+    wake_interval_max = BaseOpenGLFrame.wake_interval_max
+    channel = BaseOpenGLFrame.channel
+    publish = BaseOpenGLFrame.publish
+    acquire = BaseOpenGLFrame.acquire
+    _invalidate_from_any_thread = BaseOpenGLFrame._invalidate_from_any_thread
+    _start_wakes = BaseOpenGLFrame._start_wakes
+    _woken = BaseOpenGLFrame._woken
+    _poll_wakes = BaseOpenGLFrame._poll_wakes
+
+    def __init__(self):
+        self.tk = tkinter.Tcl()
+        self.render_thread = None
+        self.context_created = True
+        self.dirty = False
+        self.invalidated = 0
+        self._channels = {}
+        self._channels_lock = threading.Lock()
+        self._tk_thread = threading.current_thread()
+        self._wake_pending = False
+        self._waker = None
+        self._polling_wakes = False
+        self._wake_delay = self.wake_interval
+        self.delays = []
+
+    def after(self, ms, func):
+        self.delays.append(ms)
+        return self.tk.after(ms, func)
+
+    def winfo_exists(self):
+        return True
+
+    def invalidate(self):
+        self.invalidated += 1
+
+
+@pytest.mark.parametrize("pipe", [True, False])
+def test_publish_from_worker(monkeypatch, pipe):
+    if not pipe:
+        def no_file_handlers(*args):
+            raise NotImplementedError
+        monkeypatch.setattr(base, "Waker", no_file_handlers)
+    frame = StubFrame()
+    hooked = []
+
+    def hook():
+        hooked.append(threading.current_thread())
+
+    add_wake_hook(hook)
+    try:
+        # As the acquire in redraw, before any data
+        assert frame.acquire("points") == (None, False)
+        if pipe and frame._waker is None:
+            pytest.skip("no Tk file handlers")
+        assert frame._polling_wakes is not pipe
+        thread = produce(lambda count: [frame.publish("points", n)
+                                        for n in range(count)], 1000)
+        thread.join()
+        assert frame.dirty
+        # Told in the producer thread
+        assert len(hooked) == 1000 and set(hooked) == {thread}
+        pump_until(frame.tk, lambda: frame.invalidated)
+        assert frame.invalidated == 1
+        assert frame.acquire("points") == (999, True)
+        if not pipe:
+            # Backing off while no data comes
+            pump_until(frame.tk, lambda: False, 0.5)
+            assert max(frame.delays) == frame.wake_interval_max
+    finally:
+        remove_wake_hook(hook)
+        if frame._waker is not None:
+            frame._waker.close()
@@ -0,0 +1,75 @@
+"""
+ImageView uploads, tiling and colormaps, headless
+"""
+import numpy
+import pytest
+
+from pyopengltk.image import ImageView
+
+
+def show(ogl, view):
+    from OpenGL import GL
+    GL.glClearColor(0.0, 0.0, 1.0, 1.0)
+    GL.glClear(GL.GL_COLOR_BUFFER_BIT)
+    view.draw()
+    return ogl.read_pixels()
+
+
+def blocks(rgb, rows, columns):
+    """ The color in the middle of each image pixel on the screen """
+    h, w = rgb.shape[:2]
+    return numpy.array([[rgb[int((r + 0.5) * h / rows),
+                             int((c + 0.5) * w / columns)]
+                         for c in range(columns)] for r in range(rows)])
+
+
+@pytest.mark.parametrize("max_tile", [None, 1, 2])
+def test_rgb_image_and_tiles(offscreen, max_tile):
+    ogl = offscreen(60, 40)
+    image = numpy.zeros((2, 3, 3), numpy.uint8)
+    image[0, 0] = (255, 0, 0)       # top left
+    image[1, 2] = (0, 255, 0)       # bottom right
+    image[0, 2] = (10, 20, 30)
+    view = ImageView(max_tile=max_tile)
+    view.set_image(image)
+    got = blocks(show(ogl, view), 2, 3)
+    assert (got == image).all()
+    assert len(view.tiles) == {None: 1, 1: 6, 2: 2}[max_tile]
+    view.release()
+
+
+def test_levels_and_colormap(offscreen):
+    ogl = offscreen(40, 10)
+    image = numpy.array([[1000, 2000, 3000, 5000]], numpy.uint16)
+    lut = numpy.zeros((3, 3))
+    lut[:, 0] = (0.0, 0.5, 1.0)
+    view = ImageView(levels=(1000, 3000), colormap=lut)
+    view.set_image(image)
+    got = blocks(show(ogl, view), 1, 4)
+    # Between lut entries the colors are interpolated, above the high
+    # level the last one is used
+    assert numpy.abs(got[0, :, 0].astype(int) - (0, 128, 255, 255)).max() <= 1
+    assert (got[..., 1:] == 0).all()
+    # Grey without a colormap
+    view.colormap = None
+    got = blocks(show(ogl, view), 1, 4)
+    assert numpy.abs(got[0, :, 1].astype(int) - (0, 128, 255, 255)).max() <= 1
+    assert view.uploads == 1
+    view.release()
+
+
+def test_new_shape_reallocates(offscreen):
+    ogl = offscreen(20, 20)
+    view = ImageView()
+    view.set_image(numpy.ones((4, 4), numpy.float32))
+    show(ogl, view)
+    tiles = list(view.tiles)
+    view.set_image(numpy.zeros((4, 4), numpy.float32))
+    assert (show(ogl, view) == 0).all()
+    assert view.tiles == tiles
+    view.set_image(numpy.zeros((2, 4), numpy.float32))
+    show(ogl, view)
+    assert view.shape == (2, 4, 1)
+    with pytest.raises(ValueError):
+        view.upload(numpy.zeros((2, 2), numpy.int32))
+    view.release()
@@ -0,0 +1,81 @@
+"""
+Id buffer picking, headless
+"""
+import pytest
+
+from pyopengltk.picking import Picker
+
+
+def draw_ids(frame, picker, halves=((-1.0, 0.0), (0.0, 1.0))):
+    # Object 1 on the left half, object 2 on the right, two triangles
+    # each, in normalized device coordinates
+    from OpenGL import GL
+    picker.use()
+    GL.glMatrixMode(GL.GL_PROJECTION)
+    GL.glLoadIdentity()
+    GL.glMatrixMode(GL.GL_MODELVIEW)
+    GL.glLoadIdentity()
+    # Depth is only written with the test on, as in a 3D scene
+    GL.glEnable(GL.GL_DEPTH_TEST)
+    for number, (x0, x1) in enumerate(halves, 1):
+        picker.set_object(number)
+        GL.glBegin(GL.GL_TRIANGLES)
+        for x, y in ((x0, -1), (x1, -1), (x1, 1), (x0, -1), (x1, 1), (x0, 1)):
+            GL.glVertex3f(x, y, 0.0)
+        GL.glEnd()
+    GL.glDisable(GL.GL_DEPTH_TEST)
+
+
+def pick(ogl, picker, *points):
+    results = {}
+    for x, y in points:
+        picker.request(x, y, lambda r, p=(x, y): results.__setitem__(p, r))
+    for i in range(5):
+        ogl.render()
+        if len(results) == len(points):
+            break
+    return results
+
+
+@pytest.fixture
+def picking(offscreen):
+    ogl = offscreen(32, 16)
+    picker = Picker(draw_ids)
+    ogl.add_frame_hook(picker)
+    yield ogl, picker
+    picker.release()
+
+
+def test_objects(picking):
+    ogl, picker = picking
+    results = pick(ogl, picker, (4, 3), (28, 12))
+    left, right = results[(4, 3)], results[(28, 12)]
+    assert left.object_id == 1 and right.object_id == 2
+    assert (left.x, left.y) == (4, 3)
+    assert left.depth == pytest.approx(0.5)
+    assert left.primitive_id in (0, 1)
+    assert picker.pending == 0
+
+
+def test_nearest_within_radius(picking):
+    ogl, picker = picking
+    # Only the left half, pixels 0 to 15
+    picker.draw_ids = lambda frame, p: draw_ids(frame, p, ((-1.0, 0.0),))
+    near, far = (17, 8), (19, 8)
+    results = pick(ogl, picker, near, far)
+    assert results[near].object_id == 1
+    assert (results[near].x, results[near].y) == (15, 8)
+    assert results[far] is None
+    # Outside the window
+    assert pick(ogl, picker, (100, 3)) == {(100, 3): None}
+
+
+def test_newer_request_replaces_older(picking):
+    ogl, picker = picking
+    got = []
+    picker.request(4, 3, got.append)
+    picker.request(28, 3, got.append)
+    assert picker.pending == 1
+    for i in range(5):
+        ogl.render()
+    assert [r.object_id for r in got] == [2]
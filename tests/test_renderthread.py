@@ -0,0 +1,93 @@
+"""
+RenderThread driving a stub frame, no GL or display needed
+"""
+import threading
+import time
+
+import pytest
+
+from pyopengltk.renderthread import RenderThread
+from pyopengltk.scheduler import (ContinuousScheduler, FixedRateScheduler,
+                                  OnDemandScheduler)
+
+
+class StubFrame(object):
+    """ What RenderThread calls on an OpenGLFrame """
+
+    def __init__(self, scheduler):
+        self.scheduler = scheduler
+        self.dirty = False
+        self.frames = 0
+        self.slack = []
+        self.current = False
+        self.drawn = threading.Event()
+
+    def tkMakeCurrent(self):
+        self.current = True
+
+    def tkDoneCurrent(self):
+        self.current = False
+
+    def initgl(self):
+        pass
+
+    def _render_frame(self, start, slack):
+        self.dirty = False
+        self.frames += 1
+        self.slack.append(slack)
+        if self.frames >= 5:
+            self.drawn.set()
+
+
+@pytest.fixture
+def thread():
+    threads = []
+
+    def start(scheduler):
+        frame = StubFrame(scheduler)
+        rt = RenderThread(frame)
+        threads.append(rt)
+        rt.start()
+        return frame, rt
+
+    yield start
+    for rt in threads:
+        rt.stop()
+
+
+@pytest.mark.parametrize("scheduler", [
+    ContinuousScheduler(),
+    FixedRateScheduler(1000.0),
+])
+def test_frames_and_calls(thread, scheduler):
+    frame, rt = thread(scheduler)
+    assert frame.drawn.wait(5.0)
+    assert rt.call(lambda x: x + 1, 41).result(timeout=5.0) == 42
+    assert rt.is_alive()
+
+
+def test_continuous_is_never_late(thread):
+    frame, rt = thread(ContinuousScheduler())
+    assert frame.drawn.wait(5.0)
+    time.sleep(0.01)
+    assert max(frame.slack) == 0.0
+    assert frame.scheduler.dropped == 0
+
+
+def test_on_demand(thread):
+    frame, rt = thread(OnDemandScheduler())
+    assert rt.call(lambda: None).result(timeout=5.0) is None
+    assert frame.frames == 0
+    frame.dirty = True
+    rt.wake()
+    rt.call(lambda: None).result(timeout=5.0)
+    assert frame.frames == 1
+
+
+def test_stop_releases_context(thread):
+    frame, rt = thread(OnDemandScheduler())
+    rt.call(lambda: None).result(timeout=5.0)
+    assert frame.current
+    rt.stop()
+    assert not rt.is_alive()
+    assert not frame.current
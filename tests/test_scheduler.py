@@ -0,0 +1,108 @@
+"""
+Frame schedulers run against a Tcl interpreter, no display needed
+"""
+import time
+
+import pytest
+
+tkinter = pytest.importorskip("tkinter")
+
+from pyopengltk import scheduler as schedulers
+from pyopengltk.scheduler import ContinuousScheduler, FixedRateScheduler
+
+
+class StubFrame(object):
+    """ Just what a scheduler calls on a frame, timers from Tcl """
+
+    def __init__(self, tcl, scheduler):
+        self.tcl = tcl
+        self.scheduler = scheduler
+        self.frames = 0
+        self.delays = []
+        # Call request() while drawing, as an invalidate() in redraw
+        self.invalidate_in_redraw = False
+        self.idle = []
+        scheduler.attach(self)
+
+    def after(self, ms, func):
+        self.delays.append(ms)
+        return self.tcl.after(ms, func)
+
+    def after_idle(self, func):
+        return self.tcl.after_idle(func)
+
+    def after_cancel(self, id):
+        self.tcl.after_cancel(id)
+
+    def _display(self):
+        self.frames += 1
+        if self.frames == 3:
+            # e.g. geometry management queued while animating
+            self.tcl.after_idle(lambda: self.idle.append(self.frames))
+        start = time.perf_counter()
+        self.scheduler.frame_started(start)
+        if self.invalidate_in_redraw:
+            self.scheduler.request()
+        self.scheduler.frame_done(start, time.perf_counter())
+
+
+def run_until(tcl, done, seconds=0.5):
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end and not done():
+        if not tcl.dooneevent(tkinter._tkinter.DONT_WAIT):
+            time.sleep(0.0002)
+
+
+@pytest.mark.parametrize("scheduler", [
+    ContinuousScheduler(),
+    FixedRateScheduler(1e6),    # always late
+])
+def test_idle_callbacks_run_while_animating(scheduler):
+    tcl = tkinter.Tcl()
+    frame = StubFrame(tcl, scheduler)
+    scheduler.request()
+    run_until(tcl, lambda: frame.idle)
+    scheduler.detach()
+    assert frame.idle, "idle callbacks starved"
+    assert frame.idle[0] <= 4
+    assert min(frame.delays) >= 1
+
+
+@pytest.mark.parametrize("scheduler, limit", [
+    (ContinuousScheduler(), 1000),      # 1 ms at least between frames
+    (FixedRateScheduler(100), 100),
+])
+def test_invalidate_in_redraw_does_not_add_frames(scheduler, limit):
+    tcl = tkinter.Tcl()
+    frame = StubFrame(tcl, scheduler)
+    frame.invalidate_in_redraw = True
+    scheduler.request()
+    run_until(tcl, lambda: False, 0.2)
+    assert frame.frames <= 0.2 * limit + 5
+    # Nothing left behind to draw a detached frame
+    scheduler.detach()
+    drawn = frame.frames
+    run_until(tcl, lambda: False, 0.05)
+    assert frame.frames == drawn
+
+
+def test_next_due_and_hooks():
+    tcl = tkinter.Tcl()
+    armed = []
+    hook = lambda: armed.append(schedulers.next_due())
+    schedulers.add_due_hook(hook)
+    try:
+        scheduler = FixedRateScheduler(10)
+        frame = StubFrame(tcl, scheduler)
+        assert schedulers.next_due() is None
+        start = time.perf_counter()
+        scheduler.request()
+        assert start <= schedulers.next_due() <= time.perf_counter()
+        # Drawn, the next frame is armed about a period later
+        run_until(tcl, lambda: frame.frames)
+        assert len(armed) == 2
+        assert armed[1] - start == pytest.approx(0.1, abs=0.05)
+        scheduler.detach()
+        assert schedulers.next_due() is None
+    finally:
+        schedulers.remove_due_hook(hook)